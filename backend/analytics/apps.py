@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analytics'
+
+    def ready(self):
+        # Unpickle the models at startup so that a preforking server
+        # (e.g. gunicorn --preload) loads them once, before workers fork.
+        if getattr(settings, 'ANALYTICS_PRELOAD_MODELS', True):
+            from .ml.registry import registry
+            registry.preload()
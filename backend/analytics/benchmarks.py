@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks for the analytics helpers, the training functions and the
+dashboard views, run against generated datasets of several sizes.
+
+Results are flat {"<size>/<group>/<name>": timings} dicts so two runs can be
+compared key by key. The feature-engineering benchmarks run on an
+in-memory frame instead, so they can use far more rows than the database
+datasets (keys "features/<rows>/<name>"), and so do the per-user trainers
+on in-memory transaction aggregates of many users (keys
+"aggregates/<users>/<name>"). Everything here writes to the current database and
+trains into a temporary models directory; the benchmark command runs it in
+a throwaway test database.
+"""
+import contextlib
+import io
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from transactions import synthetic
+from . import views
+from .ledger import UserLedger
+from .ml import features, train_anomalies, train_category, train_next_month, train_saving, train_spending_pattern
+from .ml.registry import ARTIFACTS, registry
+
+# name -> (users, years of history)
+SIZES = {
+    'small': (20, 1),
+    'medium': (200, 3),
+    'large': (1000, 5),
+}
+PREFIX = 'benchmark'
+
+TRAINERS = {
+    'train_next_month': train_next_month.train_and_save,
+    'train_category': train_category.train_and_save,
+    'train_saving': train_saving.train_and_save,
+    'train_anomalies': train_anomalies.train_and_save,
+    'train_spending_pattern': train_spending_pattern.train_and_save,
+}
+
+VIEWS = ('transaction-list-create', 'transaction-summary', 'transaction-daily-trend',
+         'analytics', 'investment-plan')
+
+
+def parse_size(size):
+    """A SIZES name or '<users>x<years>' -> (users, years)."""
+    if size in SIZES:
+        return SIZES[size]
+    try:
+        users, years = (int(part) for part in size.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Unknown size '{size}': use one of {', '.join(SIZES)} or <users>x<years>.")
+    return users, years
+
+
+def measure(fn, repeat):
+    """Run fn `repeat` times; timings in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(times), 3),
+        'min_ms': round(min(times), 3),
+        'max_ms': round(max(times), 3),
+        'runs': repeat,
+    }
+
+
+def _helper_benchmarks(user_id):
+    """(name, callable) for the ledger load and every analytics helper, for one user."""
+    ledger = UserLedger.load(user_id)
+    anomalies = views._get_anomalies(ledger)
+    category_forecast = views._get_category_forecast(ledger)
+    savings_model = registry.get('decision_tree_saving')
+    return [
+        ('UserLedger.load', lambda: UserLedger.load(user_id)),
+        ('_get_next_month_prediction', lambda: views._get_next_month_prediction(ledger)),
+        ('_get_category_forecast', lambda: views._get_category_forecast(ledger)),
+        ('_get_savings_prediction', lambda: views._get_savings_prediction(ledger)),
+        ('_get_anomalies', lambda: views._get_anomalies(ledger)),
+        ('_get_monthly_trends', lambda: views._get_monthly_trends(ledger)),
+        ('_get_current_month_spending', lambda: views._get_current_month_spending(ledger)),
+        ('_get_savings_over_time', lambda: views._get_savings_over_time(ledger, savings_model)),
+        ('_generate_insights', lambda: views._generate_insights(ledger, anomalies, category_forecast)),
+        ('_get_investment_plan', lambda: views._get_investment_plan(ledger)),
+    ]
+
+
+def _view_benchmarks(user):
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def get(url):
+        # Analytics responses are cached per data version; time the work.
+        cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    return [(name, lambda url=reverse(name): get(url)) for name in VIEWS]
+
+
+def run_size(label, users, years, repeat=3, only=None, seed=0, log=None):
+    """Generate one dataset and time everything against it; returns flat results."""
+    log = log or (lambda message: None)
+    synthetic.delete_users(PREFIX)
+    log(f"[{label}] generating {users} users x {years} years...")
+    user_ids, rows = synthetic.generate(users, years, seed=seed, prefix=PREFIX)
+    log(f"[{label}] {rows:,} transactions")
+
+    results = {}
+
+    def bench(group, name, fn):
+        key = f'{label}/{group}/{name}'
+        if only and not any(part in key for part in only):
+            return
+        with contextlib.redirect_stdout(io.StringIO()):  # the trainers print progress
+            results[key] = measure(fn, repeat)
+        log(f"  {key}: {results[key]['median_ms']:.1f} ms")
+
+    for name, trainer in TRAINERS.items():
+        bench('train', name, trainer)
+    # Helpers and views need trained models even when training was not timed.
+    if any(registry.get(name) is None for name in ARTIFACTS):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for trainer in TRAINERS.values():
+                trainer()
+
+    # The first generated user is a typical, fully populated history.
+    for name, fn in _helper_benchmarks(user_ids[0]):
+        bench('helpers', name, fn)
+    user = get_user_model().objects.get(pk=user_ids[0])
+    for name, fn in _view_benchmarks(user):
+        bench('views', name, fn)
+
+    synthetic.delete_users(PREFIX)
+    return results, rows
+
+
+def transaction_frame(rows, seed=0, users=None, months=60):
+    """`rows` random raw transactions of many users as a DataFrame, for the feature benchmarks."""
+    rng = np.random.default_rng(seed)
+    users = users or max(1, rows // 500)
+    names = [c[0] for c in synthetic.EXPENSE_CATEGORIES]
+    month_starts = np.array(synthetic.month_starts(-(-months // 12))[-months:], dtype='datetime64[ns]')
+    return pd.DataFrame({
+        'user_id': rng.integers(0, users, rows),
+        'month': month_starts[rng.integers(0, months, rows)],
+        'category': pd.Categorical.from_codes(rng.integers(0, len(names), rows), names),
+        'type': pd.Categorical.from_codes((rng.random(rows) < 0.1).astype('int8'), ['expense', 'income']),
+        'amount': np.round(rng.lognormal(6, 1, rows), 2),
+    })
+
+
+def run_features(rows, repeat=3, only=None, seed=0, log=None):
+    """Time the shared feature functions on `rows` transactions of many users."""
+    log = log or (lambda message: None)
+    log(f"[features] building a {rows:,}-row frame...")
+    df = transaction_frame(rows, seed=seed)
+    benchmarks = [
+        ('expense_by_month', lambda: features.add_lags(
+            features.expense_by_month(df, ['user_id'], amount='amount', count=None),
+            'expense_total', 'lag_exp', ['user_id'])),
+        ('expense_by_category', lambda: features.add_lags(
+            features.expense_by_month(df, ['user_id', 'category'], amount='amount', count=None),
+            'expense_total', 'lag_exp', ['user_id', 'category'])),
+        ('savings_by_month', lambda: features.add_lags(
+            features.savings_by_month(df, ['user_id'], amount='amount'), 'savings', 'lag_save', ['user_id'])),
+    ]
+    results = {}
+    for name, fn in benchmarks:
+        key = f'features/{rows}/{name}'
+        if only and not any(part in key for part in only):
+            continue
+        results[key] = measure(fn, repeat)
+        log(f"  {key}: {results[key]['median_ms']:.1f} ms")
+    return results
+
+
+def aggregate_frame(users, seed=0, months=12):
+    """
+    load_transaction_aggregates()-shaped rows for `users` users with every
+    expense category and a salary in each of `months` months, for the
+    per-user trainer benchmarks.
+    """
+    rng = np.random.default_rng(seed)
+    names = [c[0] for c in synthetic.EXPENSE_CATEGORIES] + ['Salary']
+    per_user = months * len(names)
+    rows = users * per_user
+    category = np.tile(np.arange(len(names)), users * months)
+    count = np.where(category < len(names) - 1, rng.poisson(4, rows) + 1, 1)
+    mean = np.round(rng.lognormal(6, 1, rows), 2)
+    # Each group's transactions take the ranks after everything earlier in its user's history.
+    seen = np.cumsum(count) - count
+    seen -= np.repeat(seen[::per_user], per_user)
+    return pd.DataFrame({
+        'user_id': np.repeat(np.arange(users), per_user),
+        'month': np.tile(np.repeat(np.array(synthetic.month_starts(-(-months // 12))[-months:],
+                                            dtype='datetime64[ns]'), len(names)), users),
+        'category': pd.Categorical.from_codes(category, names),
+        'type': pd.Categorical.from_codes((category == len(names) - 1).astype('int8'), ['expense', 'income']),
+        'count': count,
+        'total': mean * count,
+        'mean': mean,
+        'm2': (count - 1) * (0.3 * mean) ** 2,
+        'ranked_total': mean * count * (seen + (count - 1) / 2),
+    })
+
+
+def run_aggregates(users, repeat=3, only=None, seed=0, log=None):
+    """Time the per-user trainers on in-memory aggregates of `users` users."""
+    log = log or (lambda message: None)
+    log(f"[aggregates] building aggregates of {users:,} users...")
+    aggregates = aggregate_frame(users, seed=seed)
+    results = {}
+    for name, trainer in (('train_anomalies', train_anomalies.train),
+                          ('train_spending_pattern', train_spending_pattern.train)):
+        key = f'aggregates/{users}/{name}'
+        if only and not any(part in key for part in only):
+            continue
+        results[key] = measure(lambda: trainer(aggregates), repeat)
+        log(f"  {key}: {results[key]['median_ms']:.1f} ms")
+    return results
+
+
+def run(sizes, repeat=3, only=None, seed=0, log=None, feature_rows=None, aggregate_users=None):
+    """
+    Benchmark every size, the features on `feature_rows` rows and the
+    per-user trainers on `aggregate_users` users; returns the JSON-ready
+    report.
+    """
+    models_dir = registry.models_dir
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'seed': seed,
+            'sizes': {},
+            'feature_rows': feature_rows,
+            'aggregate_users': aggregate_users,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        registry.models_dir = Path(tmp)
+        try:
+            for size in sizes:
+                users, years = parse_size(size)
+                results, rows = run_size(size, users, years, repeat=repeat, only=only, seed=seed, log=log)
+                report['meta']['sizes'][size] = {'users': users, 'years': years, 'transactions': rows}
+                report['results'].update(results)
+        finally:
+            registry.models_dir = models_dir
+    if feature_rows:
+        report['results'].update(run_features(feature_rows, repeat=repeat, only=only, seed=seed, log=log))
+    if aggregate_users:
+        report['results'].update(run_aggregates(aggregate_users, repeat=repeat, only=only, seed=seed, log=log))
+    return report
+
+
+def compare(baseline, current, threshold=0.25, min_ms=5.0):
+    """
+    Compare the median timings of two reports.
+
+    Returns (key, baseline ms, current ms, ratio, status) rows for the keys
+    in both, where status is 'regression' when current is more than
+    `threshold` slower, 'improvement' when that much faster, else 'ok'.
+    Timings under `min_ms` in both runs are too noisy to flag.
+    """
+    rows = []
+    for key in sorted(baseline['results'].keys() & current['results'].keys()):
+        before = baseline['results'][key]['median_ms']
+        after = current['results'][key]['median_ms']
+        ratio = after / before if before else float('inf')
+        status = 'ok'
+        if max(before, after) >= min_ms:
+            if ratio > 1 + threshold:
+                status = 'regression'
+            elif ratio < 1 / (1 + threshold):
+                status = 'improvement'
+        rows.append((key, before, after, ratio, status))
+    return rows
@@ -0,0 +1,57 @@
+import time
+from datetime import date
+
+from django.core.cache import cache
+
+from backend import metrics
+from .ml.registry import registry
+
+
+def _data_version_key(user_id):
+    return f'analytics:data_version:{user_id}'
+
+
+def get_data_version(user_id):
+    """
+    Return the user's current transaction data version.
+
+    Versions start from a timestamp rather than 1, so a version key that was
+    evicted from the cache can never come back as a value an older payload
+    was stored under.
+    """
+    key = _data_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached analytics payload for this user."""
+    key = _data_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def analytics_cache_key(kind, user_id):
+    """
+    Cache key for one of the user's analytics payloads.
+
+    The key changes when the user's transactions change, when any model
+    artifact is retrained, and at midnight (the payloads look at the
+    current month and the last 30 days).
+    """
+    return (
+        f'analytics:{kind}:{user_id}:{get_data_version(user_id)}'
+        f':{registry.fingerprint()}:{date.today().isoformat()}'
+    )
+
+
+def get_cached(kind, cache_key):
+    """cache.get(cache_key), counted as a hit or miss of the `kind` payload."""
+    value = cache.get(cache_key)
+    metrics.CACHE_LOOKUPS.labels(kind, 'miss' if value is None else 'hit').inc()
+    return value
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from transactions.models import MonthlyRollup, Transaction
+
+
+def month_index(dates):
+    """Months since January 1970 for an array of datetime64[D] dates."""
+    return dates.astype('datetime64[M]').astype(np.int64)
+
+
+def month_start(index):
+    """The first day of the month numbered `index` by month_index()."""
+    year, month = divmod(int(index), 12)
+    return date(1970 + year, month + 1, 1)
+
+
+class Columns:
+    """Equal-length NumPy arrays, one attribute per field, filtered together."""
+
+    def __init__(self, **arrays):
+        self.__dict__.update(arrays)
+        self._fields = tuple(arrays)
+
+    def __len__(self):
+        return len(getattr(self, self._fields[0]))
+
+    def where(self, mask):
+        return Columns(**{field: getattr(self, field)[mask] for field in self._fields})
+
+
+class UserLedger:
+    """
+    A user's transaction data loaded once per request into NumPy arrays.
+
+    Every analytics helper reads from this object instead of querying the
+    database itself, and works on the arrays directly: for a few hundred
+    rows, building pandas frames costs more than the arithmetic. It is
+    loaded with three queries, none of which grows with the number of
+    transactions:
+
+    - `monthly`: the user's MonthlyRollup rows for the whole history
+      (month, category, is_expense, total, count), in month order,
+    - `recent`: raw transactions from the last WINDOW_DAYS days (id, date,
+      month, category, is_expense, amount), in (date, id) order,
+    - `latest_expenses`: the user's LATEST_EXPENSES most recent expenses,
+      newest first, with the same fields.
+
+    Months are month_index() numbers; amounts are float64.
+    """
+
+    COLUMNS = ('id', 'date', 'type', 'category', 'amount')
+    ROLLUP_COLUMNS = ('month', 'category', 'type', 'total', 'count')
+    WINDOW_DAYS = 120
+    LATEST_EXPENSES = 50
+
+    def __init__(self, user_id, monthly, recent, latest_expenses, window_start):
+        self.user_id = user_id
+        self.monthly = monthly
+        self.recent = recent
+        self.latest_expenses = latest_expenses
+        self.window_start = window_start
+
+    @classmethod
+    def load(cls, user_id):
+        window_start = date.today() - timedelta(days=cls.WINDOW_DAYS)
+        rollups = MonthlyRollup.objects.filter(user_id=user_id).order_by('month')
+        recent = Transaction.objects.filter(user_id=user_id, date__gte=window_start)
+        latest_expenses = (
+            Transaction.objects.filter(user_id=user_id, type='expense')
+            .order_by('-date', '-id')[:cls.LATEST_EXPENSES]
+        )
+        return cls(
+            user_id,
+            cls._build_rollups(rollups.values_list(*cls.ROLLUP_COLUMNS)),
+            cls._build_transactions(recent.order_by('date', 'id').values_list(*cls.COLUMNS)),
+            cls._build_transactions(latest_expenses.values_list(*cls.COLUMNS)),
+            window_start,
+        )
+
+    @staticmethod
+    def _build_rollups(rows):
+        rows = list(rows)
+        months, categories, types, totals, counts = zip(*rows) if rows else ((),) * 5
+        return Columns(
+            month=month_index(np.array(months, dtype='datetime64[D]')),
+            category=np.array(categories, dtype=object),
+            is_expense=np.array(types, dtype=object) == 'expense',
+            total=np.array(totals, dtype=np.float64),
+            count=np.array(counts, dtype=np.int64),
+        )
+
+    @staticmethod
+    def _build_transactions(rows):
+        rows = list(rows)
+        ids, dates, types, categories, amounts = zip(*rows) if rows else ((),) * 5
+        dates = np.array(dates, dtype='datetime64[D]')
+        return Columns(
+            id=np.array(ids, dtype=np.int64),
+            date=dates,
+            month=month_index(dates),
+            category=np.array(categories, dtype=object),
+            is_expense=np.array(types, dtype=object) == 'expense',
+            amount=np.array(amounts, dtype=np.float64),
+        )
+
+    @property
+    def is_empty(self):
+        return len(self.monthly) == 0
+
+    def since(self, start):
+        """Raw rows dated on or after `start` (a date, or a number of days ago)."""
+        if isinstance(start, int):
+            start = date.today() - timedelta(days=start)
+        if start < self.window_start:
+            raise ValueError(f"Only transactions since {self.window_start} are loaded, not {start}.")
+        return self.recent.where(self.recent.date >= np.datetime64(start))
@@ -0,0 +1,76 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from analytics import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Times the analytics helpers, the ML training functions and the dashboard views on generated '
+            'datasets in a throwaway test database, and the feature engineering and per-user trainers on large '
+            'in-memory frames; optionally compares the results with a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f"Comma-separated dataset sizes: {', '.join(benchmarks.SIZES)} or <users>x<years>.")
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the median is reported.')
+        parser.add_argument('--only', action='append',
+                            help='Only benchmarks whose key contains this text (may be given several times).')
+        parser.add_argument('--seed', type=int, default=0, help='Dataset seed.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', metavar='BASELINE',
+                            help='Compare with a results file written earlier; fails on regressions.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Relative slowdown of the median that counts as a regression (default 0.25).')
+        parser.add_argument('--min-ms', type=float, default=5.0,
+                            help='Benchmarks faster than this in both runs are never flagged (default 5).')
+        parser.add_argument('--feature-rows', type=int,
+                            help='Also time the feature engineering on an in-memory frame of this many '
+                                 'transactions, e.g. 10000000.')
+        parser.add_argument('--aggregate-users', type=int,
+                            help='Also time the per-user trainers on in-memory transaction aggregates of this '
+                                 'many users, e.g. 100000.')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs.')
+
+    def handle(self, *args, **kwargs):
+        sizes = [size.strip() for size in kwargs['sizes'].split(',') if size.strip()]
+        try:
+            for size in sizes:
+                benchmarks.parse_size(size)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        baseline = None
+        if kwargs['compare']:
+            with open(kwargs['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=kwargs['keepdb'])
+        try:
+            report = benchmarks.run(sizes, repeat=kwargs['repeat'], only=kwargs['only'],
+                                    seed=kwargs['seed'], log=self.stdout.write,
+                                    feature_rows=kwargs['feature_rows'],
+                                    aggregate_users=kwargs['aggregate_users'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=kwargs['keepdb'])
+            teardown_test_environment()
+
+        if kwargs['output']:
+            with open(kwargs['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {kwargs['output']}")
+
+        if baseline is None:
+            return
+        rows = benchmarks.compare(baseline, report, threshold=kwargs['threshold'], min_ms=kwargs['min_ms'])
+        styles = {'regression': self.style.ERROR, 'improvement': self.style.SUCCESS, 'ok': str}
+        for key, before, after, ratio, status in rows:
+            line = f"{key:<60} {before:>10.1f} ms -> {after:>10.1f} ms  x{ratio:.2f}  {status}"
+            self.stdout.write(styles[status](line))
+
+        regressions = [row for row in rows if row[4] == 'regression']
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmarks regressed by more than {kwargs['threshold']:.0%}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} compared benchmarks."))
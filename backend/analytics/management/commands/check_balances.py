@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from transactions import balances
+
+
+class Command(BaseCommand):
+    help = 'Checks the per-user running totals (UserBalance) against the transactions table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only this user id (may be given several times).')
+        parser.add_argument('--fix', action='store_true',
+                            help='Recompute the totals of every user that does not match.')
+
+    def handle(self, *args, **kwargs):
+        mismatches = balances.find_mismatches(kwargs['user_ids'])
+        for user_id, field, expected, stored in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(f"user {user_id} {field}: expected {expected}, stored {stored}"))
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("User balances match the transactions table."))
+            return
+
+        if not kwargs['fix']:
+            raise CommandError(f"{len(mismatches)} user balance fields do not match the transactions table.")
+
+        # Balances are recomputed from MonthlyRollup, so rebuild that first
+        # with rebuild_rollups if it is out of date as well.
+        user_ids = sorted({user_id for user_id, *_ in mismatches})
+        for user_id in user_ids:
+            balances.refresh(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the balances of {len(user_ids)} users."))
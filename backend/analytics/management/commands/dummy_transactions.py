@@ -26,7 +26,7 @@ class Command(BaseCommand):
         print(f"Resetting all transactions for user: {user.username}...")
         with connection.cursor() as cursor:
             # This single command deletes all rows and resets the auto-incrementing ID.
-            cursor.execute("TRUNCATE TABLE transactions_transaction RESTART IDENTITY CASCADE;")
+            cursor.execute("TRUNCATE TABLE transactions_transaction, transactions_monthlyrollup, transactions_userbalance RESTART IDENTITY CASCADE;")
         print("All old transactions have been deleted and the ID counter is reset to 1.")
 
 
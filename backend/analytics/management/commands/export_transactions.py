@@ -1,46 +1,60 @@
 # in analytics/management/commands/export_transactions.py
 
-import csv
-from django.core.management.base import BaseCommand
-from transactions.models import Transaction # Make sure this import path is correct
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from transactions import export
+
 
 class Command(BaseCommand):
-    help = 'Exports all transactions from the database to a CSV file.'
+    help = 'Exports transactions from the database to a CSV file, or to several files in parallel.'
 
     def add_arguments(self, parser):
         # Add an argument to specify the output file path
         parser.add_argument('output_path', type=str, help='D:/transactions.csv')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only this user id (may be given several times).')
+        parser.add_argument('--start', type=date.fromisoformat, help='Only transactions on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--end', type=date.fromisoformat, help='Only transactions on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--shards', type=int, default=1,
+                            help='Split the export by user-id range into this many files, written in parallel.')
+        parser.add_argument('--workers', type=int,
+                            help='Worker processes for a sharded export (default: one per shard).')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows fetched from the database cursor and written per batch.')
 
     def handle(self, *args, **kwargs):
         output_path = kwargs['output_path']
+        shards = kwargs['shards']
+        if shards < 1:
+            raise CommandError("--shards must be at least 1.")
+        filters = {'user_ids': kwargs['user_ids'], 'start': kwargs['start'], 'end': kwargs['end']}
         self.stdout.write(f"Starting export of transactions to {output_path}...")
 
-        # Fetch all transaction objects from the database
-        transactions = Transaction.objects.all()
-        
-        # Check if there are any transactions
-        if not transactions.exists():
+        if shards == 1:
+            results = [export.export_to_file(output_path, chunk_size=kwargs['chunk_size'], **filters)]
+        else:
+            ranges = export.user_id_ranges(shards, **filters) or [(0, 0)]
+            # Workers open their own connections; forked ones must not share ours.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=kwargs['workers'] or len(ranges),
+                                     initializer=export.init_worker) as pool:
+                futures = [
+                    pool.submit(export.export_to_file, export.shard_path(output_path, i, len(ranges)),
+                                chunk_size=kwargs['chunk_size'], user_range=user_range, **filters)
+                    for i, user_range in enumerate(ranges)
+                ]
+                results = [future.result() for future in futures]
+
+        total = 0
+        for path, written in results:
+            total += written
+            if len(results) > 1:
+                self.stdout.write(f"  {path}: {written} transactions")
+
+        if not total:
             self.stdout.write(self.style.WARNING("No transactions found in the database."))
             return
-
-        # Open the file for writing
-        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-
-            # Write the header row
-            writer.writerow(['id', 'user_id', 'date', 'type', 'category', 'amount', 'description'])
-
-            # Write data rows
-            for tx in transactions:
-                formatted_date = tx.date.strftime('%Y-%m-%d') if tx.date else ''
-                writer.writerow([
-                    tx.id,
-                    tx.user.id,
-                    formatted_date,
-                    tx.type,
-                    tx.category,
-                    tx.amount,
-                    tx.description
-                ])
-
-        self.stdout.write(self.style.SUCCESS(f"Successfully exported {transactions.count()} transactions to {output_path}"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"Successfully exported {total} transactions to {output_path}"))
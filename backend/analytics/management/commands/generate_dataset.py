@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from transactions import synthetic
+
+
+class Command(BaseCommand):
+    help = ('Creates synthetic users with years of realistic transactions for load tests and benchmarks. '
+            'Only the users it creates are touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Number of users to create.')
+        parser.add_argument('--years', type=int, default=3, help='Years of history per user.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Usernames are <prefix><n>, emails <prefix><n>@example.com.')
+        parser.add_argument('--expenses-per-month', type=float, default=25,
+                            help='Average expenses per user and month before seasonality.')
+        parser.add_argument('--outlier-rate', type=float, default=0.01,
+                            help='Share of expenses that are 5-20x their usual size.')
+        parser.add_argument('--password', help='Password for every created user (default: unusable).')
+        parser.add_argument('--batch-users', type=int, default=100,
+                            help='Users generated and inserted per database transaction.')
+        parser.add_argument('--replace', action='store_true',
+                            help='First delete the users (and data) of an earlier run with this prefix.')
+
+    def handle(self, *args, **kwargs):
+        prefix = kwargs['prefix']
+        if kwargs['replace']:
+            deleted = synthetic.delete_users(prefix)
+            self.stdout.write(f"Deleted {deleted} existing '{prefix}' users.")
+        elif get_user_model().objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users named '{prefix}...' already exist; use --replace or another --prefix.")
+
+        self.stdout.write(f"Generating {kwargs['users']} users with {kwargs['years']} years of transactions...")
+        started = time.monotonic()
+
+        def progress(users_done, rows_done):
+            rate = rows_done / (time.monotonic() - started)
+            self.stdout.write(f"  {users_done:,} users, {rows_done:,} transactions ({rate:,.0f} rows/s)")
+
+        user_ids, written = synthetic.generate(
+            kwargs['users'], kwargs['years'], seed=kwargs['seed'], prefix=prefix,
+            expenses_per_month=kwargs['expenses_per_month'], outlier_rate=kwargs['outlier_rate'],
+            password=kwargs['password'], batch_users=kwargs['batch_users'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(user_ids):,} users and {written:,} transactions in {time.monotonic() - started:.1f}s "
+            f"(user ids {user_ids[0]}-{user_ids[-1]})." if user_ids else "No users created."))
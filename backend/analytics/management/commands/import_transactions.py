@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from transactions import importer
+
+
+class Command(BaseCommand):
+    help = 'Imports transactions from a CSV file in the layout written by export_transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input_path', type=str, help='CSV file to import.')
+        parser.add_argument('--user', type=int, dest='user_id',
+                            help="Import every row for this user id instead of the file's user_id column.")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows validated and inserted per batch (default 5000).')
+
+    def handle(self, *args, **kwargs):
+        input_path = kwargs['input_path']
+        self.stdout.write(f"Importing transactions from {input_path}...")
+
+        def progress(result):
+            self.stdout.write(f"  {result.imported:,} rows imported, {result.skipped:,} skipped "
+                              f"({result.rows_per_second:,.0f} rows/s)")
+
+        try:
+            with open(input_path, newline='', encoding='utf-8-sig') as csvfile:
+                result = importer.import_csv(csvfile, user_id=kwargs['user_id'],
+                                             chunk_size=kwargs['chunk_size'], progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"line {line}: {message}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported:,} transactions in {result.elapsed:.1f}s "
+            f"({result.rows_per_second:,.0f} rows/s); skipped {result.skipped:,} invalid rows."))
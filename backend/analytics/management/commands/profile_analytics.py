@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from analytics import profiling
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = ("Profiles a user's analytics (the whole analytics_view pipeline, or one helper) under cProfile and "
+            "tracemalloc: top functions, time and peak memory per stage, and every SQL statement.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('--helper', choices=list(profiling.HELPERS),
+                            help='Profile only this helper, on a ledger loaded beforehand.')
+        parser.add_argument('--top', type=int, default=25, help='Functions to list (default 25).')
+        parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                            help='Order of the function list (default cumulative).')
+        parser.add_argument('--flamegraph', metavar='PATH',
+                            help='Write sampled stacks to this file in collapsed format (flamegraph.pl, speedscope).')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Stack sampling interval for --flamegraph, in milliseconds (default 1).')
+
+    def handle(self, *args, **kwargs):
+        user_id = kwargs['user_id']
+        if not get_user_model().objects.filter(pk=user_id).exists():
+            raise CommandError(f"User {user_id} does not exist.")
+
+        interval = kwargs['interval'] / 1000 if kwargs['flamegraph'] else None
+        report = profiling.profile(user_id, helper=kwargs['helper'], sample_interval=interval)
+
+        target = f"helper {kwargs['helper']}" if kwargs['helper'] else 'analytics_view'
+        self.stdout.write(f"Profiled {target} for user {user_id}: {report.elapsed * 1000:.1f} ms, "
+                          f"peak traced memory {report.peak_memory / MB:.2f} MB")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nStages"))
+        self.stdout.write(f"  {'stage':<24} {'ms':>10} {'peak MB':>10} {'retained MB':>12}")
+        for name, seconds, peak, retained in report.stages:
+            self.stdout.write(f"  {name:<24} {seconds * 1000:>10.1f} {peak / MB:>10.2f} {retained / MB:>12.2f}")
+
+        db_time = sum(seconds for _, _, seconds in report.statements)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nSQL: {len(report.statements)} statements, {db_time * 1000:.1f} ms"))
+        for sql, params, seconds in report.statements:
+            self.stdout.write(f"  {seconds * 1000:>8.2f} ms  {sql}")
+            if params:
+                self.stdout.write(f"              params: {params!r}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nTop {kwargs['top']} functions by {kwargs['sort']}"))
+        self.stdout.write(report.top_functions(kwargs['top'], kwargs['sort']))
+
+        if kwargs['flamegraph']:
+            profiling.write_collapsed(report.stacks, kwargs['flamegraph'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{sum(report.stacks.values())} stack samples written to {kwargs['flamegraph']}"))
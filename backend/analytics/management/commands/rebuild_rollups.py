@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from transactions import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the MonthlyRollup table from raw transactions and checks it against them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only this user id (may be given several times).')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the raw table; do not rebuild.')
+
+    def handle(self, *args, **kwargs):
+        user_ids = kwargs['user_ids']
+
+        if not kwargs['check']:
+            written = rollups.rebuild(user_ids)
+            self.stdout.write(f"Rebuilt {written} monthly rollup rows.")
+
+        mismatches = rollups.find_mismatches(user_ids)
+        for key, expected, actual in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(f"{key}: expected {expected}, stored {actual}"))
+
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} monthly rollup rows do not match the transactions table.")
+        self.stdout.write(self.style.SUCCESS("Monthly rollups match the transactions table."))
@@ -1,16 +1,61 @@
-from django.core.management.base import BaseCommand
-from analytics.ml.train_next_month import train_and_save as train_next_month
-from analytics.ml.train_category import train_and_save as train_category
-from analytics.ml.train_saving import train_and_save as train_saving
-from analytics.ml.train_anomalies import train_and_save as train_anomalies
-from analytics.ml.train_spending_pattern import train_and_save as train_spending_pattern
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from analytics.ml import training
+from analytics.ml.snapshot import Snapshot
+
+MB = 1024 * 1024
+
+
 class Command(BaseCommand):
-    help = "Train ML models for analytics"
+    help = ("Train ML models for analytics: loads the base data once, then fits the models in parallel "
+            "processes and prints each stage's time and peak memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', choices=list(training.TRAINERS), metavar='TRAINER',
+                            help=f"Train only these models ({', '.join(training.TRAINERS)}).")
+        parser.add_argument('--workers', type=int,
+                            help='Training processes (default one per model, at most one per CPU; 1 trains '
+                                 'in this process).')
+        parser.add_argument('--n-jobs', type=int, default=-1,
+                            help='Threads for each random forest fit (default -1, every CPU).')
+        parser.add_argument('--snapshot', metavar='PATH',
+                            help='Train from a snapshot_transactions directory instead of the database.')
+        parser.add_argument('--incremental', action='store_true',
+                            help="Recompute per-user artifacts only for users whose data changed since the last "
+                                 "run, and skip global models until enough users changed.")
+        parser.add_argument('--min-change', type=float, default=training.MIN_CHANGE,
+                            help='With --incremental, the fraction of users that must have changed before a global '
+                                 f'model is retrained (default {training.MIN_CHANGE}).')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Report each stage's own peak with tracemalloc instead of the process's peak "
+                                 "resident size (several times slower).")
 
     def handle(self, *args, **kwargs):
-        train_next_month()
-        train_category()
-        train_saving()
-        train_anomalies()
-        train_spending_pattern()
+        snapshot = None
+        if kwargs['snapshot'] and kwargs['incremental']:
+            raise CommandError("--incremental compares with the database; it can't be combined with --snapshot.")
+        if kwargs['snapshot']:
+            snapshot = Snapshot(kwargs['snapshot'])
+            if not snapshot.rows:
+                raise CommandError(f"{kwargs['snapshot']} is not a snapshot; run snapshot_transactions first.")
+            self.stdout.write(f"Training from {snapshot.path}: {snapshot.rows} transactions up to id "
+                              f"{snapshot.watermark}")
+
+        start = time.perf_counter()
+        stages = training.train_all(only=kwargs['only'], workers=kwargs['workers'], n_jobs=kwargs['n_jobs'],
+                                    snapshot=snapshot, incremental=kwargs['incremental'],
+                                    min_change=kwargs['min_change'], trace_memory=kwargs['trace_memory'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"  {'stage':<28} {'ms':>10} {'peak MB':>10}  result")
+        for stage in stages:
+            if stage.rows is not None:
+                result = f"{stage.rows} rows"
+            else:
+                result = ', '.join(str(part) for part in (stage.path, stage.note) if part)
+            self.stdout.write(f"  {stage.name:<28} {stage.seconds * 1000:>10.1f} "
+                              f"{stage.peak_memory / MB:>10.2f}  {result}")
+        self.stdout.write(f"Total {elapsed * 1000:.1f} ms (stages add up to "
+                          f"{sum(stage.seconds for stage in stages) * 1000:.1f} ms)")
         self.stdout.write(self.style.SUCCESS("ML models trained successfully"))
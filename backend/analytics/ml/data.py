@@ -0,0 +1,162 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import Max, TextField, Value
+from django.db.models.functions import MD5, Cast, Concat
+
+from transactions.models import MonthlyRollup, Transaction
+
+ROLLUP_COLUMNS = ('user_id', 'month', 'category', 'type', 'total', 'count')
+TRANSACTION_COLUMNS = ('user_id', 'date', 'category', 'type', 'amount')
+AGGREGATE_KEYS = ['user_id', 'month', 'category', 'type']
+MOMENT_COLUMNS = ('count', 'total', 'mean', 'm2', 'ranked_total')
+CHUNK_SIZE = 10_000
+
+
+def load_monthly_rollups(user_id=None):
+    """
+    MonthlyRollup rows as a typed DataFrame.
+
+    One row per (user, month, category, type) with the summed `total` and
+    the transaction `count`. Its size grows with months of history, not
+    with the number of transactions.
+    """
+    qs = MonthlyRollup.objects.all()
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    rows = list(qs.order_by('user_id', 'month').values_list(*ROLLUP_COLUMNS))
+
+    user_ids, months, categories, types, totals, counts = zip(*rows) if rows else ((),) * 6
+    return pd.DataFrame({
+        'user_id': np.array(user_ids, dtype='int64'),
+        'month': pd.to_datetime(pd.Series(months, dtype='object')),
+        'category': pd.Series(categories, dtype='object'),
+        'type': pd.Series(types, dtype='object'),
+        'total': np.array(totals, dtype='float64'),
+        'count': np.array(counts, dtype='int64'),
+    })
+
+
+def transaction_chunks(chunk_size=CHUNK_SIZE, user_ids=None):
+    """
+    Every Transaction (of `user_ids`, if given), chunk_size rows at a time,
+    in (user_id, date, id) order, as dicts of NumPy arrays keyed by
+    TRANSACTION_COLUMNS. Rows come through a server-side cursor, so only one
+    chunk is in memory at once.
+    """
+    qs = Transaction.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    rows = qs.order_by('user_id', 'date', 'id').values_list(*TRANSACTION_COLUMNS).iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        user_ids, dates, categories, types, amounts = zip(*chunk)
+        yield {
+            'user_id': np.array(user_ids, dtype='int64'),
+            'date': np.array(dates, dtype='datetime64[D]'),
+            'category': np.array(categories, dtype='object'),
+            'type': np.array(types, dtype='object'),
+            'amount': np.array(amounts, dtype='float64'),
+        }
+
+
+def merge_moments(parts, keys):
+    """
+    Combine rows of `count`, `total`, `mean`, `m2` (sum of squared
+    deviations from the mean) and `ranked_total` into one row per `keys`,
+    sorted by them. A single transaction is the part (1, amount, amount,
+    0, rank * amount).
+
+    Deviations are taken from each group's first mean, so a group of equal
+    amounts keeps exactly that mean and an m2 of exactly 0.
+    """
+    groups = parts.groupby(keys, sort=True, observed=True)
+    shift = parts['mean'] - groups['mean'].transform('first')
+    weighted = parts['count'] * shift
+    merged = parts.assign(shift=weighted, shift2=weighted * shift).groupby(keys, sort=True, observed=True).agg(
+        count=('count', 'sum'), total=('total', 'sum'), first=('mean', 'first'), shift=('shift', 'sum'),
+        shift2=('shift2', 'sum'), m2=('m2', 'sum'), ranked_total=('ranked_total', 'sum'),
+    )
+    merged['mean'] = merged['first'] + merged['shift'] / merged['count']
+    merged['m2'] = (merged['m2'] + merged['shift2'] - merged['shift'] ** 2 / merged['count']).clip(lower=0)
+    return merged[list(MOMENT_COLUMNS)].reset_index()
+
+
+def load_transaction_aggregates(chunk_size=CHUNK_SIZE, user_ids=None):
+    """
+    Every Transaction (of `user_ids`, if given) folded into one row per
+    (user_id, month, category, type) with MOMENT_COLUMNS; see
+    fold_transactions().
+
+    The table is streamed chunk by chunk (transaction_chunks()), so memory
+    grows with users, months and categories, not with transactions.
+    """
+    return fold_transactions(transaction_chunks(chunk_size, user_ids))
+
+
+def fold_transactions(chunks):
+    """
+    Fold transaction_chunks()-style chunks, in (user_id, date, id) order,
+    into one row per (user_id, month, category, type) with MOMENT_COLUMNS
+    (see merge_moments()). `ranked_total` sums each amount times the
+    transaction's 0-based position in its user's history, which is what a
+    per-user trend needs.
+    """
+    parts, last_user, seen = [], None, 0
+    for chunk in chunks:
+        user_ids = chunk['user_id']
+        starts = np.r_[True, user_ids[1:] != user_ids[:-1]]
+        rank = np.arange(len(user_ids)) - np.flatnonzero(starts)[np.cumsum(starts) - 1]
+        if user_ids[0] == last_user:  # that user's history started in an earlier chunk
+            rank[user_ids == last_user] += seen
+        last_user, seen = user_ids[-1], rank[-1] + 1
+
+        amount = chunk['amount']
+        parts.append(merge_moments(pd.DataFrame({
+            'user_id': user_ids,
+            'month': chunk['date'].astype('datetime64[M]').astype('datetime64[ns]'),
+            'category': chunk['category'],
+            'type': chunk['type'],
+            'count': np.ones(len(amount), dtype='int64'),
+            'total': amount,
+            'mean': amount,
+            'm2': np.zeros(len(amount)),
+            'ranked_total': rank * amount,
+        }), AGGREGATE_KEYS))
+
+    if not parts:
+        return pd.DataFrame({
+            'user_id': np.array([], dtype='int64'), 'month': np.array([], dtype='datetime64[ns]'),
+            'category': np.array([], dtype='object'), 'type': np.array([], dtype='object'),
+            'count': np.array([], dtype='int64'),
+            **{column: np.array([], dtype='float64') for column in MOMENT_COLUMNS[1:]},
+        })
+    # Only the groups of a user that spans two chunks appear more than once.
+    return merge_moments(pd.concat(parts, ignore_index=True), AGGREGATE_KEYS)
+
+
+def transaction_watermark():
+    """The highest Transaction id, 0 for an empty table."""
+    return Transaction.objects.aggregate(Max('id'))['id__max'] or 0
+
+
+def users_with_transactions_after(watermark):
+    """The users who have a Transaction with an id above `watermark`."""
+    return set(Transaction.objects.filter(id__gt=watermark).values_list('user_id', flat=True).distinct())
+
+
+def user_digests():
+    """
+    {user_id: digest}, in one query computed by the database: the MD5 of the
+    user's transactions (id and TRANSACTION_COLUMNS) in id order. Adding or
+    deleting a transaction, or changing anything a model reads (the day and
+    category too, which MonthlyRollup totals can't show), changes it.
+    """
+    fields = ['id', *TRANSACTION_COLUMNS[1:]]
+    row = Concat(*itertools.chain.from_iterable((Cast(field, TextField()), Value('|')) for field in fields),
+                 output_field=TextField())
+    rows = (Transaction.objects.values('user_id')
+            .annotate(digest=MD5(StringAgg(row, Value(','), ordering='id')))
+            .order_by().values_list('user_id', 'digest'))
+    return dict(rows)
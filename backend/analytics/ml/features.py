@@ -0,0 +1,77 @@
+"""
+Monthly features for the expense and savings models, shared by training
+(the train_* modules) and inference (the analytics views).
+
+Every function is vectorized and handles any number of series at once:
+`keys` names the columns that identify a series, e.g. ['user_id'] when
+training on every user, ['user_id', 'category'] for the category model,
+or nothing for one user's own history. Input frames have `month` and
+`type` columns plus either MonthlyRollup `total`/`count` columns or, for
+raw transactions, an `amount` column with one transaction per row.
+
+Lags count rows, not calendar months: a series with a gap in its history
+uses the months it has, as the models were trained.
+"""
+import numpy as np
+
+EXPENSE_FEATURES = ['month_num', 'lag_exp_1', 'lag_exp_2', 'lag_exp_3', 'num_tx', 'avg_tx']
+SAVINGS_FEATURES = ['month_num', 'lag_save_1', 'lag_save_2', 'lag_save_3']
+LAGS = 3
+
+
+def expense_by_month(df, keys=(), amount='total', count='count'):
+    """
+    One row per (*keys, month), sorted by them, with `expense_total`,
+    `num_tx` and `amount_total` (transactions and amounts of every type),
+    `avg_tx` and `month_num`. With count=None each input row is one
+    transaction.
+    """
+    df = df.assign(expense=np.where(df['type'] == 'expense', df[amount], 0.0))
+    monthly = df.groupby([*keys, 'month'], observed=True).agg(
+        expense_total=('expense', 'sum'),
+        num_tx=(count, 'sum') if count else (amount, 'count'),
+        amount_total=(amount, 'sum'),
+    ).reset_index()
+    monthly['avg_tx'] = monthly['amount_total'] / monthly['num_tx']
+    monthly['month_num'] = monthly['month'].dt.month
+    return monthly
+
+
+def savings_by_month(df, keys=(), amount='total'):
+    """One row per (*keys, month), sorted by them, with the `income`/`expense` totals, `savings` and `month_num`."""
+    monthly = df.groupby([*keys, 'month', 'type'], observed=True)[amount].sum().unstack(fill_value=0).reset_index()
+    monthly['savings'] = monthly.get('income', 0) - monthly.get('expense', 0)
+    monthly['month_num'] = monthly['month'].dt.month
+    return monthly
+
+
+def add_lags(monthly, column, prefix, keys=(), start=1):
+    """
+    Add `{prefix}_1` ... `{prefix}_{LAGS}`: `column` from `start`,
+    `start + 1`, ... rows earlier in the same series. start=1 gives a month
+    its own history (training, backtests); start=0 makes the latest month
+    lag 1, for forecasting the month after it. Rows without enough history
+    get NaN.
+    """
+    series = monthly.groupby(list(keys), observed=True)[column] if keys else monthly[column]
+    for lag in range(1, LAGS + 1):
+        monthly[f'{prefix}_{lag}'] = series.shift(lag + start - 1)
+    return monthly
+
+
+def latest(monthly, prefix, keys=()):
+    """Each series' last row, if it has all LAGS lags (see add_lags(start=0))."""
+    last = monthly.groupby(list(keys), observed=True).tail(1) if keys else monthly.tail(1)
+    return last[last[f'{prefix}_{LAGS}'].notna()]
+
+
+def expense_training_set(rollups, keys):
+    """(X, y) for an expense model: each month from its own lags, num_tx and avg_tx."""
+    monthly = add_lags(expense_by_month(rollups, keys), 'expense_total', 'lag_exp', keys).dropna()
+    return monthly[EXPENSE_FEATURES], monthly['expense_total']
+
+
+def savings_training_set(rollups, keys):
+    """(X, y) for the savings model: each month from its own lags."""
+    monthly = add_lags(savings_by_month(rollups, keys), 'savings', 'lag_save', keys).dropna()
+    return monthly[SAVINGS_FEATURES], monthly['savings']
@@ -0,0 +1,65 @@
+"""
+NumPy-only inference for the analytics views: monthly aggregation of a
+UserLedger's arrays and predictions from plain float arrays.
+
+The features match analytics.ml.features, which builds them for training
+with pandas; here they are computed for one user, where pandas' per-call
+overhead dominates.
+"""
+import numpy as np
+import pandas as pd
+
+from .features import LAGS
+
+
+def monthly_sums(month, *weights):
+    """
+    The distinct months, in order, and for each of `weights` its sum per
+    month (np.bincount); a None weight counts rows instead.
+    """
+    months, index = np.unique(month, return_inverse=True)
+    return months, [np.bincount(index, weights=weight, minlength=len(months)) for weight in weights]
+
+
+def expense_by_month(rows, amount='amount', count=None):
+    """
+    (months, expense_total, num_tx, avg_tx) over UserLedger columns, like
+    features.expense_by_month(): num_tx and avg_tx cover every type.
+    """
+    amounts = getattr(rows, amount)
+    counts = getattr(rows, count) if count else None
+    months, (expense, num_tx, total) = monthly_sums(rows.month, np.where(rows.is_expense, amounts, 0.0),
+                                                    counts, amounts)
+    return months, expense, num_tx, total / num_tx
+
+
+def savings_by_month(rows, amount='amount'):
+    """(months, savings), like features.savings_by_month()."""
+    amounts = getattr(rows, amount)
+    months, (income, expense) = monthly_sums(rows.month, np.where(rows.is_expense, 0.0, amounts),
+                                             np.where(rows.is_expense, amounts, 0.0))
+    return months, income - expense
+
+
+def lag_matrix(values, start=1):
+    """
+    Rows [values[i - start], values[i - start - 1], ...] (LAGS columns)
+    for every i with enough history, i.e. i >= LAGS + start - 1.
+    """
+    first = LAGS + start - 1
+    return np.column_stack([values[first - lag - start + 1:len(values) - lag - start + 1]
+                            for lag in range(1, LAGS + 1)])
+
+
+def predict_rows(model, X):
+    """
+    model.predict() for every row of X at once, from a plain float array,
+    in one call. X is labelled with the feature names the model was
+    fitted with, so predict() doesn't warn about their absence.
+    """
+    return model.predict(_labelled(model, np.asarray(X, dtype=np.float64)))
+
+
+def _labelled(model, X):
+    names = getattr(model, 'feature_names_in_', None)
+    return X if names is None else pd.DataFrame(X, columns=names, copy=False)
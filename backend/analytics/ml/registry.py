@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+import joblib
+from django.conf import settings
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = settings.BASE_DIR / 'analytics' / 'ml_models'
+
+# Artifacts the analytics views read, by name (file name without .joblib).
+ARTIFACTS = (
+    'linear_next_month',
+    'decision_tree_category',
+    'decision_tree_saving',
+    'anomaly_stats',
+    'spending_pattern_slopes',
+)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the trained ML artifacts.
+
+    Each artifact is unpickled once and then served from memory. On every
+    lookup the file's mtime and size are compared with the loaded copy, so a
+    new artifact written by `train_ml` is picked up by the next request.
+    Artifacts are written through `save()`, which replaces the file in one
+    rename, so a reader never sees a half-written file.
+    """
+
+    def __init__(self, models_dir):
+        self.models_dir = models_dir
+        self._entries = {}  # name -> (stamp, obj)
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return self.models_dir / f'{name}.joblib'
+
+    def _stamp(self, name):
+        try:
+            st = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self, name):
+        """Return the loaded artifact, or None if it has never been trained."""
+        stamp = self._stamp(name)
+        entry = self._entries.get(name)
+        if entry is not None and (stamp is None or entry[0] == stamp):
+            return entry[1]
+        if stamp is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            obj = joblib.load(self.path(name))
+            metrics.MODEL_LOADS.labels(name, 'load' if entry is None else 'reload').inc()
+            # Replacing the whole tuple keeps lock-free readers consistent.
+            self._entries[name] = (stamp, obj)
+            return obj
+
+    def fingerprint(self):
+        """
+        A string that changes whenever any artifact on disk is rewritten. It
+        is the same in every process, so workers sharing a cache agree on
+        the keys built from it.
+        """
+        stamps = '|'.join(f'{name}:{self._stamp(name)}' for name in ARTIFACTS)
+        return hashlib.blake2b(stamps.encode(), digest_size=8).hexdigest()
+
+    def preload(self):
+        for name in ARTIFACTS:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("Could not preload model '%s'", name)
+
+    def save(self, obj, name):
+        """Write an artifact atomically and return its path."""
+        path = self.path(name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.models_dir, prefix=f'.{name}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                joblib.dump(obj, f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return path
+
+
+registry = ModelRegistry(MODELS_DIR)
@@ -0,0 +1,214 @@
+"""
+A columnar copy of the Transaction table, to train from without Postgres.
+
+A snapshot is a directory with one raw little-endian file per column
+(`<name>.<generation>.bin`, dtypes in COLUMNS) and `meta.json`, which holds
+the current generation, the row count, the id watermark (the highest id
+copied) and the dictionaries of the encoded `category` and `type`
+columns. The rows are stored in (user_id, date, id) order, the order the
+trainers fold them in, so a read is a run of plain memory-mapped slices:
+opening a snapshot costs nothing, and reading one holds a chunk at a time.
+
+update() copies the transactions with an id above the watermark and
+merges them into a new generation of the column files, streaming the old
+ones through in chunks; it then replaces meta.json in one rename and
+removes the previous generation. Readers keep the files they mapped, so
+they only ever see committed rows, and an interrupted update is simply
+redone. It does not see rows that were edited or deleted after they were
+copied, nor ids that commit behind one already copied; rebuild with
+full=True to pick those up. A snapshot has a single writer.
+"""
+import contextlib
+import itertools
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from transactions.models import Transaction
+from .data import CHUNK_SIZE, ROLLUP_COLUMNS, fold_transactions
+
+COLUMNS = {
+    'id': '<i8',
+    'user_id': '<i8',
+    'date': '<M8[D]',
+    'category': '<i4',  # index into meta['categories']
+    'type': '<i1',  # index into meta['types']
+    'amount': '<f8',
+}
+ENCODED = {'category': 'categories', 'type': 'types'}  # column -> its dictionary in meta
+FORMAT = 2
+
+
+def _empty_meta(generation):
+    return {'format': FORMAT, 'generation': generation, 'rows': 0, 'watermark': 0, 'categories': [], 'types': []}
+
+
+class Snapshot:
+    """A snapshot directory; reads see the rows committed when it was opened or last updated."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            with open(self.path / 'meta.json', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        except FileNotFoundError:
+            self.meta = _empty_meta(0)
+        if self.meta['format'] != FORMAT:
+            raise ValueError(f"{self.path} is a format {self.meta['format']} snapshot, not {FORMAT}; "
+                             "rebuild it with full=True in a new directory.")
+        self._map()
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def watermark(self):
+        return self.meta['watermark']
+
+    def column_path(self, name, generation=None):
+        """The file holding a column of `generation` (default the committed one)."""
+        return self.path / f"{name}.{self.meta['generation'] if generation is None else generation}.bin"
+
+    def _map(self):
+        # Mapped up front, so an update committed by another process can't remove them under us.
+        self._columns = {
+            name: np.memmap(self.column_path(name), dtype=dtype, mode='r', shape=(self.rows,))
+            if self.rows else np.empty(0, dtype=dtype)
+            for name, dtype in COLUMNS.items()
+        }
+
+    def column(self, name):
+        """The committed rows of one column, memory-mapped read-only (still encoded for category and type)."""
+        return self._columns[name]
+
+    def dictionary(self, name):
+        """The values an encoded column's codes index, as an object array."""
+        return np.array(self.meta[ENCODED[name]], dtype='object')
+
+    def update(self, full=False, chunk_size=CHUNK_SIZE):
+        """
+        Merge the transactions above the watermark (all of them with
+        full=True) into a new generation; returns how many were added. The
+        new rows are held in memory, the committed ones a chunk at a time.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        base = _empty_meta(0) if full else self.meta
+        old = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()} if full else self._columns
+        generation = self.meta['generation'] + 1
+
+        rows = (Transaction.objects.filter(id__gt=base['watermark']).order_by('id')
+                .values_list(*COLUMNS).iterator(chunk_size=chunk_size))
+        codes = {name: {value: code for code, value in enumerate(base[ENCODED[name]])} for name in ENCODED}
+        staged = {name: self.path / f'{name}.{generation}.new' for name in COLUMNS}
+        try:
+            files, added, watermark = {}, 0, base['watermark']
+            try:
+                for name in COLUMNS:
+                    files[name] = open(staged[name], 'wb')
+                while chunk := list(itertools.islice(rows, chunk_size)):
+                    columns = dict(zip(COLUMNS, zip(*chunk)))
+                    for name in ENCODED:
+                        mapping = codes[name]
+                        for value in set(columns[name]).difference(mapping):
+                            mapping[value] = len(mapping)
+                        columns[name] = [mapping[value] for value in columns[name]]
+                    for name, dtype in COLUMNS.items():
+                        files[name].write(np.array(columns[name], dtype=dtype).tobytes())
+                    added += len(chunk)
+                    watermark = columns['id'][-1]
+            finally:
+                for f in files.values():
+                    f.close()
+            if not added and not full:
+                return 0
+
+            new = {name: np.fromfile(staged[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+            order = np.lexsort((new['id'], new['date'], new['user_id']))
+            new = {name: values[order] for name, values in new.items()}
+            self._write_merged(generation, old, new, _merge_positions(old, new), chunk_size)
+
+            self.meta = {**base, 'generation': generation, 'rows': base['rows'] + added,
+                         'watermark': watermark, **{ENCODED[name]: list(codes[name]) for name in ENCODED}}
+            self._write_meta()
+            self._map()
+        finally:
+            for path in staged.values():
+                path.unlink(missing_ok=True)
+        self._remove_old_generations()
+        return added
+
+    def _write_merged(self, generation, old, new, positions, chunk_size):
+        """Write the old rows with the new ones inserted at `positions`, one old chunk at a time."""
+        rows = len(old['id'])
+        for name in COLUMNS:
+            with open(self.column_path(name, generation), 'wb') as f:
+                for start in range(0, max(rows, 1), chunk_size):
+                    stop = min(start + chunk_size, rows)
+                    # The new rows that go before old row `stop`, or all that are left after the last chunk.
+                    first, last = np.searchsorted(positions, [start, stop if stop < rows else rows + 1])
+                    f.write(np.insert(np.asarray(old[name][start:stop]), positions[first:last] - start,
+                                      new[name][first:last]).tobytes())
+
+    def _remove_old_generations(self):
+        current = {self.column_path(name).name for name in COLUMNS}
+        for path in self.path.glob('*.bin'):
+            if path.name not in current:
+                # Windows won't remove a file something still maps; the next update tries again.
+                with contextlib.suppress(OSError):
+                    path.unlink()
+
+    def _write_meta(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.meta.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path / 'meta.json')
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def transaction_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        The rows as data.transaction_chunks() yields them: decoded, in
+        (user_id, date, id) order. Every column but the two decoded ones is
+        a view of the mapped file.
+        """
+        dictionaries = {name: self.dictionary(name) for name in ENCODED}
+        for start in range(0, self.rows, chunk_size):
+            rows = slice(start, start + chunk_size)
+            chunk = {name: np.asarray(self._columns[name][rows]) for name in ('user_id', 'date', 'amount')}
+            for name in ENCODED:
+                chunk[name] = dictionaries[name][self._columns[name][rows]]
+            yield chunk
+
+    def transaction_aggregates(self, chunk_size=CHUNK_SIZE):
+        """load_transaction_aggregates() from the snapshot; folded once per Snapshot object."""
+        if not hasattr(self, '_aggregates'):
+            self._aggregates = fold_transactions(self.transaction_chunks(chunk_size))
+        return self._aggregates
+
+    def monthly_rollups(self):
+        """load_monthly_rollups() from the snapshot: the aggregates' totals and counts."""
+        return self.transaction_aggregates()[list(ROLLUP_COLUMNS)]
+
+
+def _merge_positions(old, new):
+    """
+    For each of the sorted `new` rows, the number of `old` rows that sort
+    before it. Every new id is above the old ones, so a new row goes after
+    the old rows of its user and date; only the users' old slices are read.
+    """
+    positions = np.empty(len(new['id']), dtype=np.int64)
+    users, starts = np.unique(new['user_id'], return_index=True)
+    ends = np.r_[starts[1:], len(positions)]
+    lows = np.searchsorted(old['user_id'], users, 'left')
+    highs = np.searchsorted(old['user_id'], users, 'right')
+    for start, end, low, high in zip(starts, ends, lows, highs):
+        positions[start:end] = low + np.searchsorted(old['date'][low:high], new['date'][start:end], 'right')
+    return positions
+
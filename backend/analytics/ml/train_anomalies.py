@@ -1,34 +1,34 @@
-import pandas as pd
-import joblib
-from django.conf import settings
-from transactions.models import Transaction
+import numpy as np
+from .data import load_transaction_aggregates, merge_moments
+from .registry import registry
 
-def train_and_save():
-    qs = Transaction.objects.filter(type='expense').values('user_id', 'date', 'amount')
-    df = pd.DataFrame(qs)
+ARTIFACT = 'anomaly_stats'
 
-    if df.empty:
-        print("No transaction data found.")
-        return
+def train(aggregates):
+    """Per-user mean and std of expense amounts from load_transaction_aggregates() rows, or None without enough data."""
+    expenses = aggregates[aggregates['type'] == 'expense']
 
-    
-    df['amount'] = df['amount'].astype(float)
+    if expenses.empty:
+        print("No transaction data found.")
+        return None
 
     
-    stats = {}
-    for user_id, group in df.groupby('user_id'):
-        if len(group) < 3:  
-            continue
-        mean = group['amount'].mean()
-        std = group['amount'].std()
-        if pd.isna(std) or std == 0:
-            continue
-        stats[user_id] = {'mean': mean, 'std': std}
+    users = merge_moments(expenses, ['user_id'])
+    users = users[users['count'] >= 3]
+    std = np.sqrt(users['m2'] / (users['count'] - 1))
+    stats = {
+        int(user_id): {'mean': mean, 'std': std}
+        for user_id, mean, std in zip(users['user_id'], users['mean'].to_numpy(), std.to_numpy())
+        if std > 0
+    }
 
     if not stats:
         print("Not enough data for training.")
-        return
+        return None
+    return stats
 
-    path = settings.BASE_DIR / 'analytics' / 'ml_models' / 'anomaly_stats.joblib'
-    joblib.dump(stats, path)
-    print(f"Anomaly stats saved to {path}")
+def train_and_save():
+    stats = train(load_transaction_aggregates())
+    if stats is not None:
+        path = registry.save(stats, ARTIFACT)
+        print(f"Anomaly stats saved to {path}")
@@ -1,47 +1,29 @@
-import pandas as pd
 from sklearn.linear_model import LinearRegression
-import joblib
-from django.conf import settings
-from transactions.models import Transaction 
+from .data import load_monthly_rollups
+from .features import expense_training_set
+from .registry import registry
 
-def train_and_save():
-    
-    qs = Transaction.objects.all().values('user_id', 'date', 'type', 'amount')
-    df = pd.DataFrame(qs)
+ARTIFACT = 'linear_next_month'
 
+def train(df):
+    """The next-month expense model from load_monthly_rollups() rows, or None without enough data."""
     if df.empty:
         print("No transaction data found.")
-        return
-    df['amount'] = df['amount'].astype(float)
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-    df['expense'] = df.apply(lambda r: r['amount'] if r['type'] == 'expense' else 0, axis=1)
-    monthly = df.groupby(['user_id', 'month']).agg(
-        expense_total=('expense', 'sum'),
-        num_tx=('amount', 'count'),
-        avg_tx=('amount', 'mean')
-    ).reset_index()
-
-    
-    monthly = monthly.sort_values(['user_id', 'month'])
-    for lag in (1, 2, 3):
-        monthly[f'lag_exp_{lag}'] = monthly.groupby('user_id')['expense_total'].shift(lag)
+        return None
 
-    monthly['month_num'] = monthly['month'].dt.month
-    monthly = monthly.dropna()
+    X, y = expense_training_set(df, ['user_id'])
 
-    if monthly.empty:
+    if X.empty:
         print("Not enough data for training.")
-        return
-
-    X = monthly[['month_num', 'lag_exp_1', 'lag_exp_2', 'lag_exp_3', 'num_tx', 'avg_tx']]
-    y = monthly['expense_total']
+        return None
 
     
     model = LinearRegression()
     model.fit(X, y)
+    return model
 
-    
-    path = settings.BASE_DIR / 'analytics' / 'ml_models' / 'linear_next_month.joblib'
-    joblib.dump(model, path)
-    print(f"Model saved to {path}")
+def train_and_save():
+    model = train(load_monthly_rollups())
+    if model is not None:
+        path = registry.save(model, ARTIFACT)
+        print(f"Model saved to {path}")
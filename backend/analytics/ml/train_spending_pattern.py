@@ -1,38 +1,33 @@
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
-import joblib
-from django.conf import settings
-from transactions.models import Transaction
+from .data import load_transaction_aggregates
+from .registry import registry
 
-def train_and_save():
-    qs = Transaction.objects.all().values('user_id', 'date', 'type', 'amount')
-    df = pd.DataFrame(qs)
-    if df.empty:
-        print("No transaction data found.")
-        return
-    df['amount'] = df['amount'].astype(float)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values(['user_id', 'date'])
-    slopes = {}
-
-    for user_id, group in df.groupby('user_id'):
-        if len(group) < 6:
-            continue
+ARTIFACT = 'spending_pattern_slopes'
 
-        
-        group = group.reset_index(drop=True)
-        X = np.array(range(len(group))).reshape(-1, 1)
-        y = group['amount'].values
+def train(aggregates):
+    """
+    Per-user slope of amount against transaction number (0, 1, ... in
+    date order), the least-squares line through a user's history, from
+    load_transaction_aggregates() rows; or None without enough data.
+    """
+    if aggregates.empty:
+        print("No transaction data found.")
+        return None
 
-        model = LinearRegression()
-        model.fit(X, y)
-        slopes[user_id] = model.coef_[0]
+    users = aggregates.groupby('user_id').agg(
+        n=('count', 'sum'), total=('total', 'sum'), ranked_total=('ranked_total', 'sum'))
+    users = users[users['n'] >= 6]
+    n = users['n'].astype('float64')
+    # With x = 0 .. n-1: sum((x - mean x) * y) / sum((x - mean x) ** 2).
+    slopes = (users['ranked_total'] - (n - 1) / 2 * users['total']) / (n * (n * n - 1) / 12)
+    slopes = dict(zip(users.index.tolist(), slopes.to_numpy()))
 
     if not slopes:
         print("Not enough data for training.")
-        return
+        return None
+    return slopes
 
-    path = settings.BASE_DIR / 'analytics' / 'ml_models' / 'spending_pattern_slopes.joblib'
-    joblib.dump(slopes, path)
-    print(f"Spending pattern slopes saved to {path}")
+def train_and_save():
+    slopes = train(load_transaction_aggregates())
+    if slopes is not None:
+        path = registry.save(slopes, ARTIFACT)
+        print(f"Spending pattern slopes saved to {path}")
@@ -0,0 +1,238 @@
+"""
+Train every analytics model from one load of the base data.
+
+The MonthlyRollup and Transaction tables are each read once, here, and
+the trainers run side by side in a process pool, so a full retrain takes
+about as long as the slowest model instead of the sum of all of them.
+Workers only fit: each returns its artifact to this process, which saves
+it through the registry, so they never touch the database or the models
+directory.
+
+Peak memory is, by default, the peak resident size of the process that
+ran the stage so far (0 where the platform has no getrusage()). With
+trace_memory it is what tracemalloc sees (Python objects and NumPy
+buffers) during that stage alone, which is exact per stage but makes the
+loads several times slower.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from . import train_anomalies, train_category, train_next_month, train_saving, train_spending_pattern
+from .data import (load_monthly_rollups, load_transaction_aggregates, transaction_watermark, user_digests,
+                   users_with_transactions_after)
+from .registry import registry
+
+# stage -> (trainer module, the base data it trains on, whether it takes n_jobs)
+TRAINERS = {
+    'train_next_month': (train_next_month, 'rollups', False),
+    'train_category': (train_category, 'rollups', True),
+    'train_saving': (train_saving, 'rollups', True),
+    'train_anomalies': (train_anomalies, 'transaction_aggregates', False),
+    'train_spending_pattern': (train_spending_pattern, 'transaction_aggregates', False),
+}
+
+# Stages whose artifact is a dict keyed by user id, which incremental runs update per user.
+PER_USER = ('train_anomalies', 'train_spending_pattern')
+
+# Where train_all() records what each stage was trained with (a registry artifact).
+STATE = 'training_state'
+
+# Fraction of users that must have changed before an incremental run retrains a global model.
+MIN_CHANGE = 0.01
+
+LOADERS = {
+    'rollups': load_monthly_rollups,
+    'transaction_aggregates': load_transaction_aggregates,
+}
+
+
+class Stage:
+    """One timed step of a training run."""
+
+    def __init__(self, name, seconds, peak_memory):
+        self.name = name
+        self.seconds = seconds
+        self.peak_memory = peak_memory
+        self.rows = None  # rows loaded, for load stages
+        self.path = None  # artifact written, for training stages
+        self.note = None  # why nothing was written, or what an incremental run updated
+
+
+def _peak_rss():
+    """This process's peak resident size in bytes, 0 if unknown."""
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes, except on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def _measure(name, trace_memory, function, *args, **kwargs):
+    """Run function(*args, **kwargs), under tracemalloc with trace_memory; returns (result, Stage)."""
+    if not trace_memory:
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        return result, Stage(name, time.perf_counter() - start, _peak_rss())
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - before
+        if not tracing:
+            tracemalloc.stop()
+    return result, Stage(name, seconds, peak)
+
+
+def _train(name, data, n_jobs, trace_memory):
+    module, _, parallel = TRAINERS[name]
+    options = {'n_jobs': n_jobs} if parallel else {}
+    return _measure(name, trace_memory, module.train, data, **options)
+
+
+def _changed_users(recorded, digests, added):
+    """
+    Users whose data changed since `recorded` (a stage's entry in the
+    training state); `added` caches users_with_transactions_after().
+    """
+    old = recorded['digests']
+    changed = {user_id for user_id in digests.keys() | old.keys() if digests.get(user_id) != old.get(user_id)}
+    if recorded['watermark'] not in added:
+        added[recorded['watermark']] = users_with_transactions_after(recorded['watermark'])
+    return changed | added[recorded['watermark']]
+
+
+def _plan(names, state, digests, min_change):
+    """
+    For --incremental: stage -> None to train from all the data, or the set
+    of users to recompute; and stage -> why it is skipped.
+    """
+    plans, skipped, added = {}, {}, {}
+    for name in names:
+        if name not in state or registry.get(TRAINERS[name][0].ARTIFACT) is None:
+            plans[name] = None
+            continue
+        changed = _changed_users(state[name], digests, added)
+        if name in PER_USER:
+            if changed:
+                plans[name] = changed
+            else:
+                skipped[name] = 'unchanged, no user changed'
+        elif changed and len(changed) >= min_change * len(digests):
+            plans[name] = None
+        else:
+            skipped[name] = f'unchanged, {len(changed)} of {len(digests)} users changed'
+    return plans, skipped
+
+
+def train_all(only=None, workers=None, n_jobs=None, snapshot=None, incremental=False, min_change=MIN_CHANGE,
+              trace_memory=False):
+    """
+    Load the base data once and train the models in `only` (stage names,
+    default all of TRAINERS) in a pool of `workers` processes (default one
+    per model, at most one per CPU; 1 trains in this process). `n_jobs` is
+    passed to the random forest fits. With a `snapshot` (a Snapshot) the
+    data comes from it instead of the database. `trace_memory` measures
+    each stage's peak with tracemalloc (see above). Saves each artifact
+    and returns the Stages: one per table loaded, then one per model in
+    TRAINERS order.
+
+    Every run records, per stage, the transaction id watermark and each
+    user's digest (data.user_digests()) it trained with. An `incremental`
+    run compares them with the database: the PER_USER artifacts are only
+    recomputed for the users that changed, and the other models are only
+    retrained once at least `min_change` of the users changed since they
+    were (otherwise their Stage says they were skipped).
+    """
+    if incremental and snapshot is not None:
+        raise ValueError("Incremental training compares with the database, so it can't train from a snapshot.")
+    names = [name for name in TRAINERS if only is None or name in only]
+    loaders = LOADERS if snapshot is None else {
+        'rollups': snapshot.monthly_rollups,
+        'transaction_aggregates': snapshot.transaction_aggregates,
+    }
+
+    state = registry.get(STATE) or {}
+    had_state = bool(state)
+    if snapshot is None:
+        # Watermark first: a change made while this runs is seen again next time.
+        watermark = transaction_watermark()
+        digests = user_digests()
+    if incremental:
+        plans, skipped = _plan(names, state, digests, min_change)
+    else:
+        plans, skipped = dict.fromkeys(names), {}
+
+    stages, data = [], {}
+    for source in dict.fromkeys(TRAINERS[name][1] for name in plans):
+        subsets = [plans[name] for name in plans if TRAINERS[name][1] == source]
+        options = {} if None in subsets else {'user_ids': sorted(set().union(*subsets))}
+        data[source], stage = _measure(f'load_{source}', trace_memory, loaders[source], **options)
+        stage.rows = len(data[source])
+        stages.append(stage)
+
+    jobs, results = [], []
+    for name, users in plans.items():
+        frame = data[TRAINERS[name][1]]
+        if users is not None:
+            frame = frame[frame['user_id'].isin(users)]
+            if frame.empty:  # the changed users have no transactions left
+                results.append((None, Stage(name, 0.0, 0)))
+                continue
+        jobs.append((name, frame, n_jobs, trace_memory))
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers == 1 or len(jobs) < 2:
+        results += [_train(*job) for job in jobs]
+    else:
+        # django.setup() lets spawned workers (the default outside Linux) unpickle
+        # the trainers; forked ones already have it done, and must not share our
+        # database connections (they never query, this process reopens them).
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            results += [future.result() for future in [pool.submit(_train, *job) for job in jobs]]
+
+    results = {stage.name: (artifact, stage) for artifact, stage in results}
+    for name in names:
+        if name in skipped:
+            stage = Stage(name, 0.0, 0)
+            stage.note = skipped[name]
+            stages.append(stage)
+            continue
+        artifact, stage = results[name]
+        artifact_name = TRAINERS[name][0].ARTIFACT
+        if plans[name] is not None:
+            # Keep everyone else's entries; changed users without enough data drop out.
+            users = plans[name]
+            kept = {user_id: value for user_id, value in registry.get(artifact_name).items() if user_id not in users}
+            artifact = {**kept, **(artifact or {})}
+            stage.note = f'{len(users)} changed users recomputed'
+        if artifact is not None:
+            stage.path = registry.save(artifact, artifact_name)
+        else:
+            stage.note = 'not enough data, not saved'
+        if snapshot is None:
+            state[name] = {'watermark': watermark, 'digests': digests}
+        else:
+            # Not compared with the database: the next incremental run retrains it from scratch.
+            state.pop(name, None)
+        stages.append(stage)
+
+    if state or had_state:
+        registry.save(state, STATE)
+    return stages
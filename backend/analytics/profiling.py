@@ -0,0 +1,188 @@
+"""
+Profile the analytics pipeline for one user: cProfile for functions,
+tracemalloc for memory per stage, every SQL statement with its time, and
+optionally a sampled collapsed-stack file for flamegraph.pl / speedscope.
+
+Stages are the instrumentation spans the views already mark (the ledger
+load and each helper). Tracing memory and calls slows everything down
+several times, so compare timings between profiles, not with production.
+"""
+import collections
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from backend.instrumentation import RequestTimings, record
+from . import views
+from .ledger import UserLedger
+from .ml.registry import registry
+
+# stage (span) name -> analytics helper
+HELPERS = {
+    'next_month_prediction': '_get_next_month_prediction',
+    'category_forecast': '_get_category_forecast',
+    'savings_prediction': '_get_savings_prediction',
+    'anomalies': '_get_anomalies',
+    'monthly_trends': '_get_monthly_trends',
+    'current_spending': '_get_current_month_spending',
+    'savings_over_time': '_get_savings_over_time',
+    'insights': '_generate_insights',
+    'investment_plan': '_get_investment_plan',
+}
+
+
+class StageRecorder(RequestTimings):
+    """RequestTimings that also keeps every statement and each stage's memory use."""
+
+    def __init__(self):
+        super().__init__()
+        self.statements = []  # (sql, params, seconds)
+        self.stages = []  # (name, seconds, peak bytes, retained bytes)
+        self.peak_memory = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return super().execute_wrapper(execute, sql, params, many, context)
+        finally:
+            self.statements.append((sql, params, time.perf_counter() - start))
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        # Peaks are reset per stage, so nested spans would clip their parent's.
+        before, peak = tracemalloc.get_traced_memory()
+        self.peak_memory = max(self.peak_memory, peak)
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = max(self.peak_memory, peak)
+            self.add_span(name, elapsed)
+            self.stages.append((name, elapsed, peak - before, current - before))
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's Python stack every `interval` seconds, as collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _frame_name(code):
+    path = os.path.normpath(code.co_filename).split(os.sep)
+    return f"{code.co_qualname} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(';', ':')
+
+
+def write_collapsed(stacks, path):
+    """Write 'frame;frame;... count' lines, the input of flamegraph.pl and speedscope."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f'{stack} {count}\n')
+
+
+class ProfileReport:
+    """What one profiled run did: functions, stages, statements and stack samples."""
+
+    def __init__(self, profiler, recorder, elapsed, stacks):
+        self.profiler = profiler
+        self.recorder = recorder
+        self.elapsed = elapsed
+        self.stacks = stacks
+
+    @property
+    def stages(self):
+        return self.recorder.stages
+
+    @property
+    def statements(self):
+        return self.recorder.statements
+
+    @property
+    def peak_memory(self):
+        return self.recorder.peak_memory
+
+    def top_functions(self, limit=25, sort='cumulative'):
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+def _helper_call(name, ledger):
+    """A zero-argument call of one helper with the arguments analytics_view would pass."""
+    function = getattr(views, HELPERS[name])
+    if name == 'savings_over_time':
+        model = registry.get('decision_tree_saving')
+        return lambda: function(ledger, model)
+    if name == 'insights':
+        anomalies = views._get_anomalies(ledger)
+        category_forecast = views._get_category_forecast(ledger)
+        return lambda: function(ledger, anomalies, category_forecast)
+    return lambda: function(ledger)
+
+
+def profile(user_id, helper=None, sample_interval=None):
+    """
+    Compute the user's analytics_view payload as a cache miss does (without
+    the cache or the request around it), or with `helper` just that helper on the user's ledger (loaded beforehand, unprofiled).
+    With `sample_interval` (seconds) the stack is also sampled for a
+    flamegraph. Returns a ProfileReport.
+    """
+    if helper is None:
+        call = functools.partial(views._build_analytics, user_id)
+    else:
+        call = _helper_call(helper, UserLedger.load(user_id))
+
+    recorder = StageRecorder()
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident(), sample_interval) if sample_interval else None
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        with record(recorder):
+            if sampler:
+                sampler.start()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                call()
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                if sampler:
+                    sampler.stop()
+        recorder.peak_memory = max(recorder.peak_memory, tracemalloc.get_traced_memory()[1])
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return ProfileReport(profiler, recorder, elapsed, sampler.stacks if sampler else collections.Counter())
@@ -1,3 +1,653 @@
-from django.test import TestCase
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from sklearn.linear_model import LinearRegression
+
+from transactions import rollups
+from transactions.models import MonthlyRollup, Transaction
+from . import benchmarks, profiling, views
+from .ledger import UserLedger
+from .ml import data, features, snapshot, train_anomalies, train_spending_pattern, training
+from .ml.data import load_monthly_rollups
+from .ml.inference import predict_rows
+from .ml.registry import ARTIFACTS, ModelRegistry, registry
+
+User = get_user_model()
+
+
+def _seed_transactions(user, months):
+    """Create one salary and a handful of expenses per month, ending today."""
+    today = date.today()
+    rows = []
+    for back in range(months):
+        year, month = divmod(today.year * 12 + today.month - 1 - back, 12)
+        month_start = date(year, month + 1, 1)
+        rows.append(Transaction(user=user, date=month_start, type='income',
+                                category='Salary', amount=60000))
+        for day, (category, amount) in enumerate([('Food', 1200), ('Shopping', 3400),
+                                                   ('Food', 800), ('Health', 25000)], start=2):
+            rows.append(Transaction(user=user, date=min(month_start.replace(day=day), today),
+                                    type='expense', category=category, amount=amount))
+    Transaction.objects.bulk_create(rows)
+    rollups.rebuild([user.id])
+
+
+class AnalyticsViewQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ledger@example.com', username='ledger',
+                                             name='Ledger', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_analytics_view_query_count(self):
+        _seed_transactions(self.user, months=8)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('analytics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['monthly_trends'])
+        self.assertTrue(response.data['current_spending'])
+
+    def test_query_count_does_not_grow_with_history(self):
+        _seed_transactions(self.user, months=36)
+
+        with self.assertNumQueries(3):
+            self.client.get(reverse('analytics'))
+
+    def test_empty_user_gets_empty_payload(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('analytics'))
+
+        self.assertEqual(response.data['monthly_trends'], [])
+        self.assertIsNone(response.data['next_month_prediction'])
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cache@example.com', username='cache',
+                                             name='Cache', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        _seed_transactions(self.user, months=6)
+
+    def assert_cached_until_write(self):
+        with self.assertNumQueries(3):
+            first = self.client.get(reverse('analytics')).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('analytics')).data, first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('transaction-list-create'), {
+                'date': date.today(), 'type': 'expense', 'category': 'Travel', 'amount': '999.00',
+            })
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertNumQueries(3):
+            spending = self.client.get(reverse('analytics')).data['current_spending']
+        self.assertIn('Travel', [item['name'] for item in spending])
+
+    def test_locmem_cache(self):
+        self.assert_cached_until_write()
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.assert_cached_until_write()
+
+    def test_update_and_delete_invalidate(self):
+        tx = Transaction.objects.filter(user=self.user, category='Shopping').latest('date')
+        self.client.get(reverse('analytics'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('transaction-detail', args=[tx.pk]), {'amount': '1.00'})
+        with self.assertNumQueries(3):
+            self.client.get(reverse('analytics'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('transaction-detail', args=[tx.pk]))
+        with self.assertNumQueries(3):
+            self.client.get(reverse('analytics'))
+
+    def test_writes_outside_the_api_invalidate(self):
+        first = self.client.get(reverse('analytics')).data
+        # As the admin, the shell or a management command would.
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(user=self.user, date=date.today(), type='expense', category='Travel',
+                                       amount='999.00')
+        spending = self.client.get(reverse('analytics')).data['current_spending']
+        self.assertIn('Travel', [item['name'] for item in spending])
+        self.assertNotEqual(spending, first['current_spending'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.rebuild([self.user.id])  # as after generate_dataset's bulk inserts
+        with self.assertNumQueries(3):
+            self.client.get(reverse('analytics'))
+
+    def test_retrain_invalidates(self):
+        self.client.get(reverse('analytics'))
+        with mock.patch.object(registry, 'fingerprint', return_value='retrained'):
+            with self.assertNumQueries(3):
+                self.client.get(reverse('analytics'))
+
+    def test_investment_plan_is_cached(self):
+        first = self.client.get(reverse('investment-plan')).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('investment-plan')).data, first)
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.registry = ModelRegistry(Path(tmp.name))
+
+    def test_missing_artifact_returns_none(self):
+        self.assertIsNone(self.registry.get('linear_next_month'))
+
+    def test_artifact_is_loaded_once(self):
+        self.registry.save({3: 1.5}, 'spending_pattern_slopes')
+
+        first = self.registry.get('spending_pattern_slopes')
+        self.assertEqual(first, {3: 1.5})
+        self.assertIs(self.registry.get('spending_pattern_slopes'), first)
+
+    def test_new_artifact_is_reloaded(self):
+        path = self.registry.save({3: 1.5}, 'spending_pattern_slopes')
+        self.registry.get('spending_pattern_slopes')
+
+        self.registry.save({3: -2.0}, 'spending_pattern_slopes')
+        # Guarantee a different mtime even on coarse-grained filesystems.
+        os.utime(path, ns=(0, 0))
+
+        self.assertEqual(self.registry.get('spending_pattern_slopes'), {3: -2.0})
+        self.assertEqual(os.listdir(self.registry.models_dir), ['spending_pattern_slopes.joblib'])
+
+    def test_fingerprint_is_the_same_in_every_process(self):
+        self.registry.save({3: 1.5}, 'spending_pattern_slopes')
+        fingerprint = self.registry.fingerprint()
+        # The other artifacts are missing; their stamps must not hash by object identity.
+        script = ('from pathlib import Path; from analytics.ml.registry import ModelRegistry; '
+                  f'print(ModelRegistry(Path({str(self.registry.models_dir)!r})).fingerprint())')
+        other = subprocess.run([sys.executable, '-c', f'import django; django.setup(); {script}'],
+                               capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+                               env={**os.environ, 'PYTHONHASHSEED': 'random'})
+        self.assertEqual(other.stdout.strip(), fingerprint)
+
+        path = self.registry.save({3: -2.0}, 'spending_pattern_slopes')
+        os.utime(path, ns=(0, 0))
+        self.assertNotEqual(self.registry.fingerprint(), fingerprint)
+
+    def test_loads_and_reloads_are_counted(self):
+        def count(kind):
+            return REGISTRY.get_sample_value('moneymate_model_registry_loads_total',
+                                             {'artifact': 'anomaly_stats', 'kind': kind}) or 0
+        loads, reloads = count('load'), count('reload')
+
+        path = self.registry.save({}, 'anomaly_stats')
+        self.registry.get('anomaly_stats')
+        self.registry.get('anomaly_stats')
+        self.registry.save({'Food': {}}, 'anomaly_stats')
+        os.utime(path, ns=(0, 0))
+        self.registry.get('anomaly_stats')
+
+        self.assertEqual((count('load') - loads, count('reload') - reloads), (1, 1))
+
+
+class BenchmarkTests(TestCase):
+    def test_run_times_each_group_without_touching_real_models(self):
+        models_dir = registry.models_dir
+        stamps = [registry._stamp(name) for name in ARTIFACTS]
+
+        report = benchmarks.run(['3x1'], repeat=1, only=['train_anomalies', '_get_anomalies', 'transaction-summary'])
+
+        self.assertEqual(sorted(report['results']), [
+            '3x1/helpers/_get_anomalies', '3x1/train/train_anomalies', '3x1/views/transaction-summary',
+        ])
+        self.assertEqual(report['results']['3x1/views/transaction-summary']['runs'], 1)
+        self.assertEqual(report['meta']['sizes']['3x1']['users'], 3)
+        self.assertEqual(registry.models_dir, models_dir)
+        self.assertEqual([registry._stamp(name) for name in ARTIFACTS], stamps)
+        self.assertFalse(User.objects.filter(username__startswith=benchmarks.PREFIX).exists())
+
+    def test_compare_flags_slowdowns_beyond_the_threshold(self):
+        def report(**timings):
+            return {'results': {key: {'median_ms': ms} for key, ms in timings.items()}}
+
+        rows = benchmarks.compare(report(a=100, b=100, c=100, d=1, e=50),
+                                  report(a=120, b=140, c=60, d=3, f=1), threshold=0.25)
+
+        self.assertEqual([(key, status) for key, *_, status in rows],
+                         [('a', 'ok'), ('b', 'regression'), ('c', 'improvement'), ('d', 'ok')])
+
+    def test_feature_benchmarks_use_an_in_memory_frame(self):
+        with self.assertNumQueries(0):
+            results = benchmarks.run_features(2000, repeat=1, only=['savings'])
+        self.assertEqual(list(results), ['features/2000/savings_by_month'])
+
+    def test_aggregate_benchmarks_use_a_consistent_in_memory_frame(self):
+        with self.assertNumQueries(0):
+            results = benchmarks.run_aggregates(50, repeat=1, only=['spending'])
+        self.assertEqual(list(results), ['aggregates/50/train_spending_pattern'])
+
+        # Every group stands for `count` transactions of its mean, ranked in row order.
+        aggregates = benchmarks.aggregate_frame(3, months=2)
+        slopes = train_spending_pattern.train(aggregates)
+        for user_id, group in aggregates.groupby('user_id'):
+            amounts = np.repeat(group['mean'].to_numpy(), group['count'].to_numpy())
+            model = LinearRegression().fit(np.arange(len(amounts)).reshape(-1, 1), amounts)
+            self.assertAlmostEqual(slopes[user_id], model.coef_[0], delta=1e-9 * abs(model.coef_[0]))
+
+    def test_size_names(self):
+        self.assertEqual(benchmarks.parse_size('medium'), benchmarks.SIZES['medium'])
+        self.assertEqual(benchmarks.parse_size('50x2'), (50, 2))
+        with self.assertRaises(ValueError):
+            benchmarks.parse_size('huge')
+
+
+class ProfileAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='slow@example.com', username='slow', name='Slow',
+                                            password='secret-pass')
+        _seed_transactions(cls.user, 6)
+
+    def test_pipeline_stages_statements_and_flamegraph(self):
+        # A cached payload must not hide the work.
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get(reverse('analytics'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stacks.txt')
+            out = StringIO()
+            call_command('profile_analytics', str(self.user.pk), '--top', '5', '--flamegraph', path,
+                         '--interval', '0.5', stdout=out)
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+
+        output = out.getvalue()
+        for stage in ('ledger', 'category_forecast', 'savings_over_time', 'insights'):
+            self.assertRegex(output, rf'\n  {stage} +[0-9.]+ +[0-9.]+ +-?[0-9.]+\n')
+        self.assertIn('SQL: 3 statements', output)
+        self.assertIn('analytics_view', output)
+        self.assertTrue(lines)
+        self.assertTrue(all(re.fullmatch(r'\S.*;.* [0-9]+', line) for line in lines))
+
+    def test_single_helper(self):
+        report = profiling.profile(self.user.pk, helper='monthly_trends')
+
+        self.assertEqual([stage[0] for stage in report.stages], ['monthly_trends'])
+        self.assertEqual(report.statements, [])
+        self.assertIn('_get_monthly_trends', report.top_functions(10))
+
+
+def _random_rollups(users=30, months=14, seed=1):
+    """MonthlyRollup-shaped rows with gaps, income-only months and categories that come and go."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user_id in range(1, users + 1):
+        for back in rng.choice(months, size=rng.integers(1, months + 1), replace=False):
+            month = pd.Timestamp(2024, 1, 1) + pd.DateOffset(months=int(back))
+            for category, tx_type in [('Salary', 'income'), ('Food', 'expense'), ('Rent', 'expense'),
+                                      ('Gift', 'income'), ('Health', 'expense')]:
+                if rng.random() < 0.7:
+                    rows.append((user_id, month, category, tx_type,
+                                 round(float(rng.lognormal(7, 1.2)), 2), int(rng.integers(1, 20))))
+    return pd.DataFrame(rows, columns=['user_id', 'month', 'category', 'type', 'total', 'count'])
+
+
+class FeatureTests(TestCase):
+    """The shared feature functions reproduce the training sets the trainers used to build inline."""
+
+    def setUp(self):
+        self.rollups = _random_rollups()
+
+    def legacy_expense_training_set(self, keys):
+        df = self.rollups.copy()
+        df['expense'] = np.where(df['type'] == 'expense', df['total'], 0.0)
+        monthly = df.groupby(['user_id', 'month', *keys[1:]]).agg(
+            expense_total=('expense', 'sum'), num_tx=('count', 'sum'), amount_total=('total', 'sum')
+        ).reset_index()
+        monthly['avg_tx'] = monthly['amount_total'] / monthly['num_tx']
+        monthly = monthly.sort_values([*keys, 'month'])
+        for lag in (1, 2, 3):
+            monthly[f'lag_exp_{lag}'] = monthly.groupby(keys)['expense_total'].shift(lag)
+        monthly['month_num'] = monthly['month'].dt.month
+        monthly = monthly.dropna()
+        return monthly[features.EXPENSE_FEATURES], monthly['expense_total']
+
+    def legacy_savings_training_set(self):
+        monthly = self.rollups.groupby(['user_id', 'month', 'type'])['total'].sum().unstack(fill_value=0).reset_index()
+        monthly['savings'] = monthly.get('income', 0) - monthly.get('expense', 0)
+        monthly['month_num'] = monthly['month'].dt.month
+        monthly = monthly.sort_values(['user_id', 'month'])
+        for lag in (1, 2, 3):
+            monthly[f'lag_save_{lag}'] = monthly.groupby('user_id')['savings'].shift(lag)
+        monthly = monthly.dropna()
+        return monthly[features.SAVINGS_FEATURES], monthly['savings']
+
+    def assert_same_set(self, new, old):
+        pd.testing.assert_frame_equal(new[0].reset_index(drop=True), old[0].reset_index(drop=True), check_exact=True)
+        pd.testing.assert_series_equal(new[1].reset_index(drop=True), old[1].reset_index(drop=True), check_exact=True)
+
+    def test_expense_training_set_matches_legacy(self):
+        for keys in (['user_id'], ['user_id', 'category']):
+            new = features.expense_training_set(self.rollups, keys)
+            self.assertGreater(len(new[0]), 50)
+            self.assert_same_set(new, self.legacy_expense_training_set(keys))
+
+    def test_savings_training_set_matches_legacy(self):
+        self.assert_same_set(features.savings_training_set(self.rollups, ['user_id']),
+                             self.legacy_savings_training_set())
+
+    def test_forecast_row_uses_the_latest_months_as_lags(self):
+        transactions = pd.DataFrame({
+            'month': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-02-01', '2024-04-01', '2024-04-01']),
+            'type': ['expense', 'expense', 'income', 'expense', 'expense'],
+            'amount': [100.0, 200.0, 5000.0, 30.0, 60.0],
+        })
+        monthly = features.add_lags(features.expense_by_month(transactions, amount='amount', count=None),
+                                    'expense_total', 'lag_exp', start=0)
+        row = features.latest(monthly, 'lag_exp').iloc[0]
+
+        self.assertEqual([row['lag_exp_1'], row['lag_exp_2'], row['lag_exp_3']], [90.0, 200.0, 100.0])
+        self.assertEqual((row['num_tx'], row['avg_tx']), (2, 45.0))
+        self.assertTrue(features.latest(monthly.iloc[:2], 'lag_exp').empty)
+
+
+class BatchedInferenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='batch@example.com', username='batch', name='Batch',
+                                            password='secret-pass')
+        _seed_transactions(cls.user, 9)
+
+    def setUp(self):
+        self.ledger = UserLedger.load(self.user.pk)
+
+    def test_one_predict_call_per_helper(self):
+        for name, helper, args in [
+            ('decision_tree_category', views._get_category_forecast, ()),
+            ('decision_tree_saving', views._get_savings_over_time, (registry.get('decision_tree_saving'),)),
+        ]:
+            with mock.patch('analytics.views.inference.predict_rows', wraps=predict_rows) as predict:
+                self.assertTrue(helper(self.ledger, *args))
+            self.assertEqual(predict.call_count, 1, name)
+            self.assertIs(predict.call_args.args[0], registry.get(name))
+
+    def test_batched_predictions_equal_single_row_ones(self):
+        monthly = features.add_lags(features.expense_by_month(load_monthly_rollups(self.user.pk)), 'expense_total', 'lag_exp')
+        X = monthly[features.EXPENSE_FEATURES].iloc[features.LAGS:]
+        for name in ('linear_next_month', 'decision_tree_category'):
+            model = registry.get(name)
+            single = [model.predict(X.iloc[[i]])[0] for i in range(len(X))]
+            np.testing.assert_allclose(predict_rows(model, X), single, rtol=1e-12, err_msg=name)
+
+    def test_forest_predictions_equal_predict(self):
+        rng = np.random.default_rng(0)
+        for name, width in (('decision_tree_category', 6), ('decision_tree_saving', 4)):
+            model = registry.get(name)
+            X = rng.normal(scale=5000, size=(50, width))
+            expected = model.predict(pd.DataFrame(X, columns=model.feature_names_in_))
+            np.testing.assert_allclose(predict_rows(model, X), expected, rtol=1e-12, err_msg=name)
+
+
+class TrainingData:
+    """Two seeded users, the second with awkward amounts and dates, and train_into_tmp()."""
+
+    @staticmethod
+    def seed():
+        for i in range(2):
+            user = User.objects.create_user(email=f'train{i}@example.com', username=f'train{i}', name='Train',
+                                            password='secret-pass')
+            _seed_transactions(user, 8 + i)
+        # Cents, repeated dates and a user the chunked loader sees across chunk boundaries.
+        rng = np.random.default_rng(3)
+        Transaction.objects.bulk_create(
+            Transaction(user=user, date=date(2024, 1 + int(month), 1 + int(day)), type='expense', category='Travel',
+                        amount=f'{amount:.2f}')
+            for month, day, amount in zip(rng.integers(0, 12, 60), rng.integers(0, 3, 60), rng.uniform(1, 9000, 60))
+        )
+        rollups.rebuild([user.id])
+
+    def train_into_tmp(self, **kwargs):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch.object(registry, 'models_dir', Path(tmp.name)):
+            stages = training.train_all(**kwargs)
+        return stages, {name: joblib.load(Path(tmp.name) / f'{name}.joblib') for name in ARTIFACTS}
+
+
+class TrainingTests(TrainingData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed()
+
+    def legacy_frame(self):
+        """The frame the trainers used to build with pd.DataFrame(Transaction.objects.values(...))."""
+        df = pd.DataFrame(Transaction.objects.order_by('user_id', 'date', 'id').values('user_id', 'date', 'type', 'amount'))
+        df['amount'] = df['amount'].astype(float)
+        return df
+
+    def test_aggregates_do_not_depend_on_chunk_size(self):
+        whole = data.load_transaction_aggregates()
+        self.assertEqual(len(whole), MonthlyRollup.objects.count())
+        self.assertEqual(whole['count'].sum(), Transaction.objects.count())
+        for chunk_size in (1, 7, 100):
+            chunked = data.load_transaction_aggregates(chunk_size=chunk_size)
+            pd.testing.assert_frame_equal(chunked[data.AGGREGATE_KEYS], whole[data.AGGREGATE_KEYS])
+            pd.testing.assert_frame_equal(chunked, whole, check_exact=False, rtol=1e-12)
+
+    def test_anomaly_stats_match_per_user_pandas(self):
+        expenses = self.legacy_frame().query("type == 'expense'")
+        legacy = {user_id: {'mean': group['amount'].mean(), 'std': group['amount'].std()}
+                  for user_id, group in expenses.groupby('user_id')}
+
+        stats = train_anomalies.train(data.load_transaction_aggregates(chunk_size=7))
+        self.assertEqual(stats.keys(), legacy.keys())
+        for user_id, values in stats.items():
+            for key in ('mean', 'std'):
+                self.assertAlmostEqual(values[key], legacy[user_id][key], delta=1e-9 * legacy[user_id][key])
+
+    def test_slopes_match_per_user_linear_regression(self):
+        legacy = {}
+        for user_id, group in self.legacy_frame().groupby('user_id'):
+            model = LinearRegression().fit(np.arange(len(group)).reshape(-1, 1), group['amount'].values)
+            legacy[user_id] = model.coef_[0]
+
+        slopes = train_spending_pattern.train(data.load_transaction_aggregates(chunk_size=7))
+        self.assertEqual(slopes.keys(), legacy.keys())
+        for user_id, slope in slopes.items():
+            self.assertAlmostEqual(slope, legacy[user_id], delta=1e-9 * abs(legacy[user_id]))
+
+    def test_command_reports_stages(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(registry, 'models_dir', Path(tmp)):
+            call_command('train_ml', '--only', 'train_anomalies', '--workers', '1', stdout=out)
+            self.assertEqual(sorted(os.listdir(tmp)), ['anomaly_stats.joblib', 'training_state.joblib'])
+        self.assertRegex(out.getvalue(), r'load_transaction_aggregates +[\d.]+ +[\d.]+  \d+ rows')
+        self.assertIn('anomaly_stats.joblib', out.getvalue())
+        self.assertNotIn('load_rollups', out.getvalue())
+
+    def test_incremental_runs_retrain_what_changed(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(registry, 'models_dir', Path(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def notes(**kwargs):
+            return {stage.name: stage.note for stage in training.train_all(workers=1, incremental=True, **kwargs)
+                    if stage.name in training.TRAINERS}
+
+        training.train_all(workers=1)
+        stamps = [registry._stamp(name) for name in ARTIFACTS]
+        with self.assertNumQueries(3):  # the watermark, the user digests and the users with newer transactions
+            self.assertTrue(all(note.startswith('unchanged') for note in notes().values()))
+        self.assertEqual([registry._stamp(name) for name in ARTIFACTS], stamps)
+
+        first, second = User.objects.filter(username__startswith='train').order_by('pk')
+        tx = Transaction.objects.filter(user=first, type='expense').latest('id')
+        tx.amount += 1000
+        tx.save()
+        self.assertEqual(notes(min_change=0.9), {
+            'train_next_month': 'unchanged, 1 of 2 users changed',
+            'train_category': 'unchanged, 1 of 2 users changed',
+            'train_saving': 'unchanged, 1 of 2 users changed',
+            'train_anomalies': '1 changed users recomputed',
+            'train_spending_pattern': '1 changed users recomputed',
+        })
+        incremental = {name: registry.get(name) for name in ('anomaly_stats', 'spending_pattern_slopes')}
+        with tempfile.TemporaryDirectory() as full_dir, mock.patch.object(registry, 'models_dir', Path(full_dir)):
+            training.train_all(only=training.PER_USER, workers=1)
+            self.assertEqual(incremental, {name: registry.get(name) for name in incremental})
+
+        # The global models count the change until they retrain.
+        self.assertEqual(notes(min_change=0.5), {
+            'train_next_month': None, 'train_category': None, 'train_saving': None,
+            'train_anomalies': 'unchanged, no user changed', 'train_spending_pattern': 'unchanged, no user changed',
+        })
+
+        second.delete()
+        self.assertEqual(notes(only=training.PER_USER)['train_anomalies'], '1 changed users recomputed')
+        self.assertEqual(list(registry.get('anomaly_stats')), [first.pk])
+        self.assertEqual(list(registry.get('spending_pattern_slopes')), [first.pk])
+
+        # A new day and category in the same month leave the user's MonthlyRollup totals as they were.
+        tx = Transaction.objects.filter(user=first).latest('id')
+        tx.date = tx.date.replace(day=2 if tx.date.day == 1 else 1)
+        tx.category = 'Moved'
+        tx.save()
+        self.assertEqual(notes(only=training.PER_USER)['train_spending_pattern'], '1 changed users recomputed')
+
+
+class PooledTrainingTests(TrainingData, TransactionTestCase):
+    """train_all() closes the connections before it forks, which a TestCase transaction would not survive."""
+
+    def setUp(self):
+        self.seed()
+
+    def test_pool_trains_the_same_models_as_one_process(self):
+        close_all = mock.patch.object(training.connections, 'close_all', wraps=training.connections.close_all)
+        with self.assertNumQueries(4), close_all as closed:  # the watermark and digests, then one query per table
+            stages, pooled = self.train_into_tmp(workers=2, n_jobs=2)
+        closed.assert_called_once()  # forked workers get no open connection
+        traced, serial = self.train_into_tmp(workers=1, trace_memory=True)
+
+        self.assertEqual([stage.name for stage in stages],
+                         ['load_rollups', 'load_transaction_aggregates', *training.TRAINERS])
+        self.assertEqual(stages[1].rows, MonthlyRollup.objects.count())
+        self.assertTrue(all(stage.seconds > 0 and stage.peak_memory > 0 for stage in stages + traced))
+        # A traced stage counts its own allocations, well below the process's resident size.
+        self.assertTrue(all(stage.peak_memory < training._peak_rss() for stage in traced))
+        X = np.random.default_rng(0).normal(scale=5000, size=(20, 6))
+        for name in ('decision_tree_category', 'decision_tree_saving'):
+            self.assertIsNone(pooled[name].n_jobs)
+            width = pooled[name].n_features_in_
+            self.assertEqual(list(pooled[name].predict(X[:, :width])), list(serial[name].predict(X[:, :width])))
+        self.assertEqual(list(pooled['linear_next_month'].coef_), list(serial['linear_next_month'].coef_))
+        self.assertEqual(pooled['anomaly_stats'], serial['anomaly_stats'])
+        self.assertEqual(pooled['spending_pattern_slopes'], serial['spending_pattern_slopes'])
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='snap@example.com', username='snap', name='Snap',
+                                            password='secret-pass')
+        _seed_transactions(cls.user, 7)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'snapshot'
+
+    def assert_matches_table(self, snapshot):
+        rows = list(Transaction.objects.order_by('user_id', 'date', 'id')
+                    .values_list('id', 'user_id', 'date', 'category', 'type', 'amount'))
+        self.assertEqual(snapshot.rows, len(rows))
+        self.assertEqual(snapshot.watermark, max(row[0] for row in rows))
+        columns = [snapshot.column('id'), snapshot.column('user_id'), snapshot.column('date').astype(object),
+                   snapshot.dictionary('category')[snapshot.column('category')],
+                   snapshot.dictionary('type')[snapshot.column('type')], snapshot.column('amount')]
+        self.assertEqual(list(zip(*(column.tolist() for column in columns))),
+                         [(*row[:5], float(row[5])) for row in rows])
+
+    def test_update_appends_rows_above_the_watermark(self):
+        self.assertEqual(snapshot.Snapshot(self.path).update(chunk_size=4), Transaction.objects.count())
+        self.assertEqual(snapshot.Snapshot(self.path).update(), 0)
+        categories = snapshot.Snapshot(self.path).meta['categories']
+
+        # Both go between rows already in the snapshot.
+        for day in (1, 2):
+            Transaction.objects.create(user=self.user, date=date(2024, 3, day), type='expense', category='Pets',
+                                       amount='12.34')
+        before = snapshot.Snapshot(self.path)
+        generation = before.meta['generation']
+        for suffix in ('new', 'bin'):  # left behind by an interrupted update
+            with open(self.path / f'amount.{generation + 1}.{suffix}', 'wb') as f:
+                f.write(b'\0' * 24)
+        reopened = snapshot.Snapshot(self.path)
+        self.assertEqual(reopened.update(chunk_size=3), 2)
+
+        self.assertEqual(reopened.meta['categories'], [*categories, 'Pets'])
+        self.assert_matches_table(reopened)
+        self.assert_matches_table(snapshot.Snapshot(self.path))
+        self.assertEqual(len(before.column('id')), before.rows)  # still reads what it mapped
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         sorted(['meta.json', *(f'{name}.{generation + 1}.bin' for name in snapshot.COLUMNS)]))
+
+        chunk = next(reopened.transaction_chunks(chunk_size=4))
+        self.assertTrue(np.shares_memory(chunk['amount'], reopened.column('amount')))
+
+    def test_full_update_picks_up_edits(self):
+        snapshot.Snapshot(self.path).update()
+        Transaction.objects.filter(category='Food').update(amount=5)
+        Transaction.objects.filter(category='Health').delete()
+
+        self.assertEqual(snapshot.Snapshot(self.path).update(), 0)
+        self.assertEqual(snapshot.Snapshot(self.path).update(full=True), Transaction.objects.count())
+        self.assert_matches_table(snapshot.Snapshot(self.path))
+
+    def test_training_from_a_snapshot_does_not_query(self):
+        snapshot.Snapshot(self.path).update()
+        snap = snapshot.Snapshot(self.path)
+        pd.testing.assert_frame_equal(snap.transaction_aggregates(chunk_size=5), data.load_transaction_aggregates())
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(registry, 'models_dir', Path(tmp)):
+            with self.assertNumQueries(0):
+                stages = training.train_all(only=['train_next_month', 'train_spending_pattern'], workers=1,
+                                            snapshot=snap)
+            self.assertEqual(sorted(os.listdir(tmp)), ['linear_next_month.joblib', 'spending_pattern_slopes.joblib'])
+        self.assertEqual(stages[0].rows, MonthlyRollup.objects.count())
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('snapshot_transactions', str(self.path), stdout=out)
+        self.assertIn(f'Copied {Transaction.objects.count()} transactions', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'is not a snapshot'):
+            call_command('train_ml', '--snapshot', str(self.path.parent / 'missing'))
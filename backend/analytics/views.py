@@ -12,87 +12,41 @@ import pandas as pd
 import numpy as np
 from django.conf import settings
 from transactions.models import Transaction
+from .ledger import UserLedger, month_index, month_start
+from .ml import inference
+from .ml.features import LAGS
+from .ml.registry import registry
+from .cache import analytics_cache_key, get_cached
 from datetime import datetime, timedelta,date
 from django.db.models import Sum, Count, Avg
 from django.db import models
 from django.db.models.functions import TruncMonth
+import logging
 import os,random
-# from django.core.cache import cache
+from django.core.cache import cache
+from backend import metrics
+from backend.instrumentation import span
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def analytics_view(request):
-    # user = request.user
-    # cache_key = f'analytics_data_{user.id}'
-    # cached_data = cache.get(cache_key)
-    # if cached_data:
-    #     return Response(cached_data)
+    user = request.user
+    cache_key = analytics_cache_key('analytics', user.id)
+    cached_data = get_cached('analytics', cache_key)
+    if cached_data is not None:
+        return Response(cached_data)
     try:
-        user = request.user
-        
-        # Get user's transaction data
-        transactions = Transaction.objects.filter(user=user)
-        
-        if not transactions.exists():
-            # Return empty data structure instead of error
-            return Response({
-                'next_month_prediction': None,
-                'category_forecast': {},
-                'savings_prediction': None,
-                'anomalies': [],
-                'monthly_trends': [],
-                'current_spending': [],
-                'savings_over_time': [],
-                'insights': []
-            })
-        
-        # Load ML models
-        models_dir = settings.BASE_DIR / 'analytics' / 'ml_models'
-        
-        # Next month prediction
-        next_month_pred = _get_next_month_prediction(user.id, models_dir)
-        
-        # Category forecast
-        category_forecast = _get_category_forecast(user.id, models_dir)
-        
-        # Savings prediction
-        savings_pred = _get_savings_prediction(user.id, models_dir)
-        
-        # Anomaly detection
-        anomalies = _get_anomalies(user.id, models_dir)
-        
-        # Monthly trends
-        monthly_trends = _get_monthly_trends(user.id,models_dir)
-        
-        # Current month spending by category
-        current_spending = _get_current_month_spending(user.id)
-        
-        # Savings over time
-        savings_model = joblib.load(models_dir / 'decision_tree_saving.joblib')
-        savings_over_time = _get_savings_over_time(user.id,savings_model)
-        
-        # Smart insights
-        insights = _generate_insights(user.id, anomalies, category_forecast)
-        
-        response_data = {
-            'next_month_prediction': next_month_pred,
-            'category_forecast': category_forecast or {},
-            'savings_prediction': savings_pred,
-            'anomalies': anomalies or [],
-            'monthly_trends': monthly_trends or [],
-            'current_spending': current_spending or [],
-            'savings_over_time': savings_over_time or [],
-            'insights': insights or []
-        }
-        
-        # Cache the data for 1 hour
-        # cache.set(cache_key, response_data, timeout=3600)
-
+        response_data = _build_analytics(user.id)
+        # Cached until the user's transactions or the models change
+        cache.set(cache_key, response_data, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
         return Response(response_data)
-        
-    except Exception as e:
-        print(f"Analytics error: {e}")
+
+    except Exception:
+        logger.exception("Analytics failed for user %s; returning the fallback payload", user.id)
+        metrics.ANALYTICS_FALLBACKS.inc()
         # Return default data structure on error
         return Response({
             'next_month_prediction': 35000,
@@ -105,201 +59,159 @@ def analytics_view(request):
             'insights': []
         })
 
-def _get_next_month_prediction(user_id, models_dir):
-    """
-    Predicts the total expense for the next month by replicating the training logic.
-    """
-    try:
-        model = joblib.load(models_dir / 'linear_next_month.joblib')
-        
-        # 1. Fetch the last 4 months of transaction data to calculate 3 lags.
-        four_months_ago = datetime.now() - timedelta(days=120)
-        qs = Transaction.objects.filter(
-            user_id=user_id,
-            date__gte=four_months_ago
-        ).values('date', 'type', 'amount')
 
-        if not qs:
-            return None
+def _build_analytics(user_id):
+    """The analytics_view payload for the user, computed afresh (no cache)."""
+    # Load the user's transactions once; every helper below reads from it
+    with span('ledger'):
+        ledger = UserLedger.load(user_id)
 
-        # 2. Process data using pandas, exactly like in the training script.
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-        df['expense'] = df.apply(lambda r: r['amount'] if r['type'] == 'expense' else 0, axis=1)
+    if ledger.is_empty:
+        # Return empty data structure instead of error
+        empty_data = {
+            'next_month_prediction': None,
+            'category_forecast': {},
+            'savings_prediction': None,
+            'anomalies': [],
+            'monthly_trends': [],
+            'current_spending': [],
+            'savings_over_time': [],
+            'insights': []
+        }
+        return empty_data
 
-        monthly = df.groupby('month').agg(
-            expense_total=('expense', 'sum'),
-            num_tx=('amount', 'count'),
-            avg_tx=('amount', 'mean')
-        ).reset_index().sort_values('month', ascending=False)
-        
-        # 3. Check if we have enough historical data (at least 3 previous months).
-        if len(monthly) < 3:
-            return None
+    # Next month prediction
+    next_month_pred = _get_next_month_prediction(ledger)
 
-        # 4. Create the feature DataFrame with the aggregated monthly data.
-        feature_data = {
-            'month_num': [datetime.now().month],
-            'lag_exp_1': [monthly.iloc[0]['expense_total']], # Most recent month's total
-            'lag_exp_2': [monthly.iloc[1]['expense_total']], # 2nd most recent month's total
-            'lag_exp_3': [monthly.iloc[2]['expense_total']], # 3rd most recent month's total
-            'num_tx': [monthly.iloc[0]['num_tx']],
-            'avg_tx': [monthly.iloc[0]['avg_tx']]
-        }
-        features_df = pd.DataFrame(feature_data)
+    # Category forecast
+    category_forecast = _get_category_forecast(ledger)
 
-        # 5. Predict.
-        prediction = model.predict(features_df)[0]
-        return max(0, prediction)
+    # Savings prediction
+    savings_pred = _get_savings_prediction(ledger)
 
-    except Exception as e:
-        print(f"Error in next month prediction: {e}")
-        return None
+    # Anomaly detection
+    anomalies = _get_anomalies(ledger)
 
-def _get_category_forecast(user_id, models_dir):
-    """
-    Predicts the next month's expense for each category.
-    """
-    try:
-        model = joblib.load(models_dir / 'decision_tree_category.joblib')
-        four_months_ago = datetime.now() - timedelta(days=120)
-        
-        # Get all recent transactions to find distinct categories and process them.
-        qs = Transaction.objects.filter(
-            user_id=user_id,
-            type='expense',
-            date__gte=four_months_ago
-        ).values('date', 'category', 'amount')
+    # Monthly trends
+    monthly_trends = _get_monthly_trends(ledger)
 
-        if not qs:
-            return {}
+    # Current month spending by category
+    current_spending = _get_current_month_spending(ledger)
 
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-
-        forecasts = {}
-        # Loop through each category the user has spent on.
-        for category_name in df['category'].unique():
-            cat_df = df[df['category'] == category_name]
-
-            # Aggregate monthly data for this specific category.
-            monthly_cat = cat_df.groupby('month').agg(
-                expense_total=('amount', 'sum'),
-                num_tx=('amount', 'count'),
-                avg_tx=('amount', 'mean')
-            ).reset_index().sort_values('month', ascending=False)
-            
-            # Check for enough data for this category.
-            if len(monthly_cat) < 3:
-                continue # Skip if not enough historical data for this category
-
-            # Create features for this category.
-            feature_data = {
-                'month_num': [datetime.now().month],
-                'lag_exp_1': [monthly_cat.iloc[0]['expense_total']],
-                'lag_exp_2': [monthly_cat.iloc[1]['expense_total']],
-                'lag_exp_3': [monthly_cat.iloc[2]['expense_total']],
-                'num_tx': [monthly_cat.iloc[0]['num_tx']],
-                'avg_tx': [monthly_cat.iloc[0]['avg_tx']]
-            }
-            features_df = pd.DataFrame(feature_data)
-            
-            # Predict and store the forecast for this category.
-            prediction = model.predict(features_df)[0]
-            forecasts[category_name] = max(0, prediction)
+    # Savings over time
+    savings_model = registry.get('decision_tree_saving')
+    savings_over_time = _get_savings_over_time(ledger,savings_model)
 
-        return forecasts
-        
-    except Exception as e:
-        print(f"Error in category forecast: {e}")
-        return {}
+    # Smart insights
+    insights = _generate_insights(ledger, anomalies, category_forecast)
 
-def _get_savings_prediction(user_id, models_dir):
+    response_data = {
+        'next_month_prediction': next_month_pred,
+        'category_forecast': category_forecast or {},
+        'savings_prediction': savings_pred,
+        'anomalies': anomalies or [],
+        'monthly_trends': monthly_trends or [],
+        'current_spending': current_spending or [],
+        'savings_over_time': savings_over_time or [],
+        'insights': insights or []
+    }
+    return response_data
+
+
+@span('next_month_prediction')
+def _get_next_month_prediction(ledger):
     """
-    Predicts the savings for the next month.
+    Predicts the total expense for the next month by replicating the training logic.
     """
     try:
-        model = joblib.load(models_dir / 'decision_tree_saving.joblib')
-        
-        four_months_ago = datetime.now() - timedelta(days=120)
-        qs = Transaction.objects.filter(
-            user_id=user_id,
-            date__gte=four_months_ago
-        ).values('date', 'type', 'amount')
-
-        if not qs:
+        model = registry.get('linear_next_month')
+        if model is None:
             return None
+        
+        # 1. Take the last 4 months of transaction data to calculate 3 lags.
+        recent = ledger.since(120)
 
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-
-        # Unstack to get income and expense columns.
-        monthly = df.groupby(['month', 'type'])['amount'].sum().unstack(fill_value=0).reset_index()
-        monthly['savings'] = monthly.get('income', 0) - monthly.get('expense', 0)
-        monthly = monthly.sort_values('month', ascending=False)
+        # 2. Aggregate monthly totals with the training features.
+        months, expense, num_tx, avg_tx = inference.expense_by_month(recent)
 
-        if len(monthly) < 3:
+        # 3. Check if we have enough historical data (at least 3 previous months).
+        if len(months) < LAGS:
             return None
 
-        # Create features using monthly savings lags.
-        feature_data = {
-            'month_num': [datetime.now().month],
-            'lag_save_1': [monthly.iloc[0]['savings']],
-            'lag_save_2': [monthly.iloc[1]['savings']],
-            'lag_save_3': [monthly.iloc[2]['savings']]
-        }
-        features_df = pd.DataFrame(feature_data)
+        # 4. Predict from the most recent months, the latest being lag 1.
+        features = [datetime.now().month, *expense[::-1][:LAGS], num_tx[-1], avg_tx[-1]]
+        prediction = inference.predict_rows(model, [features])[0]
+        return max(0, prediction)
 
-        prediction = model.predict(features_df)[0]
-        return prediction
-        
-    except Exception as e:
-        print(f"Error in savings prediction: {e}")
+    except Exception:
+        logger.exception("Error in next month prediction")
         return None
 
-def _get_anomalies(user_id, models_dir):
+@span('category_forecast')
+def _get_category_forecast(ledger):
+    """
+    Predicts the next month's expense for each category.
+    """
     try:
-        model_path = models_dir / 'anomaly_stats.joblib'
-        if not os.path.exists(model_path):
-            return []
+        model = registry.get('decision_tree_category')
+        if model is None:
+            return {}
+        
+        # Get all recent expenses to find distinct categories and process them.
+        recent = ledger.since(120)
+        expenses = recent.where(recent.is_expense)
+
+        # Categories in the order the user first spent on them; those with
+        # fewer than 3 months of history get no forecast.
+        names, first_seen = np.unique(expenses.category, return_index=True)
+        categories, rows = [], []
+        for name in names[np.argsort(first_seen)]:
+            months, expense, num_tx, avg_tx = inference.expense_by_month(expenses.where(expenses.category == name))
+            if len(months) >= LAGS:
+                categories.append(name)
+                rows.append([datetime.now().month, *expense[::-1][:LAGS], num_tx[-1], avg_tx[-1]])
+
+        # One prediction call for every category.
+        if not categories:
+            return {}
+        predictions = inference.predict_rows(model, rows)
+        return {name: max(0, prediction) for name, prediction in zip(categories, predictions)}
         
-        stats = joblib.load(model_path)
-        if user_id not in stats:
+    except Exception:
+        logger.exception("Error in category forecast")
+        return {}
+
+@span('anomalies')
+def _get_anomalies(ledger):
+    try:
+        stats = registry.get('anomaly_stats')
+        if stats is None or ledger.user_id not in stats:
             return []
         
-        user_stats = stats[user_id]
+        user_stats = stats[ledger.user_id]
         mean = user_stats['mean']
         std = user_stats['std']
         
-        # Get recent transactions
-        recent_transactions = Transaction.objects.filter(
-            user_id=user_id,
-            type='expense'
-        ).order_by('-date')[:50]
+        # Get the 50 most recent expenses
+        recent_transactions = ledger.latest_expenses
         
         anomalies = []
-        for tx in recent_transactions:
-            amount = float(tx.amount)
+        for tx_date, category, amount in zip(recent_transactions.date.tolist(), recent_transactions.category,
+                                             recent_transactions.amount.tolist()):
             z_score = abs((amount - mean) / std) if std > 0 else 0
             
             if z_score > 2:  
                 anomalies.append({
-                    'category': tx.category,
+                    'category': category,
                     'amount': amount,
-                    'date': tx.date.strftime('%Y-%m-%d'),
+                    'date': tx_date.strftime('%Y-%m-%d'),
                     'severity': 'high' if z_score > 3 else 'medium'
                 })
         
         return anomalies
         
-    except Exception as e:
-        print(f"Error in anomaly detection: {e}")
+    except Exception:
+        logger.exception("Error in anomaly detection")
         return []
 
 
@@ -388,66 +300,44 @@ def _get_anomalies(user_id, models_dir):
 
 
 
-def _get_monthly_trends(user_id, models_dir):
+@span('monthly_trends')
+def _get_monthly_trends(ledger):
     try:
-        model = joblib.load(models_dir / 'linear_next_month.joblib')
-        
-        # ... (data fetching and processing logic at the top is the same) ...
-        qs = Transaction.objects.filter(user_id=user_id).values('date', 'type', 'amount')
-        if not qs: return []
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-        df['expense'] = df.apply(lambda r: r['amount'] if r['type'] == 'expense' else 0, axis=1)
-        monthly = df.groupby('month').agg(expense_total=('expense', 'sum'), num_tx=('amount', 'count'), avg_tx=('amount', 'mean')).reset_index().sort_values('month', ascending=True)
-        monthly['month_num'] = monthly['month'].dt.month
-        monthly.reset_index(drop=True, inplace=True)
-        
-        results = []
-        # The logic now only appends to results if a prediction can be made
-        if len(monthly) >= 4:
-            for i in range(3, len(monthly)):
-                feature_data = {
-                    'month_num': [monthly.iloc[i]['month_num']],
-                    'lag_exp_1': [monthly.iloc[i-1]['expense_total']],
-                    'lag_exp_2': [monthly.iloc[i-2]['expense_total']],
-                    'lag_exp_3': [monthly.iloc[i-3]['expense_total']],
-                    'num_tx': [monthly.iloc[i-1]['num_tx']],
-                    'avg_tx': [monthly.iloc[i-1]['avg_tx']]
-                }
-                features_df = pd.DataFrame(feature_data)
-                prediction = model.predict(features_df)[0]
-                
-                
-                results.append({
-                    'month': monthly.iloc[i]['month'].strftime('%b'),
-                    'actual': monthly.iloc[i]['expense_total'],
-                    'predicted': max(0, prediction)
-                })
+        model = registry.get('linear_next_month')
+        
+        if model is None or ledger.is_empty: return []
+        months, expense, num_tx, avg_tx = inference.expense_by_month(ledger.monthly, 'total', 'count')
+
+        # Only months with LAGS months before them can be predicted; each
+        # from the months before it, num_tx and avg_tx included. All in one call.
+        if len(months) <= LAGS:
+            return []
+        features = np.column_stack([months[LAGS:] % 12 + 1, inference.lag_matrix(expense),
+                                    num_tx[LAGS - 1:-1], avg_tx[LAGS - 1:-1]])
+        predictions = inference.predict_rows(model, features)
+        results = [
+            {'month': month_start(month).strftime('%b'), 'actual': actual, 'predicted': max(0, prediction)}
+            for month, actual, prediction in zip(months[LAGS:], expense[LAGS:], predictions)
+        ]
         
         
         
         return results
         
-    except Exception as e:
-        print(f"Error in monthly trends backtest: {e}")
+    except Exception:
+        logger.exception("Error in monthly trends backtest")
         return []
 
 
-def _get_current_month_spending(user_id):
+@span('current_spending')
+def _get_current_month_spending(ledger):
     try:
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        category_data = Transaction.objects.filter(
-            user_id=user_id,
-            date__month=current_month,
-            date__year=current_year,
-            type='expense'
-        ).values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
+        monthly = ledger.monthly
+        this_month = month_index(np.datetime64(date.today(), 'D'))
+
+        category_data = monthly.where((monthly.month == this_month) & monthly.is_expense)
+        order = np.argsort(-category_data.total, kind='stable')
+        category_data = zip(category_data.category[order], category_data.total[order])
         
         spending_data = []
         colors = [
@@ -455,17 +345,17 @@ def _get_current_month_spending(user_id):
     '#EC4899', '#3B82F6', '#6366F1', '#F97316'
 ]
         
-        for i, item in enumerate(category_data):
+        for i, (category, total) in enumerate(category_data):
             spending_data.append({
-                'name': item['category'],
-                'value': float(item['total']),
+                'name': category,
+                'value': float(total),
                 'color': colors[i % len(colors)]
             })
         
         return spending_data
         
-    except Exception as e:
-        print(f"Error in current spending: {e}")
+    except Exception:
+        logger.exception("Error in current spending")
         return []
 
 
@@ -522,64 +412,43 @@ def _get_current_month_spending(user_id):
 #         return []
 
 
-def _get_savings_over_time(user_id, model):
+@span('savings_over_time')
+def _get_savings_over_time(ledger, model):
     """
     Performs a backtest to show historical actual savings vs. predicted savings.
     """
     try:
-        qs = Transaction.objects.filter(user_id=user_id).values('date', 'type', 'amount')
-        if not qs:
+        if model is None or ledger.is_empty:
             return []
 
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-
-        monthly = df.groupby(['month', 'type'])['amount'].sum().unstack(fill_value=0).reset_index()
-        monthly['savings'] = monthly.get('income', 0) - monthly.get('expense', 0)
-        monthly['month_num'] = monthly['month'].dt.month
-        monthly = monthly.sort_values('month', ascending=True).reset_index(drop=True)
-        
-        results = []
-        if len(monthly) >= 4:
-            for i in range(3, len(monthly)):
-                feature_data = {
-                    'month_num': [monthly.iloc[i]['month_num']],
-                    'lag_save_1': [monthly.iloc[i-1]['savings']],
-                    'lag_save_2': [monthly.iloc[i-2]['savings']],
-                    'lag_save_3': [monthly.iloc[i-3]['savings']]
-                }
-                features_df = pd.DataFrame(feature_data)
-                
-                prediction = model.predict(features_df)[0]
-                
-
-                results.append({
-                    'month': monthly.iloc[i]['month'].strftime('%b'),
-                    'actual': monthly.iloc[i]['savings'],
-                    'predicted': prediction
-                })
+        months, savings = inference.savings_by_month(ledger.monthly, 'total')
+        if len(months) <= LAGS:
+            return []
+        features = np.column_stack([months[LAGS:] % 12 + 1, inference.lag_matrix(savings)])
+        predictions = inference.predict_rows(model, features)
+        results = [
+            {'month': month_start(month).strftime('%b'), 'actual': actual, 'predicted': prediction}
+            for month, actual, prediction in zip(months[LAGS:], savings[LAGS:], predictions)
+        ]
         
         return results
         
-    except Exception as e:
-        print(f"Error in savings over time backtest: {e}")
+    except Exception:
+        logger.exception("Error in savings over time backtest")
         return []
 
 
 
 # in analytics/views.py
 
-def _generate_insights(user_id, anomalies, category_forecast):
+@span('insights')
+def _generate_insights(ledger, anomalies, category_forecast):
     try:
         # We will generate all possible insights first, then intelligently select them.
         potential_warnings = []
         potential_positives = []
         potential_info = []
 
-        models_dir = settings.BASE_DIR / 'analytics' / 'ml_models'
-
         # --- Generate Potential Warnings ---
         # 1. Anomalies
         if anomalies:
@@ -591,10 +460,9 @@ def _generate_insights(user_id, anomalies, category_forecast):
                 })
         
         # 2. Savings Rate
-        today = date.today()
-        thirty_days_ago = today - timedelta(days=30)
-        recent_expenses = Transaction.objects.filter(user_id=user_id, type='expense', date__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total'] or 0
-        recent_income = Transaction.objects.filter(user_id=user_id, type='income', date__gte=thirty_days_ago).aggregate(total=Sum('amount'))['total'] or 0
+        recent = ledger.since(30)
+        recent_expenses = recent.amount[recent.is_expense].sum()
+        recent_income = recent.amount[~recent.is_expense].sum()
         
         if recent_income > 0:
             savings_rate = ((recent_income - recent_expenses) / recent_income) * 100
@@ -614,8 +482,8 @@ def _generate_insights(user_id, anomalies, category_forecast):
         # --- Generate Potential Positives & Info ---
         # 3. Budget Discipline
         try:
-            slopes_model = joblib.load(models_dir / 'spending_pattern_slopes.joblib')
-            user_slope = slopes_model.get(user_id, 0)
+            slopes_model = registry.get('spending_pattern_slopes') or {}
+            user_slope = slopes_model.get(ledger.user_id, 0)
             if user_slope > 5:
                 potential_info.append({ # A rising trend is informational
                     'type': 'info', 'title': 'Spending Trend',
@@ -666,8 +534,8 @@ def _generate_insights(user_id, anomalies, category_forecast):
 
         return final_insights[:6]
         
-    except Exception as e:
-        print(f"Error in generating insights: {e}")
+    except Exception:
+        logger.exception("Error in generating insights")
         return []
 
 
@@ -825,48 +693,35 @@ from django.db.models import Sum
 import os,random
 
 
-def _get_savings_prediction(user_id, models_dir):
+@span('savings_prediction')
+def _get_savings_prediction(ledger):
     """A helper function to predict savings. Ensure this is in your views.py."""
     try:
-        model = joblib.load(models_dir / 'decision_tree_saving.joblib')
-        four_months_ago = datetime.now() - timedelta(days=120)
-        qs = Transaction.objects.filter(user_id=user_id, date__gte=four_months_ago).values('date', 'type', 'amount')
-        if not qs: return 50000.0 # Default for demonstration
-        df = pd.DataFrame(list(qs))
-        df['amount'] = df['amount'].astype(float)
-        df['date'] = pd.to_datetime(df['date'])
-        df['month'] = df['date'].dt.to_period('M').dt.to_timestamp()
-        monthly = df.groupby(['month', 'type'])['amount'].sum().unstack(fill_value=0).reset_index()
-        monthly['savings'] = monthly.get('income', 0) - monthly.get('expense', 0)
-        monthly = monthly.sort_values('month', ascending=False)
-        if len(monthly) < 3: return 50000.0 # Default for demonstration
-        feature_data = {
-            'month_num': [datetime.now().month],
-            'lag_save_1': [monthly.iloc[0]['savings']],
-            'lag_save_2': [monthly.iloc[1]['savings']],
-            'lag_save_3': [monthly.iloc[2]['savings']]
-        }
-        features_df = pd.DataFrame(feature_data)
-        prediction = model.predict(features_df)[0]
+        model = registry.get('decision_tree_saving')
+        if model is None: return 50000.0 # Default for demonstration
+        months, savings = inference.savings_by_month(ledger.since(120))
+        if len(months) < LAGS: return 50000.0 # Default for demonstration
+        features = [datetime.now().month, *savings[::-1][:LAGS]]
+        prediction = inference.predict_rows(model, [features])[0]
         return prediction if prediction > 0 else 50000.0
-    except Exception as e:
-        print(f"Error in savings prediction: {e}")
+    except Exception:
+        logger.exception("Error in savings prediction")
         return 50000.0 # Default for demonstration
 
-def _get_investment_plan(user_id, models_dir):
+@span('investment_plan')
+def _get_investment_plan(ledger):
     """
     Generates a personalized investment plan with ALL available options for the user to choose from.
     """
     try:
-        predicted_surplus = _get_savings_prediction(user_id, models_dir)
+        predicted_surplus = _get_savings_prediction(ledger)
         if predicted_surplus <= 0:
             return {'error': 'Your predicted savings are not positive.'}
 
-        slopes_model_path = models_dir / 'spending_pattern_slopes.joblib'
+        slopes_model = registry.get('spending_pattern_slopes')
         risk_profile = "Moderate"
-        if os.path.exists(slopes_model_path):
-            slopes_model = joblib.load(slopes_model_path)
-            user_slope = slopes_model.get(user_id, 0)
+        if slopes_model is not None:
+            user_slope = slopes_model.get(ledger.user_id, 0)
             if user_slope > 5: risk_profile = "Aggressive"
             elif user_slope < -5: risk_profile = "Conservative"
 
@@ -904,8 +759,8 @@ def _get_investment_plan(user_id, models_dir):
             'investment_options': all_investment_options 
         }
 
-    except Exception as e:
-        print(f"Error in investment plan generation: {e}")
+    except Exception:
+        logger.exception("Error in investment plan generation")
         return {'error': 'Could not generate an investment plan at this time.'}
 
 
@@ -913,11 +768,18 @@ def _get_investment_plan(user_id, models_dir):
 @permission_classes([IsAuthenticated])
 def investment_plan_view(request):
     user = request.user
-    models_dir = settings.BASE_DIR / 'analytics' / 'ml_models'
-    plan = _get_investment_plan(user.id, models_dir)
+    cache_key = analytics_cache_key('investment_plan', user.id)
+    plan = get_cached('investment_plan', cache_key)
+    if plan is not None:
+        return Response(plan)
+
+    with span('ledger'):
+        ledger = UserLedger.load(user.id)
+    plan = _get_investment_plan(ledger)
     
     if 'error' in plan:
         return Response(plan, status=400)
     
+    cache.set(cache_key, plan, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
     return Response(plan)
 
@@ -1,3 +1,362 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from transactions import balances, rollups
+from transactions.models import Transaction
+
+User = get_user_model()
+
+PASSWORD = 'budget-secret'
+
+
+def _seed(user, count):
+    """`count` transactions over two years, plus rows every user has today."""
+    today = date.today()
+    rows = [
+        Transaction(user=user, date=today.replace(day=1), category='Salary', type='income', amount=60000),
+        Transaction(user=user, date=today, category='Food', type='expense', amount=250),
+        Transaction(user=user, date=today, category='Food', type='expense', amount=120),
+    ]
+    categories = ['Food', 'Shopping', 'Health', 'Transportation']
+    for i in range(count):
+        rows.append(Transaction(user=user, date=today - timedelta(days=1 + i * 730 // count),
+                                category=categories[i % len(categories)],
+                                type='income' if i % 10 == 0 else 'expense', amount=100 + i))
+    Transaction.objects.bulk_create(rows)
+    rollups.rebuild([user.id])
+    balances.refresh(user.id)
+
+
+def _api_routes(resolver=None, prefix=''):
+    """Every route under api/, as the URL pattern string."""
+    routes = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            routes.extend(_api_routes(pattern, route))
+        elif isinstance(pattern, URLPattern) and route.startswith('api/'):
+            routes.append(route)
+    return routes
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every API endpoint runs within a fixed number of SQL queries.
+
+    Each request is made once for a user with a handful of transactions and
+    once for a user with hundreds; both must issue the same number of
+    queries, and no more than the endpoint's budget. Requests authenticate
+    with a real JWT, so budgets include the user lookup.
+    """
+
+    # route (as in the URLconf) -> budget; every api/ route must be listed.
+    BUDGETS = {
+        'api/test/': 0,
+        'api/users/signup/': 3,
+        'api/users/send-otp/': 11,  # session create + save
+        'api/users/verify-otp/': 4,
+        'api/users/reset-password/': 2,
+        'api/users/login/': 2,
+        'api/users/token/refresh/': 1,
+        'api/users/profile/': 2,
+        'api/users/change-password/': 2,
+        'api/transactions/': 8,  # POST: insert + rollup/balance update
+        'api/transactions/<int:pk>/': 11,  # PATCH/DELETE: row lock + rollup/balance update
+        'api/transactions/bulk/': 11,
+        'api/transactions/import/': 7,
+        'api/transactions/export/': 2,
+        'api/transactions/summary/': 2,
+        'api/transactions/daily-trend/': 2,
+        'api/analytics/': 4,  # auth + the three UserLedger queries
+        'api/analytics/investment-plan/': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.light = User.objects.create_user(email='light@example.com', username='light', name='Light',
+                                             password=PASSWORD)
+        cls.heavy = User.objects.create_user(email='heavy@example.com', username='heavy', name='Heavy',
+                                             password=PASSWORD)
+        _seed(cls.light, 5)
+        _seed(cls.heavy, 600)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def today_food(self, user):
+        return Transaction.objects.filter(user=user, date=date.today(), category='Food').order_by('id').first()
+
+    def assert_budget(self, route, request, status=200, authenticate=True, prepare=None):
+        """
+        Run request(user) for both users and check its query count. With
+        `prepare`, request(user, prepare(user)) is run and only the request
+        is counted.
+        """
+        counts = []
+        for user in (self.light, self.heavy):
+            cache.clear()
+            self.client = APIClient()
+            if authenticate:
+                self.authenticate(user)
+            args = (user, prepare(user)) if prepare else (user,)
+            with CaptureQueriesContext(connection) as ctx:
+                response = request(*args)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1], f"{route}: query count grows with the number of transactions")
+        self.assertLessEqual(counts[0], self.BUDGETS[route],
+                             f"{route}: {counts[0]} queries, budget {self.BUDGETS[route]}")
+
+    def test_every_api_route_has_a_budget(self):
+        self.assertEqual(sorted(_api_routes()), sorted(self.BUDGETS))
+
+    def test_test_view(self):
+        self.assert_budget('api/test/', lambda user: self.client.get('/api/test/'), authenticate=False)
+
+    # Users
+
+    def test_signup(self):
+        def signup(user):
+            return self.client.post('/api/users/signup/', {
+                'email': f'new-{user.username}@example.com', 'username': f'new-{user.username}',
+                'name': 'New', 'password': PASSWORD,
+            })
+        self.assert_budget('api/users/signup/', signup, status=201, authenticate=False)
+
+    def test_password_reset_flow(self):
+        def send(user):
+            return self.client.post('/api/users/send-otp/', {'email': user.email})
+        self.assert_budget('api/users/send-otp/', send, authenticate=False)
+
+        def send_otp(user):
+            self.client.post('/api/users/send-otp/', {'email': user.email})
+            return self.client.session['otp']
+
+        def verify(user, otp):
+            return self.client.post('/api/users/verify-otp/', {'email': user.email, 'otp': otp})
+        self.assert_budget('api/users/verify-otp/', verify, authenticate=False, prepare=send_otp)
+
+        def reset(user):
+            return self.client.post('/api/users/reset-password/', {'email': user.email, 'new_password': PASSWORD})
+        self.assert_budget('api/users/reset-password/', reset, authenticate=False)
+
+    def test_login_and_refresh(self):
+        def login(user):
+            return self.client.post('/api/users/login/', {'email': user.email, 'password': PASSWORD})
+        self.assert_budget('api/users/login/', login, authenticate=False)
+
+        def refresh(user, token):
+            return self.client.post('/api/users/token/refresh/', {'refresh': token})
+        self.assert_budget('api/users/token/refresh/', refresh, authenticate=False,
+                           prepare=lambda user: str(RefreshToken.for_user(user)))
+
+    def test_profile(self):
+        self.assert_budget('api/users/profile/', lambda user: self.client.get(reverse('user-profile')))
+        self.assert_budget('api/users/profile/',
+                           lambda user: self.client.patch(reverse('user-profile'), {'name': 'Renamed'}))
+
+    def test_change_password(self):
+        self.assert_budget('api/users/change-password/', lambda user: self.client.put(
+            reverse('change-password'), {'old_password': PASSWORD, 'new_password': PASSWORD}))
+
+    # Transactions
+
+    def test_transaction_list_and_create(self):
+        url = reverse('transaction-list-create')
+        self.assert_budget('api/transactions/', lambda user: self.client.get(url))
+        self.assert_budget('api/transactions/', lambda user: self.client.post(url, {
+            'date': date.today(), 'type': 'expense', 'category': 'Food', 'amount': '42.00'}), status=201)
+
+    def test_transaction_detail(self):
+        def url(user):
+            return reverse('transaction-detail', args=[self.today_food(user).pk])
+        route = 'api/transactions/<int:pk>/'
+        self.assert_budget(route, lambda user, url: self.client.get(url), prepare=url)
+        self.assert_budget(route, lambda user, url: self.client.patch(url, {'amount': '99.00'}), prepare=url)
+        self.assert_budget(route, lambda user, url: self.client.delete(url), status=204, prepare=url)
+
+    def test_bulk(self):
+        def bulk(user, food):
+            return self.client.post(reverse('transaction-bulk'), {
+                'create': [{'date': date.today(), 'type': 'expense', 'category': 'Food', 'amount': '5.00'}] * 3,
+                'update': [{'id': food.pk, 'amount': '7.00'}],
+            }, format='json')
+        self.assert_budget('api/transactions/bulk/', bulk, prepare=self.today_food)
+
+    def test_import(self):
+        def upload(user):
+            text = 'date,type,category,amount,description\n' + f'{date.today()},expense,Food,12.50,Lunch\n' * 3
+            return self.client.post(reverse('transaction-import'), {
+                'file': SimpleUploadedFile('import.csv', text.encode(), content_type='text/csv')
+            }, format='multipart')
+        self.assert_budget('api/transactions/import/', upload, status=201)
+
+    def test_export(self):
+        self.assert_budget('api/transactions/export/', lambda user: self.client.get(reverse('transaction-export')))
+        self.assert_budget('api/transactions/export/',
+                           lambda user: self.client.get(reverse('transaction-export'), {'format': 'json'}))
+
+    def test_summary_and_daily_trend(self):
+        self.assert_budget('api/transactions/summary/', lambda user: self.client.get(reverse('transaction-summary')))
+        self.assert_budget('api/transactions/daily-trend/',
+                           lambda user: self.client.get(reverse('transaction-daily-trend')))
+
+    # Analytics
+
+    def test_analytics(self):
+        self.assert_budget('api/analytics/', lambda user: self.client.get(reverse('analytics')))
+        self.assert_budget('api/analytics/investment-plan/',
+                           lambda user: self.client.get(reverse('investment-plan')))
+
+    def test_export_command(self):
+        def export(users):
+            path = tempfile.mktemp(suffix='.csv')
+            try:
+                with CaptureQueriesContext(connection) as ctx:
+                    call_command('export_transactions', path, *[f'--user={u.pk}' for u in users], stdout=StringIO())
+            finally:
+                os.path.exists(path) and os.remove(path)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(export([self.light]), export([self.heavy]))
+        self.assertEqual(export([self.light, self.heavy]), 1)
+
+
+class RequestTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='timed@example.com', username='timed', name='Timed',
+                                            password=PASSWORD)
+        _seed(cls.user, 50)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_analytics_request_reports_queries_and_stage_spans(self):
+        with self.assertLogs('backend.instrumentation', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('analytics'))
+
+        metrics = {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', metrics['db'])
+        for name in ('app', 'total', 'ledger', 'category_forecast', 'savings_over_time', 'insights'):
+            self.assertIn(name, metrics)
+
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['path'], reverse('analytics'))
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['db_queries'], len(ctx.captured_queries))
+        self.assertTrue(line['slowest_query'].startswith('SELECT'))
+        self.assertGreater(line['spans_ms']['ledger'], 0)
+        self.assertAlmostEqual(line['db_ms'] + line['python_ms'], line['total_ms'], places=2)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_turned_off(self):
+        with self.assertLogs('backend.instrumentation', 'INFO'):
+            response = self.client.get(reverse('transaction-summary'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_analytics_failure_is_logged(self):
+        with mock.patch('analytics.views.UserLedger.load', side_effect=RuntimeError('boom')), \
+                self.assertLogs('analytics.views', 'ERROR') as logs:
+            response = self.client.get(reverse('analytics'))
+        self.assertEqual(response.data['next_month_prediction'], 35000)
+        self.assertIn('boom', logs.output[0])
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='metered@example.com', username='metered', name='Metered',
+                                            password=PASSWORD)
+        _seed(cls.user, 20)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_dashboard_request_is_measured(self):
+        route = {'view': 'api/analytics/', 'method': 'GET'}
+        requests = _sample('moneymate_http_request_duration_seconds_count', status='200', **route)
+        queries = _sample('moneymate_http_request_db_queries_sum', **route)
+        stages = _sample('moneymate_stage_duration_seconds_count', stage='category_forecast')
+        misses = _sample('moneymate_analytics_cache_lookups_total', payload='analytics', result='miss')
+        hits = _sample('moneymate_analytics_cache_lookups_total', payload='analytics', result='hit')
+
+        self.client.get(reverse('analytics'))
+        self.client.get(reverse('analytics'))
+
+        self.assertEqual(_sample('moneymate_http_request_duration_seconds_count', status='200', **route) - requests, 2)
+        self.assertGreater(_sample('moneymate_http_request_db_queries_sum', **route), queries)
+        self.assertEqual(_sample('moneymate_stage_duration_seconds_count', stage='category_forecast') - stages, 1)
+        self.assertEqual(_sample('moneymate_analytics_cache_lookups_total', payload='analytics', result='miss')
+                         - misses, 1)
+        self.assertEqual(_sample('moneymate_analytics_cache_lookups_total', payload='analytics', result='hit')
+                         - hits, 1)
+
+    def test_fallback_is_counted(self):
+        fallbacks = _sample('moneymate_analytics_fallback_total')
+        with mock.patch('analytics.views.UserLedger.load', side_effect=RuntimeError('boom')), \
+                self.assertLogs('analytics.views', 'ERROR'):
+            self.client.get(reverse('analytics'))
+        self.assertEqual(_sample('moneymate_analytics_fallback_total') - fallbacks, 1)
+
+    def test_endpoint_serves_text_format(self):
+        self.client.get(reverse('transaction-summary'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE moneymate_http_request_duration_seconds histogram', body)
+        self.assertIn('view="api/transactions/summary/"', body)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='scrape-secret')
+    def test_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret').status_code,
+                         200)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_multiprocess_directory_is_aggregated(self):
+        # Two "workers" write their counters to the shared directory.
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=tmp)
+            script = ('from prometheus_client import Counter; '
+                      'Counter("moneymate_analytics_fallback", "").inc(3)')
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', script], env=env, check=True)
+
+            with mock.patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=tmp):
+                body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('moneymate_analytics_fallback_total 6.0', body)
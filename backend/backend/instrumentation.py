@@ -0,0 +1,158 @@
+"""
+Per-request timing: SQL query count and time, Python time, the slowest
+query and named spans, reported in a Server-Timing header and one JSON log
+line per request.
+
+Code marks a stage with span():
+
+    with span('ledger'):
+        ledger = UserLedger.load(user.id)
+
+    @span('category_forecast')
+    def _get_category_forecast(ledger): ...
+
+Outside a request (management commands, benchmarks) spans cost a
+contextvar lookup and record nothing.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+SLOWEST_SQL_LENGTH = 500
+
+
+class RequestTimings:
+    """What one request spent its time on; durations in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.spans = {}
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """A connection.execute_wrapper() hook recording every statement."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+    def add_span(self, name, elapsed):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """Time the block as span `name`; span() calls this, subclasses may record more."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start)
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    """The RequestTimings of the request being handled, or None."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time a block (or, as a decorator, every call) as the named span of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.measure(name):
+        yield
+
+
+@contextlib.contextmanager
+def record(timings):
+    """Record every query on every connection, and every span, into `timings` for the block."""
+    token = _current.set(timings)
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+def _metric_name(name):
+    # Server-Timing metric names are HTTP tokens.
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+def server_timing(timings, total):
+    """The Server-Timing header value; durations in milliseconds."""
+    entries = [
+        f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+        f'app;dur={(total - timings.db_time) * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    entries += [f'{_metric_name(name)};dur={elapsed * 1000:.1f}' for name, elapsed in timings.spans.items()]
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware:
+    """
+    Record every request's SQL and span timings, add them to the response as
+    a Server-Timing header (when settings.SERVER_TIMING_HEADER is true), log
+    them as one JSON line on the 'backend.instrumentation' logger and feed
+    the Prometheus histograms, labelled by URL route.
+
+    Queries run while a streaming response is being sent happen after this
+    middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record(RequestTimings()) as timings:
+            response = self.get_response(request)
+
+        total = timings.total_time
+        match = getattr(request, 'resolver_match', None)
+        metrics.observe_request(match.route if match else 'unmatched', request.method,
+                                response.status_code, timings, total)
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = server_timing(timings, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'db_queries': timings.queries,
+            'db_ms': round(timings.db_time * 1000, 3),
+            'python_ms': round((total - timings.db_time) * 1000, 3),
+            'slowest_query_ms': round(timings.slowest_time * 1000, 3),
+            'slowest_query': timings.slowest_sql and timings.slowest_sql[:SLOWEST_SQL_LENGTH],
+            'spans_ms': {name: round(elapsed * 1000, 3) for name, elapsed in timings.spans.items()},
+        }))
+        return response
@@ -0,0 +1,90 @@
+"""
+Prometheus metrics, served in the text exposition format at /metrics.
+
+With several worker processes (gunicorn, uwsgi) each process has its own
+counters. Point PROMETHEUS_MULTIPROC_DIR at an empty directory shared by
+the workers, set before they start and wiped on every deploy; every
+process then writes its values there and /metrics aggregates them, so any
+worker can answer a scrape. Under gunicorn also call
+mark_process_dead(worker.pid) from the `child_exit` server hook.
+
+Only the addresses in METRICS_ALLOWED_IPS and requests carrying the
+METRICS_TOKEN bearer token may read /metrics; anyone else gets a 403.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# Dashboard requests take tens of milliseconds to a few seconds.
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+REQUEST_LATENCY = Histogram(
+    'moneymate_http_request_duration_seconds', 'Time to produce a response, by URL route.',
+    ['view', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'moneymate_http_request_db_queries', 'SQL queries issued while handling a request.',
+    ['view', 'method'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'moneymate_http_request_db_duration_seconds', 'Time spent in SQL while handling a request.',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    'moneymate_stage_duration_seconds', 'Time spent in a named span, e.g. one analytics stage.',
+    ['stage'], buckets=LATENCY_BUCKETS,
+)
+MODEL_LOADS = Counter(
+    'moneymate_model_registry_loads_total',
+    'Model artifacts unpickled by the registry; kind is "load" the first time, "reload" after a retrain.',
+    ['artifact', 'kind'],
+)
+CACHE_LOOKUPS = Counter(
+    'moneymate_analytics_cache_lookups_total', 'Analytics payload cache lookups, by payload and result.',
+    ['payload', 'result'],
+)
+ANALYTICS_FALLBACKS = Counter(
+    'moneymate_analytics_fallback_total',
+    'Times analytics_view failed and answered with its hard-coded default payload.',
+)
+
+
+def observe_request(route, method, status, timings, total):
+    """Record one handled request, given its RequestTimings and total duration in seconds."""
+    REQUEST_LATENCY.labels(route, method, str(status)).observe(total)
+    REQUEST_QUERIES.labels(route, method).observe(timings.queries)
+    REQUEST_DB_TIME.labels(route, method).observe(timings.db_time)
+    for name, elapsed in timings.spans.items():
+        STAGE_LATENCY.labels(name).observe(elapsed)
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges from the multiprocess directory (a no-op without one)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def _may_scrape(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.encode(), settings.METRICS_TOKEN.encode())
+
+
+def metrics_view(request):
+    """Every metric, summed over all worker processes when PROMETHEUS_MULTIPROC_DIR is set."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -10,8 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 db_password = config('DB_PASSWORD')
 email = config('EMAIL')
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be at the top
+    'backend.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware', 
@@ -226,6 +228,67 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Load the analytics ML models when the app starts instead of on first request
+ANALYTICS_PRELOAD_MODELS = True
+
+# Cache
+# Local memory is per process. Use FileBasedCache or Redis to share the
+# analytics cache between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'moneymate',
+    }
+}
+
+# Analytics payloads are invalidated when the data changes; this is only
+# an upper bound on how long an entry may sit in the cache.
+ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Default number of transactions per page of /api/transactions/ (clients may
+# ask for up to 500 with ?page_size=).
+TRANSACTIONS_PAGE_SIZE = 50
+
+# Most operations accepted in one request to /api/transactions/bulk/.
+TRANSACTIONS_BULK_LIMIT = 5000
+
+# Add per-request DB and analytics stage timings to responses as a
+# Server-Timing header; they are always written to the request log.
+SERVER_TIMING_HEADER = True
+
+# Request, SQL, analytics stage, model registry and cache metrics are served
+# in Prometheus format at /metrics. With several worker processes set the
+# PROMETHEUS_MULTIPROC_DIR environment variable (see backend/metrics.py).
+# Only clients at METRICS_ALLOWED_IPS, or sending "Authorization: Bearer
+# <METRICS_TOKEN>" when a token is set, may read them. Behind a reverse proxy
+# on the same host every request comes from 127.0.0.1: block /metrics at the
+# proxy, or empty the list and give the scraper the token.
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# The request log is quiet under `manage.py test` unless REQUEST_LOG_LEVEL is set.
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        # One JSON line per request with its SQL and span timings.
+        'backend.instrumentation': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+        'analytics': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -16,11 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('api/users/', include('users.urls')),
     path('api/transactions/', include('transactions.urls')),
-    path('api/analytics/', include('analytics.urls'))
+    path('api/analytics/', include('analytics.urls')),
+    path('metrics', metrics_view, name='metrics'),
     ]
@@ -0,0 +1,126 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Sum, When
+
+from .models import MonthlyRollup, Transaction, UserBalance
+
+FIELDS = ('lifetime_income', 'lifetime_expense', 'month_income', 'month_expense')
+
+
+def current_month():
+    return date.today().replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _totals(qs, amount, in_month):
+    sums = qs.aggregate(
+        lifetime_income=Sum(amount, filter=Q(type='income')),
+        lifetime_expense=Sum(amount, filter=Q(type='expense')),
+        month_income=Sum(amount, filter=Q(type='income') & in_month),
+        month_expense=Sum(amount, filter=Q(type='expense') & in_month),
+    )
+    return {field: sums[field] or Decimal(0) for field in FIELDS}
+
+
+def compute_from_rollups(user_id, month):
+    return _totals(MonthlyRollup.objects.filter(user_id=user_id), 'total', Q(month=month))
+
+
+def compute_from_transactions(user_id, month):
+    in_month = Q(date__gte=month, date__lt=_next_month(month))
+    return _totals(Transaction.objects.filter(user_id=user_id), 'amount', in_month)
+
+
+def refresh(user_id):
+    """Recompute a user's balance from MonthlyRollup for the current month."""
+    month = current_month()
+    with transaction.atomic():
+        balance = UserBalance.objects.select_for_update().filter(pk=user_id).first()
+        totals = compute_from_rollups(user_id, month)
+        if balance is None:
+            try:
+                with transaction.atomic():
+                    return UserBalance.objects.create(user_id=user_id, month=month, **totals)
+            except IntegrityError:
+                # Created concurrently; lock that row and recompute.
+                return refresh(user_id)
+        balance.month = month
+        for field, value in totals.items():
+            setattr(balance, field, value)
+        balance.save()
+        return balance
+
+
+def get_balance(user_id):
+    """The user's running totals, rolled over to the current month if needed."""
+    balance = UserBalance.objects.filter(pk=user_id).first()
+    if balance is None or balance.month != current_month():
+        balance = refresh(user_id)
+    return balance
+
+
+def apply(deltas):
+    """
+    Add MonthlyRollup deltas (see rollups.collect) to the users' balances.
+
+    Must run in the same database transaction as the rollup update, after it.
+    """
+    per_user = defaultdict(lambda: {'income': Decimal(0), 'expense': Decimal(0), 'months': defaultdict(Decimal)})
+    for (user_id, month, _category, tx_type), (amount, _count) in deltas.items():
+        if not amount:
+            continue
+        per_user[user_id][tx_type] += amount
+        per_user[user_id]['months'][(month, tx_type)] += amount
+
+    for user_id, change in per_user.items():
+        month_updates = {}
+        for tx_type in ('income', 'expense'):
+            whens = [
+                When(month=month, then=F(f'month_{tx_type}') + amount)
+                for (month, month_type), amount in change['months'].items()
+                if month_type == tx_type and amount
+            ]
+            if whens:
+                month_updates[f'month_{tx_type}'] = Case(*whens, default=F(f'month_{tx_type}'))
+
+        updated = UserBalance.objects.filter(pk=user_id).update(
+            lifetime_income=F('lifetime_income') + change['income'],
+            lifetime_expense=F('lifetime_expense') + change['expense'],
+            **month_updates,
+        )
+        if not updated:
+            # First write for this user: the rollups already include it.
+            refresh(user_id)
+
+
+def find_mismatches(user_ids=None):
+    """
+    Compare stored balances with aggregates over the Transaction table.
+
+    Returns a list of (user_id, field, expected, stored) tuples.
+    """
+    balances = UserBalance.objects.all()
+    users = Transaction.objects.all()
+    if user_ids is not None:
+        balances = balances.filter(pk__in=user_ids)
+        users = users.filter(user_id__in=user_ids)
+    stored = {b.pk: b for b in balances}
+    all_users = set(stored) | set(users.values_list('user_id', flat=True).distinct())
+
+    mismatches = []
+    zero = Decimal(0)
+    for user_id in sorted(all_users):
+        balance = stored.get(user_id)
+        month = balance.month if balance else current_month()
+        expected = compute_from_transactions(user_id, month)
+        for field in FIELDS:
+            actual = getattr(balance, field) if balance else zero
+            if actual != expected[field]:
+                mismatches.append((user_id, field, expected[field], actual))
+    return mismatches
@@ -0,0 +1,65 @@
+from django.db import transaction
+
+from . import rollups
+from .models import Transaction
+
+# Fields a bulk update may change.
+UPDATE_FIELDS = ('date', 'category', 'type', 'amount', 'description')
+
+
+class MissingTransactions(Exception):
+    """Transactions a batch updates were deleted after it was validated."""
+
+    def __init__(self, ids):
+        super().__init__(f"Transactions {ids} no longer exist.")
+        self.ids = ids
+
+
+def apply_batch(user, create=(), update=(), delete=()):
+    """
+    Apply one validated batch of a user's transaction changes atomically.
+
+    `create` and `update` are validated serializer data (updates carry their
+    `id` and only the fields being changed), `delete` is a list of ids, all
+    of them already checked to be the user's own. Rows are written with
+    bulk_create/bulk_update and one DELETE, and MonthlyRollup/UserBalance
+    receive a single set of deltas for the whole batch.
+
+    The ids are checked again once their rows are locked, since another
+    request may have deleted some since validation: an update of a missing
+    row raises MissingTransactions and nothing is written, while a missing
+    delete is left out of deleted_ids.
+
+    Returns (created, updated, deleted_ids).
+    """
+    updates = {item['id']: item for item in update}
+
+    with transaction.atomic():
+        existing = {
+            tx.pk: tx
+            for tx in Transaction.objects.select_for_update().filter(
+                user=user, pk__in=list(updates) + list(delete))
+        }
+        missing = [pk for pk in updates if pk not in existing]
+        if missing:
+            raise MissingTransactions(missing)
+        deltas = rollups.collect([rollups.row_of(tx) for tx in existing.values()], sign=-1)
+
+        created = Transaction.objects.bulk_create([Transaction(user=user, **item) for item in create])
+
+        updated = []
+        for pk, changes in updates.items():
+            tx = existing[pk]
+            for field in UPDATE_FIELDS:
+                if field in changes:
+                    setattr(tx, field, changes[field])
+            updated.append(tx)
+        Transaction.objects.bulk_update(updated, UPDATE_FIELDS)
+
+        deleted_ids = [pk for pk in delete if pk in existing]
+        Transaction.objects.filter(pk__in=deleted_ids).delete()
+
+        rollups.collect([rollups.row_of(tx) for tx in created + updated], deltas=deltas)
+        rollups.apply(deltas)
+
+    return created, updated, deleted_ids
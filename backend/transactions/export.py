@@ -0,0 +1,118 @@
+import csv
+import io
+import os
+
+import django
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Min
+
+from .models import Transaction
+
+# The CSV layout written by export_transactions and read back by the importer.
+CSV_COLUMNS = ('id', 'user_id', 'date', 'type', 'category', 'amount', 'description')
+
+
+def export_queryset(user_ids=None, start=None, end=None, user_range=None):
+    """
+    Transactions as CSV_COLUMNS tuples, ordered by (user_id, date, id).
+
+    `start`/`end` bound the date (both inclusive); `user_range` is an
+    inclusive (low, high) user-id range, used to shard an export.
+    """
+    qs = Transaction.objects.all()
+    if user_ids:
+        qs = qs.filter(user_id__in=user_ids)
+    if user_range is not None:
+        qs = qs.filter(user_id__gte=user_range[0], user_id__lte=user_range[1])
+    if start is not None:
+        qs = qs.filter(date__gte=start)
+    if end is not None:
+        qs = qs.filter(date__lte=end)
+    return qs.order_by('user_id', 'date', 'id').values_list(*CSV_COLUMNS)
+
+
+def write_csv(rows, csvfile, chunk_size=5000):
+    """
+    Write the header and `rows` to `csvfile`, chunk_size rows per write;
+    returns the number of rows written.
+
+    `rows` should stream, e.g. export_queryset(...).iterator(), which on
+    PostgreSQL reads through a server-side cursor.
+    """
+    writer = csv.writer(csvfile)
+    writer.writerow(CSV_COLUMNS)
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            writer.writerows(chunk)
+            written += len(chunk)
+            chunk = []
+    writer.writerows(chunk)
+    return written + len(chunk)
+
+
+def iter_csv(rows, chunk_size=5000):
+    """Yield the header and `rows` as CSV text, one string per chunk_size rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_json(rows, chunk_size=5000):
+    """Yield `rows` as a JSON array of objects keyed by CSV_COLUMNS, one string per chunk."""
+    encoder = DjangoJSONEncoder()
+    yield '['
+    chunk = []
+    separator = ''
+    for row in rows:
+        chunk.append(encoder.encode(dict(zip(CSV_COLUMNS, row))))
+        if len(chunk) >= chunk_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']'
+
+
+def user_id_ranges(shards, **filters):
+    """Split the exported users' id span into at most `shards` contiguous ranges."""
+    bounds = export_queryset(**filters).order_by().aggregate(low=Min('user_id'), high=Max('user_id'))
+    low, high = bounds['low'], bounds['high']
+    if low is None:
+        return []
+    step = -(-(high - low + 1) // shards)
+    return [(first, min(first + step - 1, high)) for first in range(low, high + 1, step)]
+
+
+def shard_path(output_path, index, shards):
+    if shards == 1:
+        return output_path
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}-{index + 1:0{len(str(shards))}d}-of-{shards}{ext}"
+
+
+def export_to_file(path, chunk_size=5000, **filters):
+    """Export the matching transactions to one CSV file; returns (path, rows written)."""
+    rows = export_queryset(**filters).iterator(chunk_size=chunk_size)
+    with open(path, 'w', newline='', encoding='utf-8', buffering=1024 * 1024) as csvfile:
+        return path, write_csv(rows, csvfile, chunk_size=chunk_size)
+
+
+def init_worker():
+    """
+    ProcessPoolExecutor initializer: set up Django in a spawned worker.
+
+    Call connections.close_all() before starting the pool so forked workers
+    do not inherit open database connections.
+    """
+    django.setup()
@@ -0,0 +1,165 @@
+import csv
+import io
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from . import rollups
+from .models import Transaction
+
+# Columns an import reads; ids are always assigned afresh.
+IMPORT_FIELDS = ('date', 'type', 'category', 'amount', 'description')
+REQUIRED_COLUMNS = ('date', 'type', 'category', 'amount')
+
+
+class ImportResult:
+    """Running totals of one import; reported after every chunk and at the end."""
+
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []  # (line, message) for the first MAX_ERRORS skipped rows
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.imported / elapsed if elapsed else 0.0
+
+    def skip(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def parse_row(row):
+    """Clean one CSV row with the model fields' own validation; raises ValidationError."""
+    values, errors = {}, {}
+    for name in IMPORT_FIELDS:
+        field = Transaction._meta.get_field(name)
+        try:
+            values[name] = field.clean((row.get(name) or '').strip(), None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def _describe(error):
+    if isinstance(error, ValidationError) and hasattr(error, 'error_dict'):
+        return '; '.join(f"{name}: {' '.join(messages)}" for name, messages in error.message_dict.items())
+    return ' '.join(getattr(error, 'messages', [str(error)]))
+
+
+# Column order of the rows insert_rows() takes.
+INSERT_FIELDS = ('user', 'date', 'category', 'type', 'amount', 'description')
+
+
+def insert_rows(rows):
+    """
+    Insert (user_id, date, category, type, amount, description) rows.
+
+    Uses COPY on PostgreSQL (psycopg2), which skips the per-row SQL that
+    bulk_create compiles; ids are not read back. Values may be strings.
+    """
+    with connection.cursor() as cursor:
+        copy_expert = getattr(cursor.cursor, 'copy_expert', None)
+        if connection.vendor != 'postgresql' or copy_expert is None:
+            Transaction.objects.bulk_create([
+                Transaction(user_id=user_id, date=tx_date, category=category, type=tx_type,
+                            amount=amount, description=description)
+                for user_id, tx_date, category, tx_type, amount, description in rows
+            ])
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        columns = [Transaction._meta.get_field(name).column for name in INSERT_FIELDS]
+        description = Transaction._meta.get_field('description').column
+        copy_expert(
+            f"COPY {connection.ops.quote_name(Transaction._meta.db_table)} ({', '.join(columns)}) "
+            f"FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({description}))",
+            buffer,
+        )
+
+
+def _import_chunk(chunk, user_id, result):
+    parsed = []
+    for line, row in chunk:
+        try:
+            owner = user_id if user_id is not None else int(row.get('user_id') or '')
+            parsed.append((line, Transaction(user_id=owner, **parse_row(row))))
+        except (ValidationError, ValueError) as e:
+            result.skip(line, _describe(e))
+
+    if user_id is None:
+        owners = {tx.user_id for _, tx in parsed}
+        known = set(get_user_model().objects.filter(pk__in=owners).values_list('pk', flat=True))
+        for line, tx in parsed:
+            if tx.user_id not in known:
+                result.skip(line, f"user_id: User {tx.user_id} does not exist.")
+        parsed = [(line, tx) for line, tx in parsed if tx.user_id in known]
+
+    objs = [tx for _, tx in parsed]
+    if not objs:
+        return
+    with transaction.atomic():
+        insert_rows((tx.user_id, tx.date, tx.category, tx.type, tx.amount, tx.description) for tx in objs)
+        rollups.apply(rollups.collect(rollups.row_of(tx) for tx in objs))
+    result.imported += len(objs)
+
+
+def import_csv(stream, user_id=None, chunk_size=5000, progress=None):
+    """
+    Import transactions from a CSV text stream without reading it all at once.
+
+    Rows are read, validated and written chunk_size at a time, each chunk
+    with one COPY (bulk_create off PostgreSQL) and one MonthlyRollup and
+    UserBalance update, in its own database transaction. Memory use is
+    bounded by the chunk size. Invalid rows are skipped and reported. With
+    `user_id` every row belongs to that user; otherwise the file's user_id
+    column says whose each row is. The id column is ignored.
+
+    `progress(result)` is called after every chunk. Raises ValueError when
+    the header lacks a required column. Returns an ImportResult.
+    """
+    reader = csv.DictReader(stream)
+    required = REQUIRED_COLUMNS if user_id is not None else REQUIRED_COLUMNS + ('user_id',)
+    missing = [column for column in required if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"The CSV file is missing the column(s): {', '.join(missing)}.")
+
+    result = ImportResult()
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, user_id, result)
+            chunk = []
+            if progress:
+                progress(result)
+    if chunk:
+        _import_chunk(chunk, user_id, result)
+        if progress:
+            progress(result)
+    return result
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:47
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def populate_balances(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    UserBalance = apps.get_model('transactions', 'UserBalance')
+    month = date.today().replace(day=1)
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    in_month = Q(date__gte=month, date__lt=next_month)
+    rows = (
+        Transaction.objects.values('user_id')
+        .annotate(
+            lifetime_income=Sum('amount', filter=Q(type='income')),
+            lifetime_expense=Sum('amount', filter=Q(type='expense')),
+            month_income=Sum('amount', filter=Q(type='income') & in_month),
+            month_expense=Sum('amount', filter=Q(type='expense') & in_month),
+        )
+        .order_by()
+    )
+    UserBalance.objects.bulk_create(
+        [
+            UserBalance(month=month, **{field: value or 0 for field, value in row.items()})
+            for row in rows.iterator()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_monthlyrollup'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('lifetime_income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('lifetime_expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('month', models.DateField()),
+                ('month_income', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('month_expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import models, transaction
 from django.conf import settings
 
 class Transaction(models.Model):
@@ -6,12 +7,96 @@ class Transaction(models.Model):
         ('income', 'Income'),
         ('expense', 'Expense'),
     )
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
+    # The composite indexes below all lead with user, so the FK needs no index of its own.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions', db_index=False)
     date = models.DateField()
     category = models.CharField(max_length=50)
     type = models.CharField(max_length=7, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255, blank=True)
 
+    class Meta:
+        indexes = [
+            # A user's history by date range, and ordered by (-date, -id) for
+            # the keyset-paginated list.
+            models.Index(fields=['user', 'date', 'id'], name='tx_user_date_id_idx'),
+            # Income-only or expense-only queries, e.g. the latest expenses.
+            models.Index(fields=['user', 'type', 'date'], name='tx_user_type_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='tx_user_category_date_idx'),
+            # Cheap index for date-range scans across all users (training).
+            BrinIndex(fields=['date'], name='tx_date_brin'),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.category} - {self.amount}"
+
+    # Saving or deleting a single transaction keeps MonthlyRollup in step in
+    # the same database transaction. Bulk operations (bulk_create,
+    # QuerySet.update/delete) bypass this and must update rollups themselves.
+    def save(self, *args, **kwargs):
+        from . import rollups
+
+        with transaction.atomic(using=kwargs.get('using')):
+            old = None
+            if self.pk is not None and not self._state.adding:
+                old = (
+                    Transaction.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list(*rollups.ROLLUP_FIELDS)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            rollups.record_change(old, rollups.row_of(self))
+
+    def delete(self, *args, **kwargs):
+        from . import rollups
+
+        with transaction.atomic(using=kwargs.get('using')):
+            old = (
+                Transaction.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list(*rollups.ROLLUP_FIELDS)
+                .first()
+            )
+            result = super().delete(*args, **kwargs)
+            rollups.record_change(old, None)
+        return result
+
+
+class MonthlyRollup(models.Model):
+    """Sum and count of a user's transactions per (month, category, type)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()  # first day of the month
+    category = models.CharField(max_length=50)
+    type = models.CharField(max_length=7, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'category', 'type'], name='unique_monthly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.month:%Y-%m} - {self.category} - {self.type}"
+
+
+class UserBalance(models.Model):
+    """
+    Running totals of a user's transactions, so the dashboard can read them
+    with one primary-key lookup. `month_income`/`month_expense` cover the
+    calendar month starting at `month`.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    lifetime_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lifetime_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    month = models.DateField()
+    month_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    month_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    @property
+    def balance(self):
+        return self.lifetime_income - self.lifetime_expense
+
+    def __str__(self):
+        return f"{self.user} - {self.balance}"
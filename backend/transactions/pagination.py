@@ -0,0 +1,105 @@
+import base64
+from datetime import date
+
+from django.conf import settings
+from django.db.models import BooleanField, F, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RowBefore(Func):
+    """
+    `(a, b, ...) < (x, y, ...)` as one SQL row-value comparison, which
+    PostgreSQL matches against a multi-column index as a single bound.
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, fields, values):
+        self.width = len(fields)
+        super().__init__(*(F(field) for field in fields), *(Value(value) for value in values))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        return f"({', '.join(sqls[:self.width])}) < ({', '.join(sqls[self.width:])})", params
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over transactions ordered newest first, by (-date, -id).
+
+    The cursor is the (date, id) of the last row on the page, and the next
+    page is the rows strictly before it. That is a range scan on the
+    (user, date, id) index however deep the client pages, where OFFSET would
+    read and discard every earlier row. Rows inserted or deleted meanwhile
+    never shift later pages, so nothing is skipped or served twice.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_page_size(self, request):
+        default = getattr(settings, 'TRANSACTIONS_PAGE_SIZE', 50)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, default))
+        except ValueError:
+            return default
+        return min(page_size, self.max_page_size) if page_size > 0 else default
+
+    def encode_cursor(self, tx):
+        raw = f"{tx.date.isoformat()}|{tx.pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode()
+            tx_date, pk = raw.split('|')
+            return date.fromisoformat(tx_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-date', '-id')
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            # A row comparison, unlike `date < d OR (date = d AND id < pk)`,
+            # is an index condition: the scan starts at the cursor and
+            # walks the index backwards, with no sort.
+            queryset = queryset.filter(RowBefore(('date', 'id'), cursor))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from analytics.cache import bump_data_version
+from . import balances
+from .models import MonthlyRollup, Transaction
+
+# Transaction fields that determine which rollup row a transaction counts towards.
+ROLLUP_FIELDS = ('user_id', 'date', 'category', 'type', 'amount')
+
+
+def row_of(tx):
+    date_field = Transaction._meta.get_field('date')
+    amount_field = Transaction._meta.get_field('amount')
+    return (tx.user_id, date_field.to_python(tx.date), tx.category, tx.type,
+            amount_field.to_python(tx.amount))
+
+
+def collect(rows, sign=1, deltas=None):
+    """
+    Fold (user_id, date, category, type, amount) rows into per-rollup deltas.
+
+    Returns a dict of (user_id, month, category, type) -> [amount, count].
+    Pass the result back in as `deltas` to combine several batches.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+    for user_id, tx_date, category, tx_type, amount in rows:
+        entry = deltas[(user_id, tx_date.replace(day=1), category, tx_type)]
+        entry[0] += sign * Decimal(amount)
+        entry[1] += sign
+    return deltas
+
+
+def apply(deltas):
+    """
+    Add the deltas to MonthlyRollup, creating and deleting rows as needed,
+    and to the affected users' UserBalance. Once committed, the users'
+    cached analytics are invalidated (every write path comes through here).
+    """
+    users = {user_id for user_id, *_ in deltas}
+    with transaction.atomic():
+        # On commit, so a payload computed from the old rows can't be cached under the new version.
+        transaction.on_commit(lambda: _invalidate_analytics(users))
+        for (user_id, month, category, tx_type), (amount, count) in deltas.items():
+            if not amount and not count:
+                continue
+            rollup = MonthlyRollup.objects.filter(user_id=user_id, month=month, category=category, type=tx_type)
+            if not rollup.update(total=F('total') + amount, count=F('count') + count):
+                try:
+                    with transaction.atomic():
+                        MonthlyRollup.objects.create(user_id=user_id, month=month, category=category,
+                                                     type=tx_type, total=amount, count=count)
+                except IntegrityError:
+                    # Created concurrently by another writer; add to theirs.
+                    rollup.update(total=F('total') + amount, count=F('count') + count)
+            if count < 0:
+                rollup.filter(count__lte=0).delete()
+        balances.apply(deltas)
+
+
+def _invalidate_analytics(user_ids):
+    for user_id in user_ids:
+        bump_data_version(user_id)
+
+
+def record_change(old, new):
+    """Apply one transaction changing from row `old` to row `new` (either may be None)."""
+    deltas = collect([old] if old else [], sign=-1)
+    collect([new] if new else [], deltas=deltas)
+    apply(deltas)
+
+
+def aggregate_transactions(user_ids=None):
+    """Compute rollup rows straight from the Transaction table."""
+    qs = Transaction.objects.all()
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    return (
+        qs.annotate(month=TruncMonth('date'))
+        .values('user_id', 'month', 'category', 'type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def rebuild(user_ids=None, batch_size=5000):
+    """
+    Recreate MonthlyRollup from scratch; returns the number of rows written.
+    It follows bulk writes to Transaction, so the users' cached analytics
+    are invalidated too.
+    """
+    with transaction.atomic():
+        existing = MonthlyRollup.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+            users = set(user_ids)
+        else:
+            users = set(existing.values_list('user_id', flat=True).distinct()).union(
+                Transaction.objects.values_list('user_id', flat=True).distinct())
+        transaction.on_commit(lambda: _invalidate_analytics(users))
+        existing.delete()
+
+        if connection.vendor == 'postgresql':
+            # One INSERT ... SELECT: the rows never travel through Python. The
+            # SELECT lists the columns in aggregate_transactions' values() order.
+            select, params = aggregate_transactions(user_ids).query.sql_with_params()
+            fields = ('user', 'month', 'category', 'type', 'total', 'count')
+            columns = ', '.join(MonthlyRollup._meta.get_field(name).column for name in fields)
+            table = connection.ops.quote_name(MonthlyRollup._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {table} ({columns}) {select}", params)
+                return cursor.rowcount
+
+        written = 0
+        batch = []
+        for row in aggregate_transactions(user_ids).iterator(chunk_size=batch_size):
+            batch.append(MonthlyRollup(**row))
+            if len(batch) >= batch_size:
+                MonthlyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        MonthlyRollup.objects.bulk_create(batch)
+        return written + len(batch)
+
+
+def find_mismatches(user_ids=None):
+    """
+    Compare MonthlyRollup with the raw Transaction table.
+
+    Returns a list of (key, expected, actual) where key is
+    (user_id, month, category, type) and expected/actual are (total, count)
+    tuples, or None when that side has no row.
+    """
+    def key(row):
+        return (row['user_id'], row['month'], row['category'], row['type'])
+
+    expected = {key(r): (r['total'], r['count']) for r in aggregate_transactions(user_ids).iterator()}
+
+    stored = MonthlyRollup.objects.all()
+    if user_ids is not None:
+        stored = stored.filter(user_id__in=user_ids)
+    actual = {
+        key(r): (r['total'], r['count'])
+        for r in stored.values('user_id', 'month', 'category', 'type', 'total', 'count').iterator()
+    }
+
+    return [
+        (k, expected.get(k), actual.get(k))
+        for k in sorted(expected.keys() | actual.keys(), key=str)
+        if expected.get(k) != actual.get(k)
+    ]
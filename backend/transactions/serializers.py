@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Transaction
 
@@ -6,3 +7,81 @@ class TransactionSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = ['id', 'user', 'date', 'category', 'type', 'amount', 'description']
         read_only_fields = ['user']
+
+
+class TransactionBulkUpdateSerializer(TransactionSerializer):
+    """One bulk update item: the id plus only the fields being changed."""
+    id = serializers.IntegerField()
+
+    class Meta(TransactionSerializer.Meta):
+        extra_kwargs = {field: {'required': False} for field in ['date', 'category', 'type', 'amount']}
+
+
+class TransactionBulkSerializer(serializers.Serializer):
+    create = TransactionSerializer(many=True, required=False)
+    update = TransactionBulkUpdateSerializer(many=True, required=False)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def to_internal_value(self, data):
+        # Refuse oversized batches before validating any of their items.
+        limit = getattr(settings, 'TRANSACTIONS_BULK_LIMIT', 5000)
+        if isinstance(data, dict):
+            size = sum(len(data[key]) for key in self.fields if isinstance(data.get(key), list))
+            if size > limit:
+                raise serializers.ValidationError(
+                    {'non_field_errors': [f"A batch may contain at most {limit} operations."]})
+        return super().to_internal_value(data)
+
+    def _check_ids(self, ids):
+        """Per-id errors: each must be one of the user's transactions, listed once."""
+        owned = set(
+            Transaction.objects.filter(user=self.context['request'].user, pk__in=ids)
+            .values_list('pk', flat=True)
+        )
+        seen = set()
+        errors = []
+        for pk in ids:
+            if pk not in owned:
+                errors.append('Transaction not found.')
+            elif pk in seen:
+                errors.append('Transaction appears more than once in the batch.')
+            else:
+                errors.append(None)
+            seen.add(pk)
+        return errors
+
+    def validate_update(self, value):
+        errors = self._check_ids([item['id'] for item in value])
+        if any(errors):
+            raise serializers.ValidationError([{'id': [error]} if error else {} for error in errors])
+        return value
+
+    def validate_delete(self, value):
+        errors = self._check_ids(value)
+        if any(errors):
+            raise serializers.ValidationError([[error] if error else [] for error in errors])
+        return value
+
+    def validate(self, attrs):
+        attrs.setdefault('create', [])
+        update = attrs.setdefault('update', [])
+        delete = attrs.setdefault('delete', [])
+        both = {item['id'] for item in update} & set(delete)
+        if both:
+            raise serializers.ValidationError(
+                f"Transactions {sorted(both)} are both updated and deleted in the batch.")
+        return attrs
+
+
+class TransactionExportParamsSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class TransactionListParamsSerializer(TransactionExportParamsSerializer):
+    search = serializers.CharField(required=False, allow_blank=True, max_length=100)
@@ -0,0 +1,153 @@
+"""
+Synthetic users and transaction histories for load tests and benchmarks.
+
+Every user gets a monthly salary with yearly raises and the odd bonus, and
+a Poisson number of expenses per month with seasonal peaks (festive
+October-December, summer holidays). Expense amounts are lognormal per
+category and scale with the user's income, and a configurable share of
+expenses are outliers several times their usual size. Each user's history
+depends only on (seed, user index), so a dataset can be regenerated, or
+grown, exactly.
+"""
+import calendar
+import re
+from datetime import date
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from . import balances, rollups
+from .importer import insert_rows
+from .models import Transaction
+
+# (category, share of expenses, median amount at a 50,000/month income, lognormal sigma, descriptions)
+EXPENSE_CATEGORIES = (
+    ('Food', 0.34, 450, 0.8, ('Groceries', 'Restaurant', 'Coffee', 'Food delivery')),
+    ('Transportation', 0.16, 300, 0.7, ('Fuel', 'Metro card', 'Cab ride')),
+    ('Shopping', 0.14, 1800, 1.0, ('Clothes', 'Electronics', 'Online order')),
+    ('Bills & Utilities', 0.12, 1500, 0.5, ('Electricity bill', 'Phone bill', 'Internet', 'Rent share')),
+    ('Entertainment', 0.10, 700, 0.8, ('Movies', 'Streaming', 'Concert')),
+    ('Health', 0.06, 900, 0.9, ('Pharmacy', 'Doctor visit', 'Gym')),
+    ('Other', 0.08, 600, 1.0, ('Gift', 'Miscellaneous')),
+)
+# Relative number of expenses per calendar month (January first).
+SEASONALITY = np.array([0.9, 0.85, 0.95, 1.0, 1.05, 1.1, 1.0, 0.95, 1.0, 1.2, 1.3, 1.45])
+MAX_AMOUNT = 99_999_999.99  # Transaction.amount has 10 digits, 2 decimal places
+
+
+def month_starts(years, today=None):
+    """The first day of each of the last `years` * 12 months, ending with the current one."""
+    today = today or date.today()
+    months = []
+    year, month = today.year, today.month
+    for _ in range(years * 12):
+        months.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def generate_rows(user_id, rng, months, today, expenses_per_month=25, outlier_rate=0.01):
+    """One user's history as insert_rows() tuples, with string dates and amounts."""
+    names = [c[0] for c in EXPENSE_CATEGORIES]
+    shares = np.array([c[1] for c in EXPENSE_CATEGORIES])
+    medians = np.array([c[2] for c in EXPENSE_CATEGORIES], dtype=float)
+    sigmas = np.array([c[3] for c in EXPENSE_CATEGORIES])
+
+    income = float(np.clip(rng.lognormal(np.log(50_000), 0.45), 12_000, 2_000_000))
+    raise_rate = rng.uniform(0.02, 0.10)
+    spend_scale = (income / 50_000) ** 0.8 * rng.uniform(0.7, 1.2)
+
+    # Days available per month: the current month only up to today.
+    month_days = np.array([
+        today.day if (m.year, m.month) == (today.year, today.month) else calendar.monthrange(m.year, m.month)[1]
+        for m in months
+    ])
+    month_index = np.arange(len(months))
+    rows = []
+
+    salaries = income * (1 + raise_rate) ** (month_index // 12) * rng.normal(1, 0.02, len(months))
+    for m, days, salary in zip(months, month_days, salaries):
+        rows.append((user_id, m.isoformat(), 'Salary', 'income', f'{salary:.2f}', 'Monthly Salary'))
+        if m.month == 12 and rng.random() < 0.5:
+            rows.append((user_id, m.replace(day=min(20, int(days))).isoformat(),
+                         'Other', 'income', f'{salary * rng.uniform(0.5, 1.5):.2f}', 'Bonus'))
+
+    seasonal = np.array([SEASONALITY[m.month - 1] for m in months])
+    # A partial current month gets a proportional share of expenses.
+    full_days = np.array([calendar.monthrange(m.year, m.month)[1] for m in months])
+    counts = rng.poisson(expenses_per_month * seasonal * month_days / full_days)
+    n = int(counts.sum())
+    if n:
+        which_month = np.repeat(month_index, counts)
+        days = rng.integers(1, month_days[which_month] + 1)
+        starts = np.array([np.datetime64(m, 'D') for m in months])
+        dates = np.datetime_as_string(starts[which_month] + (days - 1), unit='D')
+        categories = rng.choice(len(names), size=n, p=shares / shares.sum())
+        amounts = rng.lognormal(np.log(medians[categories] * spend_scale), sigmas[categories])
+        outliers = rng.random(n) < outlier_rate
+        amounts[outliers] *= rng.uniform(5, 20, int(outliers.sum()))
+        amounts = np.clip(np.round(amounts, 2), 1, MAX_AMOUNT)
+        picks = rng.integers(0, 1 << 30, n)
+        for tx_date, category, amount, pick in zip(dates, categories, amounts, picks):
+            descriptions = EXPENSE_CATEGORIES[category][4]
+            rows.append((user_id, tx_date, names[category], 'expense', f'{amount:.2f}',
+                         descriptions[pick % len(descriptions)]))
+    return rows
+
+
+def create_users(prefix, count, start=0, password=None):
+    """Create users {prefix}{start} ... {prefix}{start + count - 1}; returns their ids in order."""
+    User = get_user_model()
+    hashed = make_password(password)  # hashed once: PBKDF2 per user would take minutes
+    usernames = [f'{prefix}{i}' for i in range(start, start + count)]
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', name=username.title(), password=hashed)
+        for username in usernames
+    ])
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    return [ids[username] for username in usernames]
+
+
+def generate(users, years, seed=0, prefix='synthetic', expenses_per_month=25, outlier_rate=0.01,
+             password=None, batch_users=100, start=0, today=None, progress=None):
+    """
+    Create `users` users with `years` years of history each, `batch_users`
+    users per database transaction, then build their rollups and balances.
+
+    User number i (counting from `start`) always gets the same history for
+    the same seed. `progress(users_done, rows_done)` is called after every
+    batch. Returns (user ids, rows written).
+    """
+    today = today or date.today()
+    months = month_starts(years, today)
+    user_ids, written = [], 0
+
+    for batch_start in range(start, start + users, batch_users):
+        batch_size = min(batch_users, start + users - batch_start)
+        with transaction.atomic():
+            ids = create_users(prefix, batch_size, start=batch_start, password=password)
+            rows = []
+            for index, user_id in enumerate(ids, batch_start):
+                rng = np.random.default_rng([seed, index])
+                rows.extend(generate_rows(user_id, rng, months, today, expenses_per_month, outlier_rate))
+            insert_rows(rows)
+            rollups.rebuild(ids)
+            for user_id in ids:
+                balances.refresh(user_id)
+        user_ids.extend(ids)
+        written += len(rows)
+        if progress:
+            progress(len(user_ids), written)
+    return user_ids, written
+
+
+def delete_users(prefix):
+    """Delete the users named {prefix}<n> and, by cascade, their data; returns how many."""
+    User = get_user_model()
+    users = User.objects.filter(username__regex=rf'^{re.escape(prefix)}[0-9]+$')
+    ids = list(users.values_list('pk', flat=True))
+    Transaction.objects.filter(user_id__in=ids).delete()
+    users.delete()
+    return len(ids)
@@ -1,3 +1,604 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+import os
+import tempfile
+import csv
+from io import StringIO
+import json
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from analytics.cache import get_data_version
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.utils.urls import replace_query_param
+
+from . import balances, bulk, rollups, synthetic
+from .balances import get_balance
+from .models import MonthlyRollup, Transaction, UserBalance
+from .views import TransactionExportView
+
+User = get_user_model()
+
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='rollup@example.com', username='rollup',
+                                             name='Rollup', password='secret')
+
+    def rollup(self, month, category, tx_type='expense'):
+        return MonthlyRollup.objects.filter(user=self.user, month=month, category=category,
+                                            type=tx_type).values_list('total', 'count').first()
+
+    def add(self, tx_date, category, amount, tx_type='expense'):
+        return Transaction.objects.create(user=self.user, date=tx_date, category=category,
+                                          type=tx_type, amount=amount)
+
+    def test_insert_adds_to_the_month(self):
+        self.add(date(2025, 3, 4), 'Food', '120.50')
+        self.add(date(2025, 3, 28), 'Food', '79.50')
+        self.add(date(2025, 3, 1), 'Salary', '50000', tx_type='income')
+
+        self.assertEqual(self.rollup(date(2025, 3, 1), 'Food'), (Decimal('200.00'), 2))
+        self.assertEqual(self.rollup(date(2025, 3, 1), 'Salary', 'income'), (Decimal('50000.00'), 1))
+
+    def test_update_moves_between_rollups(self):
+        tx = self.add(date(2025, 3, 4), 'Food', '100')
+        self.add(date(2025, 3, 5), 'Food', '50')
+
+        tx.category = 'Health'
+        tx.date = date(2025, 4, 2)
+        tx.amount = Decimal('300')
+        tx.save()
+
+        self.assertEqual(self.rollup(date(2025, 3, 1), 'Food'), (Decimal('50.00'), 1))
+        self.assertEqual(self.rollup(date(2025, 4, 1), 'Health'), (Decimal('300.00'), 1))
+
+    def test_delete_removes_empty_rollup(self):
+        tx = self.add(date(2025, 3, 4), 'Food', '100')
+        tx.delete()
+
+        self.assertIsNone(self.rollup(date(2025, 3, 1), 'Food'))
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    def test_rebuild_repairs_bulk_writes(self):
+        self.add(date(2025, 3, 4), 'Food', '100')
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, date=date(2025, 3, 9), category='Food', type='expense', amount=10),
+        ])
+        self.assertEqual(len(rollups.find_mismatches()), 1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(self.rollup(date(2025, 3, 1), 'Food'), (Decimal('110.00'), 2))
+        self.assertEqual(rollups.find_mismatches(), [])
+
+
+class UserBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='balance@example.com', username='balance',
+                                             name='Balance', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, tx_date, amount, tx_type='expense'):
+        return Transaction.objects.create(user=self.user, date=tx_date, category='Food',
+                                          type=tx_type, amount=amount)
+
+    def test_summary_reads_running_totals(self):
+        today = date.today()
+        self.add(today.replace(day=1), '50000', tx_type='income')
+        self.add(today, '1200')
+        self.add(date(today.year - 1, 1, 15), '300')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('transaction-summary'))
+
+        self.assertEqual(response.data['total_income'], Decimal('50000'))
+        self.assertEqual(response.data['total_expense'], Decimal('1200'))
+        self.assertEqual(response.data['balance'], Decimal('48500'))
+
+    def test_writes_through_the_api_update_totals(self):
+        response = self.client.post(reverse('transaction-list-create'), {
+            'date': date.today(), 'type': 'expense', 'category': 'Food', 'amount': '250.00',
+        })
+        tx_id = response.data['id']
+        self.client.patch(reverse('transaction-detail', args=[tx_id]), {'amount': '100.00'})
+        self.assertEqual(get_balance(self.user.id).month_expense, Decimal('100'))
+
+        self.client.delete(reverse('transaction-detail', args=[tx_id]))
+        self.assertEqual(get_balance(self.user.id).lifetime_expense, Decimal('0'))
+        self.assertEqual(balances.find_mismatches(), [])
+
+    def test_month_rollover(self):
+        today = date.today()
+        self.add(today, '700')
+        UserBalance.objects.filter(pk=self.user.pk).update(month=date(2000, 1, 1), month_expense=5)
+
+        balance = get_balance(self.user.id)
+
+        self.assertEqual(balance.month, today.replace(day=1))
+        self.assertEqual(balance.month_expense, Decimal('700'))
+
+    def test_check_command(self):
+        self.add(date.today(), '700')
+        UserBalance.objects.filter(pk=self.user.pk).update(lifetime_expense=1)
+
+        with self.assertRaises(CommandError):
+            call_command('check_balances', stdout=StringIO())
+        call_command('check_balances', '--fix', stdout=StringIO())
+
+        self.assertEqual(balances.find_mismatches(), [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='pages@example.com', username='pages',
+                                             name='Pages', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Several transactions per day, so pages split days on the id tiebreak.
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, date=date(2025, 1, 1) + timedelta(days=i // 3),
+                        category='Food', type='expense', amount=i + 1)
+            for i in range(25)
+        ])
+
+    def fetch_all(self, url, on_page=None):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(tx['id'] for tx in response.data['results'])
+            url = response.data['next']
+            if on_page:
+                on_page()
+        return ids
+
+    def expected_ids(self):
+        return list(Transaction.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True))
+
+    def test_pages_follow_date_then_id(self):
+        url = reverse('transaction-list-create') + '?page_size=4'
+        self.assertEqual(self.fetch_all(url), self.expected_ids())
+
+    def test_inserts_while_paging_do_not_shift_pages(self):
+        before = self.expected_ids()
+
+        def insert_newer():
+            Transaction.objects.create(user=self.user, date=date(2025, 6, 1), category='Food',
+                                       type='expense', amount=1)
+
+        ids = self.fetch_all(reverse('transaction-list-create') + '?page_size=4', on_page=insert_newer)
+
+        self.assertEqual(ids[:len(before)], before)
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_query_count_does_not_grow_with_depth(self):
+        response = self.client.get(reverse('transaction-list-create') + '?page_size=2')
+        for _ in range(5):
+            response = self.client.get(response.data['next'])
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_page_size_is_capped_and_cursor_validated(self):
+        response = self.client.get(reverse('transaction-list-create') + '?page_size=100000')
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('transaction-list-create') + '?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+    def test_filters_apply_before_paging(self):
+        Transaction.objects.create(user=self.user, date=date(2023, 3, 9), category='Travel', type='expense',
+                                   amount=5, description='Old train ticket')
+        url = reverse('transaction-list-create') + '?page_size=4'
+
+        ids = self.fetch_all(url + '&start=2025-01-02&end=2025-01-03')
+        in_range = Transaction.objects.filter(date__range=(date(2025, 1, 2), date(2025, 1, 3)))
+        self.assertEqual(ids, list(in_range.order_by('-date', '-id').values_list('id', flat=True)))
+        self.assertEqual(len(self.fetch_all(url + '&search=TRAIN')), 1)
+        self.assertEqual(len(self.fetch_all(url + '&start=2023-03-01&end=2023-03-31')), 1)
+        self.assertEqual(self.client.get(url + '&start=2025-02-01&end=2025-01-01').status_code, 400)
+
+
+class BulkTransactionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='bulk@example.com', username='bulk',
+                                             name='Bulk', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = Transaction.objects.create(user=self.user, date=date(2025, 3, 4), category='Food',
+                                               type='expense', amount='100')
+        self.rent = Transaction.objects.create(user=self.user, date=date(2025, 3, 1), category='Rent',
+                                               type='expense', amount='900')
+
+    def post(self, payload):
+        return self.client.post(reverse('transaction-bulk'), payload, format='json')
+
+    def creates(self, n):
+        return [{'date': '2025-04-02', 'category': 'Food', 'type': 'expense', 'amount': '10.00'}] * n
+
+    def test_mixed_batch_keeps_rollups_and_balances_in_step(self):
+        version = get_data_version(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post({
+                'create': self.creates(3) + [{'date': '2025-04-01', 'category': 'Salary', 'type': 'income',
+                                              'amount': '5000.00'}],
+                'update': [{'id': self.food.id, 'amount': '40.00', 'category': 'Health'}],
+                'delete': [self.rent.id],
+            })
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data['created']), 4)
+        self.assertEqual(response.data['updated'][0]['category'], 'Health')
+        self.assertEqual(response.data['deleted'], [self.rent.id])
+        self.assertEqual(Transaction.objects.get(pk=self.food.id).amount, Decimal('40.00'))
+        self.assertFalse(Transaction.objects.filter(pk=self.rent.id).exists())
+        self.assertEqual(rollups.find_mismatches(), [])
+        self.assertEqual(balances.find_mismatches(), [])
+        self.assertEqual(get_data_version(self.user.id), version + 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries(n):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post({'create': self.creates(n)}).status_code, 200)
+            return len(ctx.captured_queries)
+
+        queries(1)  # creates the month's rollup row
+        self.assertEqual(queries(5), queries(500))
+
+    def test_invalid_items_reject_the_whole_batch(self):
+        other = User.objects.create_user(email='other@example.com', username='other',
+                                         name='Other', password='secret')
+        foreign = Transaction.objects.create(user=other, date=date(2025, 3, 4), category='Food',
+                                             type='expense', amount='5')
+
+        response = self.post({
+            'create': self.creates(1) + [{'date': '2025-04-02', 'category': 'Food', 'type': 'gift', 'amount': '1'}],
+            'update': [{'id': foreign.id, 'amount': '1'}],
+            'delete': [self.food.id, self.food.id],
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0], {})
+        self.assertIn('type', response.data['create'][1])
+        self.assertIn('id', response.data['update'][0])
+        self.assertEqual(response.data['delete'], [[], ['Transaction appears more than once in the batch.']])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_rows_deleted_after_validation(self):
+        apply_batch = bulk.apply_batch
+
+        def delete_first(*args, **kwargs):
+            # Another request deletes both rows once the batch has been validated.
+            for tx in Transaction.objects.filter(pk__in=[self.food.id, self.rent.id]):
+                tx.delete()
+            return apply_batch(*args, **kwargs)
+
+        with mock.patch('transactions.bulk.apply_batch', side_effect=delete_first):
+            response = self.post({'create': self.creates(1), 'update': [{'id': self.food.id, 'amount': '1'}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['missing'], [self.food.id])
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        self.rent = Transaction.objects.create(user=self.user, date=date(2025, 3, 1), category='Rent',
+                                               type='expense', amount='900')
+        with mock.patch('transactions.bulk.apply_batch', side_effect=delete_first):
+            response = self.post({'create': self.creates(1), 'delete': [self.rent.id]})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['deleted'], [])
+        self.assertEqual(len(response.data['created']), 1)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+    @override_settings(TRANSACTIONS_BULK_LIMIT=3)
+    def test_batch_size_limit(self):
+        response = self.post({'create': self.creates(2), 'delete': [self.food.id, self.rent.id]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data)
+
+
+class ImportTests(TestCase):
+    HEADER = 'id,user_id,date,type,category,amount,description\n'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='import@example.com', username='import',
+                                             name='Import', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, text):
+        upload = SimpleUploadedFile('statement.csv', text.encode(), content_type='text/csv')
+        return self.client.post(reverse('transaction-import'), {'file': upload}, format='multipart')
+
+    def test_upload_imports_valid_rows_and_reports_the_rest(self):
+        version = get_data_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(self.HEADER + (
+                '1,99,2025-03-04,expense,Food,120.50,Lunch\n'
+                '2,99,2025-03-05,expense,Food,not-a-number,\n'
+                '3,99,2025-03-01,income,Salary,50000.00,\n'
+                '4,99,2025-03-06,gift,Food,10.00,\n'
+                '5,99,2025-04-02,expense,"Bills & Utilities",900.00,"Rent, April"\n'
+            ))
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['imported'], response.data['skipped']), (3, 2))
+        self.assertEqual([e['line'] for e in response.data['errors']], [3, 5])
+        self.assertIn('amount', response.data['errors'][0]['error'])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(Transaction.objects.filter(user=self.user, description='Rent, April').exists())
+        self.assertEqual(rollups.find_mismatches(), [])
+        self.assertEqual(balances.find_mismatches(), [])
+        self.assertEqual(get_data_version(self.user.id), version + 1)
+
+    def test_upload_without_required_columns(self):
+        response = self.upload('date,amount\n2025-03-04,10\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.data['file'][0])
+
+    def test_command_imports_in_chunks_per_user_column(self):
+        other = User.objects.create_user(email='import2@example.com', username='import2',
+                                         name='Import 2', password='secret')
+        rows = ''.join(f'{i},{owner},2025-03-{i + 1:02d},expense,Food,{i + 1}.00,\n'
+                       for i, owner in enumerate([self.user.id, other.id, self.user.id, 0, other.id]))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.HEADER + rows)
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('import_transactions', f.name, '--chunk-size', '2', stdout=out)
+
+        self.assertEqual(out.getvalue().count('rows imported,'), 3)
+        self.assertIn('line 5: user_id: User 0 does not exist.', out.getvalue())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Transaction.objects.filter(user=other).count(), 2)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(email=f'export{i}@example.com', username=f'export{i}',
+                                              name='Export', password='secret') for i in range(3)]
+        for user in cls.users:
+            for day in range(1, 6):
+                Transaction.objects.create(user=user, date=date(2025, 3, day), category='Food',
+                                           type='expense', amount=day, description=f'{user.pk}, day {day}')
+
+    def export(self, *args):
+        path = tempfile.mktemp(suffix='.csv')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        out = StringIO()
+        call_command('export_transactions', path, *args, stdout=out)
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.reader(f)), out.getvalue()
+
+    def test_filters_by_user_and_date_range(self):
+        user = self.users[1]
+        rows, out = self.export('--user', str(user.pk), '--start', '2025-03-02', '--end', '2025-03-04')
+
+        self.assertEqual(rows[0], ['id', 'user_id', 'date', 'type', 'category', 'amount', 'description'])
+        self.assertEqual([(r[1], r[2]) for r in rows[1:]],
+                         [(str(user.pk), f'2025-03-0{day}') for day in (2, 3, 4)])
+        self.assertEqual(rows[1][6], f'{user.pk}, day 2')
+        self.assertIn('Successfully exported 3 transactions', out)
+
+    def test_reads_rows_with_one_query(self):
+        with self.assertNumQueries(1):
+            rows, _ = self.export()
+        self.assertEqual(len(rows), 1 + 15)
+
+    def test_export_imports_back(self):
+        rows, _ = self.export('--user', str(self.users[0].pk))
+        with open(tempfile.mktemp(suffix='.csv'), 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_transactions', f.name, '--user', str(self.users[2].pk), stdout=StringIO())
+
+        copied = Transaction.objects.filter(user=self.users[2], description__startswith=f'{self.users[0].pk},')
+        self.assertEqual(copied.count(), 5)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+
+class ExportEndpointTests(TestCase):
+    def setUp(self):
+        self.user, self.other = [
+            User.objects.create_user(email=f'download{i}@example.com', username=f'download{i}',
+                                     name='Download', password='secret') for i in range(2)]
+        for user in (self.user, self.other):
+            for day in range(1, 6):
+                Transaction.objects.create(user=user, date=date(2025, 3, day), category='Food',
+                                           type='expense', amount=f'{day}.50', description=f'day {day}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, **params):
+        response = self.client.get(reverse('transaction-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_is_the_default_and_streams_in_chunks(self):
+        with mock.patch.object(TransactionExportView, 'chunk_size', 2):
+            response = self.client.get(reverse('transaction-export'))
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="transactions-', response['Content-Disposition'])
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.DictReader(StringIO(b''.join(chunks).decode())))
+        self.assertEqual([row['date'] for row in rows], [f'2025-03-0{day}' for day in range(1, 6)])
+        self.assertEqual({row['user_id'] for row in rows}, {str(self.user.pk)})
+
+    def test_json_with_a_date_range(self):
+        response, body = self.download(format='json', start='2025-03-02', end='2025-03-03')
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), [
+            {'id': tx.id, 'user_id': self.user.pk, 'date': tx.date.isoformat(), 'type': 'expense',
+             'category': 'Food', 'amount': str(tx.amount), 'description': tx.description}
+            for tx in Transaction.objects.filter(user=self.user, date__range=('2025-03-02', '2025-03-03'))
+            .order_by('date', 'id')
+        ])
+
+    def test_empty_json_export(self):
+        _, body = self.download(format='json', start='2030-01-01')
+        self.assertEqual(json.loads(body), [])
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse('transaction-export'), {'start': '2025-03-05', 'end': '2025-03-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SyntheticDatasetTests(TestCase):
+    def history(self, prefix):
+        return list(Transaction.objects.filter(user__username__startswith=prefix)
+                    .order_by('user__username', 'date', 'category', 'amount')
+                    .values_list('user__username', 'date', 'category', 'type', 'amount'))
+
+    def test_same_seed_gives_the_same_data(self):
+        today = date(2025, 6, 15)
+        synthetic.generate(3, 2, seed=7, prefix='runa', batch_users=2, today=today)
+        synthetic.generate(3, 2, seed=7, prefix='runb', today=today)
+
+        first = self.history('runa')
+        self.assertTrue(first)
+        self.assertEqual([row[1:] for row in first], [row[1:] for row in self.history('runb')])
+        self.assertEqual(min(row[1] for row in first), date(2023, 7, 1))
+        self.assertLessEqual(max(row[1] for row in first), today)
+        self.assertEqual({row[3] for row in first}, {'income', 'expense'})
+        self.assertEqual(rollups.find_mismatches(), [])
+        self.assertEqual(balances.find_mismatches(), [])
+
+    def test_command_only_touches_its_own_users(self):
+        bystander = User.objects.create_user(email='keep@example.com', username='keep',
+                                             name='Keep', password='secret')
+        Transaction.objects.create(user=bystander, date=date(2025, 3, 4), category='Food',
+                                   type='expense', amount='10')
+
+        call_command('generate_dataset', '--users', '2', '--years', '1', '--prefix', 'gen', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', '--users', '1', '--prefix', 'gen', stdout=StringIO())
+        call_command('generate_dataset', '--users', '1', '--years', '1', '--prefix', 'gen', '--replace',
+                     stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='gen').count(), 1)
+        self.assertEqual(Transaction.objects.filter(user=bystander).count(), 1)
+        self.assertEqual(rollups.find_mismatches(), [])
+
+
+class ShardedExportTests(TransactionTestCase):
+    def test_shards_by_user_range_in_parallel(self):
+        users = [User.objects.create_user(email=f'shard{i}@example.com', username=f'shard{i}',
+                                          name='Shard', password='secret') for i in range(4)]
+        Transaction.objects.bulk_create([
+            Transaction(user=user, date=date(2025, 3, day), category='Food', type='expense', amount=day)
+            for user in users for day in range(1, 4)
+        ])
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'all.csv')
+
+        out = StringIO()
+        call_command('export_transactions', path, '--shards', '2', stdout=out)
+
+        files = sorted(os.listdir(directory))
+        self.assertEqual(files, ['all-1-of-2.csv', 'all-2-of-2.csv'])
+        exported = []
+        for name in files:
+            with open(os.path.join(directory, name), newline='') as f:
+                exported.extend(int(row['id']) for row in csv.DictReader(f))
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        self.assertEqual(sorted(exported), sorted(Transaction.objects.values_list('id', flat=True)))
+        self.assertIn('Successfully exported 12 transactions', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL.')
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot queries with sequential scans disabled: the planner then
+    only falls back to one when no index can serve the query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='plan@example.com', username='plan',
+                                            name='Plan', password='secret')
+        today = date.today()
+        Transaction.objects.bulk_create([
+            Transaction(user=cls.user, date=today - timedelta(days=i), category='Food',
+                        type='expense' if i % 5 else 'income', amount=100 + i)
+            for i in range(400)
+        ])
+        rollups.rebuild([cls.user.id])
+        # Plans depend on table statistics; don't leave them to autovacuum timing.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE transactions_transaction')
+            cursor.execute('ANALYZE transactions_monthlyrollup')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute('EXPLAIN ' + sql, params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.execute('RESET enable_seqscan')
+
+    def assert_endpoint_uses_indexes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertNotIn('Seq Scan on transactions_', plan, f'{sql}\n{plan}')
+        return selects
+
+    def test_transaction_list(self):
+        self.assert_endpoint_uses_indexes(reverse('transaction-list-create'))
+
+    def test_deep_transaction_page_is_an_index_range_scan(self):
+        first = self.client.get(reverse('transaction-list-create') + '?page_size=300')
+        sql, = self.assert_endpoint_uses_indexes(replace_query_param(first.data['next'], 'page_size', 50))
+        plan = self.explain(sql)
+        # The cursor bounds the index scan itself; nothing before it is read.
+        index_conditions = [line for line in plan.splitlines() if 'Index Cond' in line]
+        self.assertTrue(any('ROW(date, id) <' in line for line in index_conditions), plan)
+        self.assertIn('tx_user_date_id_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_daily_trend_filters_on_a_date_range(self):
+        sql, = self.assert_endpoint_uses_indexes(reverse('transaction-daily-trend'))
+        index_conditions = [line for line in self.explain(sql).splitlines() if 'Index Cond' in line]
+        self.assertTrue(any('date' in line for line in index_conditions), index_conditions)
+
+    def test_summary(self):
+        self.assert_endpoint_uses_indexes(reverse('transaction-summary'))
+
+    def test_analytics(self):
+        self.assert_endpoint_uses_indexes(reverse('analytics'))
+
+    def test_training_date_range_scan_uses_brin(self):
+        qs = Transaction.objects.filter(date__gte=date.today() - timedelta(days=30)).values('user_id', 'amount')
+        sql, params = qs.query.sql_with_params()
+        self.assertIn('tx_date_brin', self.explain(sql, params))
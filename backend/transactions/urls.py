@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import TransactionListCreateView, TransactionRetrieveUpdateDestroyView,TransactionSummaryView,daily_trend
+from .views import TransactionListCreateView, TransactionRetrieveUpdateDestroyView,TransactionSummaryView,TransactionBulkView,TransactionImportView,TransactionExportView,daily_trend
 
 urlpatterns = [
     path('', TransactionListCreateView.as_view(), name='transaction-list-create'),         
     path('<int:pk>/', TransactionRetrieveUpdateDestroyView.as_view(), name='transaction-detail'), 
+    path('bulk/', TransactionBulkView.as_view(), name='transaction-bulk'),
+    path('import/', TransactionImportView.as_view(), name='transaction-import'),
+    path('export/', TransactionExportView.as_view(), name='transaction-export'),
     path('summary/', TransactionSummaryView.as_view(), name='transaction-summary'),
     path('daily-trend/', daily_trend, name='transaction-daily-trend')
 ]
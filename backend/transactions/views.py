@@ -1,14 +1,25 @@
 from rest_framework import generics, permissions
 from .models import Transaction
-from .serializers import TransactionSerializer
+from .serializers import (TransactionBulkSerializer, TransactionExportParamsSerializer, TransactionListParamsSerializer,
+                          TransactionSerializer)
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.db.models import Sum, Q # <-- Import Q
 from django.db import models
 from rest_framework.views import APIView
-from datetime import datetime
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from django.http import StreamingHttpResponse
+from rest_framework import status
+import csv
+import io
+from datetime import date, datetime, timedelta
 from django.db.models.functions import TruncDay
+from . import bulk, export, importer
+from .balances import get_balance
+from .pagination import KeysetPagination
+from .renderers import CSVRenderer
 
 
 
@@ -16,14 +27,14 @@ from django.db.models.functions import TruncDay
 @permission_classes([IsAuthenticated])
 def daily_trend(request):
     user = request.user
-    current_month = datetime.now().month
-    current_year = datetime.now().year
+    month_start = date.today().replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
 
-    # Group transactions by day
+    # Group transactions by day (a date range, so the (user, date) index applies)
     qs = Transaction.objects.filter(
         user=user,
-        date__month=current_month,
-        date__year=current_year
+        date__gte=month_start,
+        date__lt=next_month_start
     ).annotate(day=TruncDay('date')).values('day', 'type').annotate(
         total=Sum('amount')
     ).order_by('day')
@@ -44,9 +55,9 @@ def daily_trend(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_summary(request):
-    user = request.user
-    income = Transaction.objects.filter(user=user, type='income').aggregate(total=Sum('amount'))['total'] or 0
-    expense = Transaction.objects.filter(user=user, type='expense').aggregate(total=Sum('amount'))['total'] or 0
+    totals = get_balance(request.user.id)
+    income = totals.lifetime_income or 0
+    expense = totals.lifetime_expense or 0
     balance = income - expense
 
     data = {
@@ -60,9 +71,23 @@ def dashboard_summary(request):
 class TransactionListCreateView(generics.ListCreateAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).order_by('-date')
+        # Filters run here, not in the browser, which only holds the pages loaded so far.
+        params = TransactionListParamsSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        queryset = Transaction.objects.filter(user=self.request.user)
+        if 'start' in filters:
+            queryset = queryset.filter(date__gte=filters['start'])
+        if 'end' in filters:
+            queryset = queryset.filter(date__lte=filters['end'])
+        if filters.get('search'):
+            queryset = queryset.filter(Q(category__icontains=filters['search']) |
+                                       Q(description__icontains=filters['search']))
+        return queryset.order_by('-date', '-id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -74,33 +99,96 @@ class TransactionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView
     def get_queryset(self):
         return Transaction.objects.filter(user=self.request.user)
 
+class TransactionBulkView(APIView):
+    """
+    Create, update and delete many transactions in one request.
+
+    Body: {"create": [...], "update": [{"id": ..., <changed fields>}], "delete": [ids]}.
+    The batch is validated as a whole and applied in one database
+    transaction, or not at all; errors are reported per item. A 409 lists
+    updated transactions another request deleted in the meantime.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TransactionBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            created, updated, deleted = bulk.apply_batch(request.user, **serializer.validated_data)
+        except bulk.MissingTransactions as exc:
+            return Response({'detail': str(exc), 'missing': exc.ids}, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'created': TransactionSerializer(created, many=True).data,
+            'updated': TransactionSerializer(updated, many=True).data,
+            'deleted': deleted,
+        })
+
+class TransactionImportView(APIView):
+    """
+    Import a CSV file (multipart field "file") in the export_transactions
+    layout into the user's history. The upload is parsed as a stream and
+    written in chunks; invalid rows are skipped and reported.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = importer.import_csv(stream, user_id=request.user.id)
+        except (ValueError, csv.Error) as e:
+            # Chunks before a decoding error are already committed.
+            return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED if result.imported else status.HTTP_200_OK)
+
+class TransactionExportView(APIView):
+    """
+    Download the user's transactions as CSV (default, the import layout) or
+    JSON with ?format=json, optionally limited to ?start=&end= dates.
+
+    Rows are streamed from a database cursor as the client reads them, so
+    the download starts at once and memory does not grow with the history.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, JSONRenderer]
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        params = TransactionExportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        rows = export.export_queryset(user_ids=[request.user.id], **params.validated_data)
+        rows = rows.iterator(chunk_size=self.chunk_size)
+        if request.accepted_renderer.format == 'json':
+            content, content_type = export.iter_json(rows, self.chunk_size), 'application/json'
+        else:
+            content, content_type = export.iter_csv(rows, self.chunk_size), 'text/csv; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f"transactions-{date.today().isoformat()}.{request.accepted_renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
 class TransactionSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
         
-        user = request.user
-        
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-
-        total_income = Transaction.objects.filter(
-            user=user, 
-            type='income',
-            date__month=current_month,
-            date__year=current_year
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        total_expense = Transaction.objects.filter(
-            user=user, 
-            type='expense',
-            date__month=current_month,
-            date__year=current_year
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        balance = Transaction.objects.filter(user=user).aggregate(
-            balance=Sum('amount', filter=models.Q(type='income')) - Sum('amount', filter=models.Q(type='expense'))
-        )['balance'] or 0
+        # Running totals kept up to date on every transaction write
+        totals = get_balance(request.user.id)
+
+        total_income = totals.month_income or 0
+        total_expense = totals.month_expense or 0
+        balance = totals.balance or 0
 
         return Response({
             'total_income': total_income,
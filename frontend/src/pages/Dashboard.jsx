@@ -52,8 +52,8 @@ const Dashboard = () => {
         const summaryResponse = await axiosInstance.get('/api/transactions/summary/');
         const summaryData = summaryResponse.data;
     
-        const transactionsResponse = await axiosInstance.get('/api/transactions/');
-        const transactionsData = transactionsResponse.data;
+        const transactionsResponse = await axiosInstance.get('/api/transactions/', { params: { page_size: 5 } });
+        const transactionsData = transactionsResponse.data.results;
     
         const dailyTrendResponse = await axiosInstance.get('/api/transactions/daily-trend/');
         const dailyTrendData = dailyTrendResponse.data;
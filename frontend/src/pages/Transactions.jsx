@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import { Search, Plus, Edit, Trash2, X, ChevronLeft, ChevronRight, RefreshCcw } from 'lucide-react';
+import React, { useState, useEffect, useRef } from 'react';
+import { Search, Plus, Edit, Trash2, X, ChevronLeft, ChevronRight, RefreshCcw, Download } from 'lucide-react';
 import axiosInstance from '../api/axios';
 import toast from 'react-hot-toast';
 import Navbar from '../components/Navbar';
@@ -47,17 +47,40 @@ const Transactions = () => {
   const categories = ["Bills & Utilities", "Entertainment", "Food", "Health", "Shopping", "Transportation","Salary", "Other"];
 
   
+  const [nextPageUrl, setNextPageUrl] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const latestRequest = useRef(0);
+
+  const withRawDate = (tx) => ({ ...tx, rawDate: new Date(tx.date) });
+
+  // The list holds only the pages loaded so far, so the filters go to the API
+  // as a date range (a month is only picked within a year).
+  const filterParams = () => {
+    const params = {};
+    if (selectedYear && selectedMonth) {
+      const month = String(selectedMonth).padStart(2, '0');
+      const lastDay = new Date(selectedYear, selectedMonth, 0).getDate();
+      params.start = `${selectedYear}-${month}-01`;
+      params.end = `${selectedYear}-${month}-${lastDay}`;
+    } else if (selectedYear) {
+      params.start = `${selectedYear}-01-01`;
+      params.end = `${selectedYear}-12-31`;
+    }
+    if (searchTerm.trim()) params.search = searchTerm.trim();
+    return params;
+  };
+
+  // Loads the first page for the current filters; a newer request wins over a slower older one.
   const fetchTransactions = async () => {
+    const request = ++latestRequest.current;
     try {
-      setIsLoading(true);
       setError(null);
-      const response = await axiosInstance.get('/api/transactions/');
-      const data = response.data.map(tx => ({
-        ...tx,
-        rawDate: new Date(tx.date) 
-      }));
-      setTransactions(data);
+      const response = await axiosInstance.get('/api/transactions/', { params: filterParams() });
+      if (request !== latestRequest.current) return;
+      setTransactions(response.data.results.map(withRawDate));
+      setNextPageUrl(response.data.next);
     } catch (err) {
+      if (request !== latestRequest.current) return;
       setError('Failed to load transactions');
       toast.error('Failed to load transactions');
     } finally {
@@ -65,24 +88,36 @@ const Transactions = () => {
     }
   };
 
-  useEffect(() => {
-    fetchTransactions();
-  }, []);
-
-  
-  const filteredTransactions = transactions.filter(tx => {
-    const matchesSearch = (tx.category?.toLowerCase() || '').includes(searchTerm.toLowerCase()) ||
-                          (tx.description?.toLowerCase() || '').includes(searchTerm.toLowerCase());
-    const matchesMonth = selectedMonth ? tx.rawDate.getMonth() + 1 === parseInt(selectedMonth) : true;
-    const matchesYear = selectedYear ? tx.rawDate.getFullYear() === parseInt(selectedYear) : true;
-    return matchesSearch && matchesMonth && matchesYear;
-  });
+  // The API pages by cursor; each call appends the next page of older transactions.
+  const loadMoreTransactions = async () => {
+    if (!nextPageUrl) return;
+    const request = latestRequest.current;
+    try {
+      setIsLoadingMore(true);
+      const response = await axiosInstance.get(nextPageUrl);
+      if (request !== latestRequest.current) return;
+      setTransactions(prev => [...prev, ...response.data.results.map(withRawDate)]);
+      setNextPageUrl(response.data.next);
+    } catch (err) {
+      toast.error('Failed to load more transactions');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
 
-  
+  // Refetch from the first page whenever a filter changes; typing in the search box is debounced.
   useEffect(() => {
     setCurrentPage(1);
+    const timer = setTimeout(fetchTransactions, 300);
+    return () => clearTimeout(timer);
   }, [searchTerm, selectedMonth, selectedYear]);
 
+  const currentYear = new Date().getFullYear();
+  const yearOptions = Array.from(new Set([
+    ...Array.from({ length: 10 }, (_, i) => currentYear - i),
+    ...transactions.map(t => t.rawDate.getFullYear()),
+  ])).sort((a, b) => b - a);
+
   
   const resetFilters = () => {
     setSearchTerm('');
@@ -93,8 +128,8 @@ const Transactions = () => {
 
   const indexOfLastTransaction = currentPage * transactionsPerPage;
   const indexOfFirstTransaction = indexOfLastTransaction - transactionsPerPage;
-  const currentTransactions = filteredTransactions.slice(indexOfFirstTransaction, indexOfLastTransaction);
-  const totalPages = Math.ceil(filteredTransactions.length / transactionsPerPage);
+  const currentTransactions = transactions.slice(indexOfFirstTransaction, indexOfLastTransaction);
+  const totalPages = Math.ceil(transactions.length / transactionsPerPage);
 
   const nextPage = () => { if (currentPage < totalPages) setCurrentPage(currentPage + 1); };
   const prevPage = () => { if (currentPage > 1) setCurrentPage(currentPage - 1); };
@@ -120,15 +155,17 @@ const Transactions = () => {
       const payload = { ...formData, amount: parseFloat(formData.amount) };
       if (showEditModal) {
         await axiosInstance.put(`/api/transactions/${selectedTransaction.id}/`, payload);
+        // The edited row may have moved in or out of the filters; reload the first page.
+        fetchTransactions();
         toast.success('Transaction updated successfully!');
         setShowEditModal(false);
       } else {
         await axiosInstance.post('/api/transactions/', payload);
+        fetchTransactions();
         toast.success('Transaction added successfully!');
         setShowAddModal(false);
       }
       resetForm();
-      fetchTransactions();
     } catch (err) {
       toast.error(`Failed to ${showEditModal ? 'update' : 'add'} transaction`);
     } finally {
@@ -140,9 +177,9 @@ const Transactions = () => {
     setIsSubmitting(true);
     try {
       await axiosInstance.delete(`/api/transactions/${selectedTransaction.id}/`);
+      setTransactions(prev => prev.filter(tx => tx.id !== selectedTransaction.id));
       toast.success('Transaction deleted successfully!');
       setShowDeleteConfirm(false);
-      fetchTransactions();
     } catch (err) {
       toast.error('Failed to delete transaction');
     } finally {
@@ -150,6 +187,26 @@ const Transactions = () => {
     }
   };
 
+  const handleExport = async () => {
+    try {
+      const response = await axiosInstance.get('/api/transactions/export/', {
+        params: {
+          format: 'csv',
+          ...(selectedYear && { start: `${selectedYear}-01-01`, end: `${selectedYear}-12-31` }),
+        },
+        responseType: 'blob',
+      });
+      const url = URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `transactions${selectedYear ? `-${selectedYear}` : ''}.csv`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch (err) {
+      toast.error('Failed to export transactions');
+    }
+  };
+
   const openEditModal = (transaction) => {
     setSelectedTransaction(transaction);
     setFormData({
@@ -192,15 +249,15 @@ const Transactions = () => {
                   className="w-full pl-10 pr-4 py-2 border border-gray-300 rounded-lg bg-white text-gray-900 focus:ring-2 focus:ring-indigo-500"
                 />
             </div>
-            <select value={selectedMonth} onChange={(e) => setSelectedMonth(e.target.value)} className="w-full px-4 py-2 border border-gray-300 rounded-lg bg-white focus:ring-2 focus:ring-indigo-500 text-gray-900">
+            <select value={selectedMonth} onChange={(e) => setSelectedMonth(e.target.value)} disabled={!selectedYear} className="w-full px-4 py-2 border border-gray-300 rounded-lg bg-white focus:ring-2 focus:ring-indigo-500 text-gray-900 disabled:opacity-50">
                 <option value="">All Months</option>
                 {Array.from({ length: 12 }, (_, i) => (
                   <option key={i+1} value={i+1}>{new Date(0, i).toLocaleString('en-US', { month: 'long' })}</option>
                 ))}
             </select>
-            <select value={selectedYear} onChange={(e) => setSelectedYear(e.target.value)} className="w-full px-4 py-2 border border-gray-300 rounded-lg bg-white focus:ring-2 focus:ring-indigo-500 text-gray-900">
+            <select value={selectedYear} onChange={(e) => { setSelectedYear(e.target.value); if (!e.target.value) setSelectedMonth(''); }} className="w-full px-4 py-2 border border-gray-300 rounded-lg bg-white focus:ring-2 focus:ring-indigo-500 text-gray-900">
                 <option value="">All Years</option>
-                {Array.from(new Set(transactions.map(t => t.rawDate.getFullYear()))).sort((a, b) => b - a).map(year => (
+                {yearOptions.map(year => (
                   <option key={year} value={year}>{year}</option>
                 ))}
             </select>
@@ -211,7 +268,10 @@ const Transactions = () => {
             </div>
         </div>
         
-        <div className="flex justify-end mb-4">
+        <div className="flex justify-end gap-2 mb-4">
+            <button onClick={handleExport} className="bg-white text-gray-700 border border-gray-300 px-4 py-2 rounded-lg font-semibold hover:bg-gray-50 flex items-center justify-center gap-2">
+                <Download className="w-5 h-5" /> Export CSV
+            </button>
             <button onClick={() => setShowAddModal(true)} className="bg-indigo-600 text-white px-4 py-2 rounded-lg font-semibold hover:bg-indigo-700 flex items-center justify-center gap-2">
                 <Plus className="w-5 h-5" /> Add New Transaction
             </button>
@@ -259,6 +319,14 @@ const Transactions = () => {
           )}
         </div>
 
+        {nextPageUrl && (
+          <div className="flex justify-center mt-6">
+            <button onClick={loadMoreTransactions} disabled={isLoadingMore} className="px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50">
+              {isLoadingMore ? 'Loading...' : 'Load older transactions'}
+            </button>
+          </div>
+        )}
+
         {totalPages > 1 && (
           <div className="flex justify-between items-center mt-6">
             <button onClick={prevPage} disabled={currentPage === 1} className="px-4 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50 flex items-center gap-2">